@@ -0,0 +1,192 @@
+"""Timing benchmarks for the notebook utilities, kept out of the `util` library itself
+
+Run from the notebooks folder, for example:
+
+    python benchmarks.py csv-compression --source s3://bucket/flow-output --scale 10
+    python benchmarks.py online-lookups --source s3://bucket/flow-output --max-records 10000
+    python benchmarks.py fingerprint --rows 10000 1000000
+
+...or import the functions in a notebook to get each benchmark's results as a DataFrame.
+"""
+
+# Python Built-Ins:
+import argparse
+import os
+import tempfile
+import time
+from typing import List, Optional
+
+# External Dependencies:
+import numpy as np
+import pandas as pd
+
+# Local Dependencies:
+from util.data import COMPRESSION_EXTENSIONS, dataframe_from_s3_folder
+from util.featurestore import OnlineFeatureStore
+from util.fingerprint import dataframe_fingerprint
+
+
+def benchmark_csv_compression(
+    df: pd.DataFrame,
+    scale: int=1,
+    compressions: List[Optional[str]]=[None, "gzip", "zstd"],
+    work_dir: Optional[str]=None,
+) -> pd.DataFrame:
+    """Measure the size/speed trade-off of CSV compression options on (a scaled-up copy of) a dataset
+
+    Writes and re-reads the data locally once per compression option, returning a summary DataFrame with
+    the file size, compression ratio (relative to the first option) and write & read times for each. Since
+    S3 transfer time scales with file size, the smaller size usually outweighs the extra (de)compression
+    time for text-heavy data.
+
+    :param df: Sample data (e.g. the credit dataset loaded from the Data Wrangler output)
+    :param scale: Number of times to repeat `df` to build the benchmark dataset
+    :param compressions: Compression options to compare (None = uncompressed)
+    :param work_dir: Folder for temporary files (defaults to the system temp folder)
+    """
+    bench_df = pd.concat([df] * scale, axis=0, ignore_index=True) if scale > 1 else df
+    results = []
+    with tempfile.TemporaryDirectory(dir=work_dir) as tmpdir:
+        for compression in compressions:
+            ext = COMPRESSION_EXTENSIONS[compression] if compression else ""
+            path = os.path.join(tmpdir, f"bench.csv{ext}")
+            t0 = time.perf_counter()
+            bench_df.to_csv(path, index=False, compression=compression)
+            write_secs = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            pd.read_csv(path)
+            read_secs = time.perf_counter() - t0
+            results.append({
+                "compression": compression or "none",
+                "size_mb": os.path.getsize(path) / 1024**2,
+                "write_secs": write_secs,
+                "read_secs": read_secs,
+            })
+            os.remove(path)
+    result_df = pd.DataFrame(results).set_index("compression")
+    result_df["ratio"] = result_df["size_mb"].iloc[0] / result_df["size_mb"]
+    print(f"Benchmarked {len(bench_df)} rows x {len(bench_df.columns)} columns")
+    return result_df
+
+
+def benchmark_online_lookups(
+    store: OnlineFeatureStore,
+    record_ids,
+    batch_sizes: List[int]=[1, 10, 100, 1000],
+    n_batches: int=200,
+    seed: int=1337,
+) -> pd.DataFrame:
+    """Measure lookup latency of an OnlineFeatureStore, for single-record get() and batched get_many()
+
+    Returns a DataFrame with one row per method & batch size, giving median and 99th percentile latency per
+    call and the mean time per record (all in microseconds).
+
+    :param store: Store to benchmark (its hit/miss statistics will include the benchmark lookups)
+    :param record_ids: Population of record IDs to draw lookups from (may include IDs not in the store)
+    :param batch_sizes: Batch sizes to measure get_many() at
+    :param n_batches: Number of calls to time per batch size
+    :param seed: Random seed for drawing the lookup IDs
+    """
+    rng = np.random.default_rng(seed)
+    record_ids = np.asarray(record_ids)
+    results = []
+
+    def summarize(method, batch_size, timings):
+        timings = np.asarray(timings) * 1e6
+        results.append({
+            "method": method,
+            "batch_size": batch_size,
+            "p50_us": np.percentile(timings, 50),
+            "p99_us": np.percentile(timings, 99),
+            "us_per_record": timings.mean() / batch_size,
+        })
+
+    timings = []
+    for record_id in rng.choice(record_ids, n_batches).tolist():
+        t0 = time.perf_counter()
+        store.get(record_id)
+        timings.append(time.perf_counter() - t0)
+    summarize("get", 1, timings)
+
+    for batch_size in batch_sizes:
+        timings = []
+        for _ in range(n_batches):
+            batch = rng.choice(record_ids, batch_size).tolist()
+            t0 = time.perf_counter()
+            store.get_many(batch)
+            timings.append(time.perf_counter() - t0)
+        summarize("get_many", batch_size, timings)
+    return pd.DataFrame(results)
+
+
+def benchmark_dataframe_fingerprint(
+    n_rows: List[int]=[10000, 100000, 1000000],
+    repeats: int=3,
+    seed: int=1337,
+) -> pd.DataFrame:
+    """Time dataframe_fingerprint() on synthetic frames of increasing size
+
+    Frames have a mix of integer, float, boolean and (low-cardinality) text columns, similar to our credit
+    dataset. Returns a DataFrame of the best time over `repeats`, per size and `order_sensitive` mode.
+    """
+    rng = np.random.default_rng(seed)
+    results = []
+    for rows in n_rows:
+        df = pd.DataFrame({
+            "txn_id": np.arange(rows),
+            "credit_amount": rng.integers(250, 20000, rows),
+            "duration_months": rng.integers(4, 72, rows),
+            "score": rng.random(rows),
+            "has_telephone": rng.random(rows) > 0.5,
+            "dataset": rng.choice(["train", "validation", "test"], rows),
+        })
+        mem_mb = df.memory_usage(index=True, deep=True).sum() / 1024**2
+        for order_sensitive in (True, False):
+            timings = []
+            for _ in range(repeats):
+                t0 = time.perf_counter()
+                dataframe_fingerprint(df, order_sensitive=order_sensitive)
+                timings.append(time.perf_counter() - t0)
+            results.append({
+                "rows": rows,
+                "order_sensitive": order_sensitive,
+                "memory_mb": mem_mb,
+                "secs": min(timings),
+                "mb_per_sec": mem_mb / min(timings),
+            })
+    return pd.DataFrame(results)
+
+
+def _load_source(source: str) -> pd.DataFrame:
+    """Load a benchmark dataset from an S3 folder or local CSV"""
+    if source.lower().startswith("s3://"):
+        return dataframe_from_s3_folder(source)
+    return pd.read_csv(source)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    csv_parser = subparsers.add_parser("csv-compression", help="CSV compression size vs speed")
+    csv_parser.add_argument("--source", required=True, help="S3 folder or local CSV of sample data")
+    csv_parser.add_argument("--scale", type=int, default=1, help="Times to repeat the sample data")
+
+    online_parser = subparsers.add_parser("online-lookups", help="OnlineFeatureStore lookup latency")
+    online_parser.add_argument("--source", required=True, help="S3 folder or local CSV of feature records")
+    online_parser.add_argument("--max-records", type=int, default=100000, help="Online store capacity")
+
+    fingerprint_parser = subparsers.add_parser("fingerprint", help="DataFrame fingerprint throughput")
+    fingerprint_parser.add_argument(
+        "--rows", type=int, nargs="+", default=[10000, 100000, 1000000], help="Synthetic frame sizes"
+    )
+
+    args = parser.parse_args()
+    if args.benchmark == "csv-compression":
+        print(benchmark_csv_compression(_load_source(args.source), scale=args.scale))
+    elif args.benchmark == "online-lookups":
+        df = _load_source(args.source)
+        store = OnlineFeatureStore.from_dataframe(df, max_records=args.max_records)
+        print(benchmark_online_lookups(store, df[store.record_id].unique()))
+    elif args.benchmark == "fingerprint":
+        print(benchmark_dataframe_fingerprint(n_rows=args.rows))
@@ -12,6 +12,7 @@
 # language governing permissions and limitations under the License.
 """Evaluation script for measuring model accuracy."""
 
+import glob
 import json
 import os
 import tarfile
@@ -39,10 +40,23 @@ if __name__ == "__main__":
     model = pickle.load(open("xgboost-model", "rb"))
 
     print("Loading test input data")
-    test_path = "/opt/ml/processing/test/test.csv"
-    df = pd.read_csv(test_path, header=None)
+    # The test set may be compressed (test.csv.gz): pd.read_csv infers this from the extension
+    test_path = sorted(glob.glob("/opt/ml/processing/test/test.csv*"))[0]
+    # Parse with the column names & types recorded by the preprocessing step, if available:
+    schema_path = "/opt/ml/processing/schema/test.json"
+    if os.path.isfile(schema_path):
+        with open(schema_path) as f:
+            schema = json.load(f)
+        df = pd.read_csv(
+            test_path, header=None, names=list(schema["columns"]), dtype=schema["columns"]
+        )
+    else:
+        logger.warning("No schema found at %s: Column types will be inferred", schema_path)
+        df = pd.read_csv(test_path, header=None)
 
     logger.debug("Reading test data.")
+    # (Nullable "Int64" columns would make df.values an object array: XGBoost needs floats, NaN = missing)
+    df = df.astype("float64")
     y_test = df.iloc[:, 0].to_numpy()
     df.drop(df.columns[0], axis=1, inplace=True)
     X_test = xgboost.DMatrix(df.values)
@@ -58,7 +58,6 @@ from sagemaker.workflow.steps import (
 )
 from sagemaker.workflow.step_collections import RegisterModel
 
-
 BASE_DIR = os.path.dirname(os.path.realpath(__file__))
 
 
@@ -125,6 +124,11 @@ def get_pipeline(
         name="InputDataUrl",
         default_value="",  # TODO: Change this to point to the s3 location of your raw input data.
     )
+    output_compression = ParameterString(
+        name="OutputCompression",
+        default_value="none",  # Set "gzip" to compress the preprocessed train/validation/test CSVs
+        enum_values=["none", "gzip"],
+    )
 
     # Processing step for feature engineering
     sklearn_processor = SKLearnProcessor(
@@ -140,6 +144,13 @@ def get_pipeline(
         processor=sklearn_processor,
         inputs=[
           ProcessingInput(source=input_data, destination="/opt/ml/processing/input"),  
+          # The shared dataset schema module (schema.py) ships with the script, like the script itself. It's
+          # mounted beside the data input rather than nested inside it, which SageMaker doesn't allow:
+          ProcessingInput(
+              source=os.path.join(BASE_DIR, "schema.py"),
+              destination="/opt/ml/processing/code-deps",
+              input_name="code-deps",
+          ),
         ],
         outputs=[
             ProcessingOutput(output_name="train", source="/opt/ml/processing/train"),
@@ -147,9 +158,10 @@ def get_pipeline(
                 output_name="validation", source="/opt/ml/processing/validation"
             ),
             ProcessingOutput(output_name="test", source="/opt/ml/processing/test"),
+            ProcessingOutput(output_name="schema", source="/opt/ml/processing/output-schema"),
         ],
         code=os.path.join(BASE_DIR, "preprocess.py"),
-        job_arguments=["--input-data", input_data],
+        job_arguments=["--input-data", input_data, "--compression", output_compression],
     )
 
     # Training step for generating model artifacts
@@ -227,6 +239,12 @@ def get_pipeline(
                 ].S3Output.S3Uri,
                 destination="/opt/ml/processing/test",
             ),
+            ProcessingInput(
+                source=step_process.properties.ProcessingOutputConfig.Outputs[
+                    "schema"
+                ].S3Output.S3Uri,
+                destination="/opt/ml/processing/schema",
+            ),
         ],
         outputs=[
             ProcessingOutput(
@@ -288,6 +306,7 @@ def get_pipeline(
             training_instance_type,
             model_approval_status,
             input_data,
+            output_compression,
         ],
         steps=[step_process, step_train, step_eval, step_cond],
         sagemaker_session=sagemaker_session,
@@ -21,25 +21,75 @@ import numpy as np
 import pandas as pd
 import os
 import glob
+import json
+import sys
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 logger.addHandler(logging.StreamHandler())
 
+
+def load_schema_module(deps_dir):
+    """Import the dataset schema module (schema.py, shipped with this script by the pipeline) if provided"""
+    if not os.path.isfile(os.path.join(deps_dir, "schema.py")):
+        logger.warning("No schema.py found in %s: Column types will be inferred", deps_dir)
+        return None
+    sys.path.insert(0, deps_dir)
+    import schema
+    return schema
+
+
+def read_input(path, schema_module):
+    """Read an input CSV, with explicit dtypes if the schema module is available"""
+    if schema_module is None:
+        return pd.read_csv(path)
+    columns = pd.read_csv(path, nrows=0).columns.tolist()
+    dtypes, unknown = schema_module.resolve_dtypes(schema_module.SCHEMA, columns)
+    if unknown:
+        logger.warning("Columns not in schema will be type-inferred: %s", unknown)
+    return pd.read_csv(path, dtype=dtypes)
+
+
+def concrete_schema(df, name):
+    """Schema listing all of `df`'s columns in order, to read back the headerless output files"""
+    return {
+        "name": name,
+        "columns": {
+            str(c): "str" if df[c].dtype == object else str(df[c].dtype) for c in df.columns
+        },
+    }
+
 if __name__ == "__main__":
     logger.info("Starting preprocessing.")
     parser = argparse.ArgumentParser()
     parser.add_argument("--input-data", type=str, required=True)
+    parser.add_argument(
+        "--compression",
+        type=str,
+        default="none",
+        # (No zstd: It needs pandas>=1.4, newer than the SKLearn processing container's)
+        choices=["none", "gzip"],
+        help="Compression for the output CSVs",
+    )
     args = parser.parse_args()
 
     base_dir = "/opt/ml/processing"
+    compression = None if args.compression == "none" else args.compression
+    out_ext = {None: ".csv", "gzip": ".csv.gz"}[compression]
+
+    schema_module = load_schema_module(f"{base_dir}/code-deps")
 
     logger.info("Reading downloaded data from /opt/ml/processing/input/")
 
-    if len(glob.glob(f"{base_dir}/input/*.csv"))>1:
-        df = pd.concat(map(pd.read_csv, glob.glob(f"{base_dir}/input/*.csv")))
+    # Input files may be compressed (e.g. .csv.gz): pd.read_csv infers compression from the file extension
+    input_files = sorted(
+        f for f in glob.glob(f"{base_dir}/input/*.csv*")
+        if f.endswith(".csv") or f.endswith(".csv.gz")
+    )
+    if len(input_files)>1:
+        df = pd.concat([read_input(f, schema_module) for f in input_files])
     else:
-        df=pd.read_csv(glob.glob(f"{base_dir}/input/*.csv")[0])
+        df = read_input(input_files[0], schema_module)
 
     # Drop pseudo-feature-store columns if present:
     model_data = df.drop(columns=["txn_id", "txn_timestamp"], errors="ignore")
@@ -61,11 +111,17 @@ if __name__ == "__main__":
         )
 
     pd.DataFrame(train_data).to_csv(
-        f"{base_dir}/train/train.csv", header=False, index=False
+        f"{base_dir}/train/train{out_ext}", header=False, index=False, compression=compression
     )
     pd.DataFrame(validation_data).to_csv(
-        f"{base_dir}/validation/validation.csv", header=False, index=False
+        f"{base_dir}/validation/validation{out_ext}", header=False, index=False, compression=compression
     )
     pd.DataFrame(test_data).to_csv(
-        f"{base_dir}/test/test.csv", header=False, index=False
+        f"{base_dir}/test/test{out_ext}", header=False, index=False, compression=compression
     )
+
+    # Record the (headerless) outputs' column names & types for downstream steps to parse them with:
+    os.makedirs(f"{base_dir}/output-schema", exist_ok=True)
+    for name, data in (("train", train_data), ("validation", validation_data), ("test", test_data)):
+        with open(f"{base_dir}/output-schema/{name}.json", "w") as f:
+            json.dump(concrete_schema(data, name), f, indent=2)
@@ -0,0 +1,69 @@
+"""Column schema of the credit default dataset, as output by the Data Wrangler flow
+
+This is the single source of truth for the dataset's column types: The pipeline ships this file with the
+preprocessing job's code, and the notebooks' `util.schema` module loads it from here. It deliberately has no
+dependencies beyond the standard library, so it can run in any processing container.
+
+`columns` maps known column names to (Pandas) dtypes. Columns generated by one-hot/count-vectorizer
+encoding have data-dependent names, so they're typed by name `prefixes` instead. A schema describing one
+concrete dataset (e.g. a headerless train/validation/test file) lists every column in file order and has no
+prefixes.
+
+Integer features derived by the flow (casts, ordinal mappings, `cast(x == "yes" as int)` flags, etc) are
+nullable "Int64": Missing or unparseable source values come out of the flow as empty fields, which a plain
+"int64" column can't hold. Only the feature store record ID & event time columns are always present.
+"""
+
+SCHEMA = {
+    "name": "credit-default",
+    "columns": {
+        "credit_default": "Int64",
+        "txn_id": "int64",
+        "txn_timestamp": "int64",
+        "checking_acct_status": "Int64",
+        "duration_months": "Int64",
+        "credit_history": "Int64",
+        "credit_amount": "Int64",
+        "savings_status": "Int64",
+        "present_employment_yrs_lt": "Int64",
+        "installment_rate_disp_income_pct": "Int64",
+        "present_residence_since": "Int64",
+        "highest_property": "Int64",
+        "age_in_years": "Int64",
+        "n_existing_credits_this_bank": "Int64",
+        "job_type": "Int64",
+        "n_dependants": "Int64",
+        "has_telephone": "Int64",
+        "is_foreign_worker": "Int64",
+        "gender_is_male": "Int64",
+        "dataset": "str",
+    },
+    "prefixes": {
+        "purpose_": "float64",
+        "other_parties_": "float64",
+        "other_installment_plans_": "float64",
+        "housing_": "float64",
+        "marital_status_": "float64",
+    },
+}
+
+
+def resolve_dtypes(schema, columns):
+    """Map `columns` to dtypes per `schema`, returning ({column: dtype}, [unknown columns])
+
+    Exact column names take precedence, then the longest matching prefix.
+    """
+    known = schema.get("columns", {})
+    prefixes = sorted(schema.get("prefixes", {}).items(), key=lambda kv: -len(kv[0]))
+    dtypes = {}
+    unknown = []
+    for col in columns:
+        if col in known:
+            dtypes[col] = known[col]
+            continue
+        dtype = next((t for prefix, t in prefixes if col.startswith(prefix)), None)
+        if dtype is None:
+            unknown.append(col)
+        else:
+            dtypes[col] = dtype
+    return dtypes, unknown
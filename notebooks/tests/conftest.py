@@ -0,0 +1,65 @@
+"""Shared pytest fixtures for the notebook utilities
+
+Tests run against local stand-ins rather than AWS: A moto S3 server (which boto3, s3fs and pyarrow all reach
+via AWS_ENDPOINT_URL), and pytest's `tmp_path` folders for caches and snapshots. Run from the notebooks
+folder with:
+
+    python -m pytest -q tests
+"""
+
+# Python Built-Ins:
+import io
+import os
+import sys
+import uuid
+
+# External Dependencies:
+import boto3
+from moto.server import ThreadedMotoServer
+import pandas as pd
+import pytest
+
+# Make `util` importable however pytest is launched:
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def s3_endpoint():
+    """Run a local moto S3 server for the test session, with AWS clients pointed at it"""
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=0, verbose=False)
+    server.start()
+    host, port = server.get_host_and_port()
+    env = {
+        "AWS_ENDPOINT_URL": f"http://{host}:{port}",
+        "AWS_ACCESS_KEY_ID": "testing",
+        "AWS_SECRET_ACCESS_KEY": "testing",
+        "AWS_DEFAULT_REGION": "us-east-1",
+    }
+    saved_env = { k: os.environ.get(k) for k in env }
+    os.environ.update(env)
+    yield env["AWS_ENDPOINT_URL"]
+    server.stop()
+    for k, v in saved_env.items():
+        if v is None:
+            os.environ.pop(k, None)
+        else:
+            os.environ[k] = v
+
+
+@pytest.fixture
+def s3_bucket(s3_endpoint) -> str:
+    """Name of a fresh, empty S3 bucket"""
+    bucket_name = f"test-{uuid.uuid4().hex[:16]}"
+    boto3.client("s3").create_bucket(Bucket=bucket_name)
+    return bucket_name
+
+
+@pytest.fixture
+def put_csv(s3_bucket):
+    """Function to upload a DataFrame as CSV to a key in the test bucket, returning its s3:// URI"""
+    def put(key: str, df: pd.DataFrame, **kwargs) -> str:
+        buffer = io.StringIO()
+        df.to_csv(buffer, index=False, **kwargs)
+        boto3.client("s3").put_object(Bucket=s3_bucket, Key=key, Body=buffer.getvalue().encode("utf-8"))
+        return f"s3://{s3_bucket}/{key}"
+    return put
@@ -0,0 +1,576 @@
+"""Tests for util.data S3 folder loading, against a local moto S3 server"""
+
+# Python Built-Ins:
+import gzip
+import io
+import os
+
+# External Dependencies:
+import boto3
+import numpy as np
+import pandas as pd
+import pytest
+
+# Local Dependencies:
+from util import data
+
+
+def _frame(start: int, rows: int=5) -> pd.DataFrame:
+    return pd.DataFrame({
+        "txn_id": range(start, start + rows),
+        "amount": [float(v) * 1.5 for v in range(start, start + rows)],
+        "dataset": ["train", "validation", "test", "train", "train"][:rows],
+    })
+
+
+def _set_mtimes(paths):
+    """Give `paths` increasing modification times, oldest first (some filesystems' timestamps are coarse)"""
+    for ix, path in enumerate(paths):
+        os.utime(path, (1000000000 + ix, 1000000000 + ix))
+
+
+#### S3ObjectCache
+
+def test_cache_serves_unchanged_objects_locally(s3_bucket, put_csv, tmp_path):
+    put_csv("folder/part0.csv", _frame(0))
+    put_csv("folder/part1.csv", _frame(5))
+    cache = data.S3ObjectCache(str(tmp_path / "cache"))
+
+    first = data.dataframe_from_s3_folder(f"s3://{s3_bucket}/folder", cache=cache)
+    assert cache.stats()["misses"] == 2 and cache.stats()["hits"] == 0
+    second = data.dataframe_from_s3_folder(f"s3://{s3_bucket}/folder", cache=cache)
+    assert cache.stats()["misses"] == 2 and cache.stats()["hits"] == 2
+    pd.testing.assert_frame_equal(first, second)
+    pd.testing.assert_frame_equal(first, pd.concat([_frame(0), _frame(5)], ignore_index=True))
+
+
+def test_cache_invalidated_when_object_changes(s3_bucket, put_csv, tmp_path):
+    put_csv("folder/part0.csv", _frame(0))
+    cache = data.S3ObjectCache(str(tmp_path / "cache"))
+    data.dataframe_from_s3_folder(f"s3://{s3_bucket}/folder", cache=cache)
+
+    # Overwriting the object changes its ETag, so the cached copy must not be served:
+    put_csv("folder/part0.csv", _frame(100))
+    df = data.dataframe_from_s3_folder(f"s3://{s3_bucket}/folder", cache=cache)
+    assert cache.stats()["misses"] == 2 and cache.stats()["hits"] == 0
+    pd.testing.assert_frame_equal(df, _frame(100))
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = data.S3ObjectCache(str(tmp_path / "cache"), max_bytes=250)
+
+    def fetch(content: bytes):
+        def write(path):
+            with open(path, "wb") as f:
+                f.write(content)
+        return write
+
+    path_a = cache.get("bucket", "a.csv", '"etag-a"', fetch(b"a" * 100))
+    path_b = cache.get("bucket", "b.csv", '"etag-b"', fetch(b"b" * 100))
+    # Touch `a` so that `b` becomes the least recently used:
+    assert cache.get("bucket", "a.csv", "etag-a", fetch(b"unused")) == path_a
+    _set_mtimes([path_b, path_a])
+    cache.get("bucket", "c.csv", '"etag-c"', fetch(b"c" * 100))
+
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["size_bytes"] <= 250
+    assert not os.path.exists(path_b)
+    with open(path_a, "rb") as f:
+        assert f.read() == b"a" * 100
+
+
+#### Compaction
+
+def test_compact_nullable_integer_columns(s3_bucket, put_csv):
+    put_csv("folder/part0.csv", pd.DataFrame({
+        "txn_id": [1, 2, 3],
+        "all_missing": [None, None, None],
+        "some_missing": [5, None, 300],
+        "negative": [-1, None, 7],
+    }))
+    df = data.dataframe_from_s3_folder(
+        f"s3://{s3_bucket}/folder",
+        compact=True,
+        dtype={ "all_missing": "Int64", "some_missing": "Int64", "negative": "Int64" },
+    )
+    assert df["all_missing"].isna().all()
+    assert df["some_missing"].tolist()[::2] == [5, 300] and pd.isna(df["some_missing"].iloc[1])
+    assert str(df["some_missing"].dtype) == "UInt16"
+    assert str(df["negative"].dtype) == "Int8"
+    assert pd.api.types.is_integer_dtype(df["all_missing"].dtype)
+
+
+#### Dataset splits
+
+def _flow_output() -> pd.DataFrame:
+    """Small stand-in for the Data Wrangler flow output, feature store columns included"""
+    return pd.DataFrame({
+        "credit_default": [0, 1, 0, 1, 0, 0],
+        "txn_id": range(6),
+        "txn_timestamp": range(1600000000, 1600000006),
+        "credit_amount": [1000, 2500, 400, 9000, 1200, 800],
+        "has_telephone": [True, False, True, True, False, False],
+        "dataset": ["train", "train", "validation", "test", "train", "test"],
+    })
+
+
+@pytest.mark.parametrize("with_schema", [False, True])
+def test_dataset_split_as_called_by_notebook(s3_bucket, put_csv, with_schema):
+    put_csv("flow-output/part0.csv", _flow_output())
+    schema = {
+        "columns": {
+            "credit_default": "int64",
+            "txn_id": "int64",
+            "txn_timestamp": "int64",
+            "credit_amount": "int64",
+            "has_telephone": "boolean",
+            "dataset": "str",
+        },
+    }
+    outputs = data.mock_featurestore_dataset_split(
+        f"s3://{s3_bucket}/flow-output",
+        f"s3://{s3_bucket}/model-datasets",
+        dataset_label_col="dataset",
+        datasets_with_headers=r"train.*",
+        drop_cols=["txn_id", "txn_timestamp"],
+        schema=schema if with_schema else None,
+    )
+
+    assert sorted(outputs) == ["test", "train", "validation"]
+    train_df = data.dataframe_from_s3_folder(f"s3://{s3_bucket}/model-datasets/train")
+    assert list(train_df.columns) == ["credit_default", "credit_amount", "has_telephone"]
+    assert train_df["credit_amount"].tolist() == [1000, 2500, 1200]
+    test_df = data.dataframe_from_s3_folder(
+        f"s3://{s3_bucket}/model-datasets/test",
+        schema=f"s3://{s3_bucket}/model-datasets/_schemas/test.json",
+        header=None,
+    )
+    assert test_df["credit_amount"].tolist() == [9000, 800]
+
+
+def _normalize_reference(df: pd.DataFrame, exclude: list) -> pd.DataFrame:
+    """Unoptimized normalize_training_columns(), checking every value of every column one at a time"""
+    result = df.copy()
+    for colname in df.columns:
+        if colname in exclude:
+            continue
+        values = [v for v in df[colname] if not pd.isna(v)]
+        if len(values) and all(isinstance(v, (bool, np.bool_)) for v in values):
+            result[colname] = [
+                v if pd.isna(v) else ("true" if v else "false") for v in df[colname].astype(object)
+            ]
+        elif any(isinstance(v, str) for v in values):
+            result = result.drop(columns=[colname])
+    return result
+
+
+def test_normalize_training_columns_matches_reference():
+    n = 2500
+    df = pd.DataFrame({
+        "credit_default": [ix % 2 for ix in range(n)],
+        "amount": [ix * 1.5 for ix in range(n)],
+        "has_telephone": [ix % 3 == 0 for ix in range(n)],
+        "has_email": pd.array([None if ix % 5 == 0 else ix % 2 == 0 for ix in range(n)], dtype="boolean"),
+        # Booleans read alongside blanks come through as object dtype:
+        "is_foreign": pd.Series([np.nan if ix % 7 == 0 else ix % 2 == 1 for ix in range(n)], dtype=object),
+        "purpose": ["car" if ix % 2 else "radio/tv" for ix in range(n)],
+        # Text that only shows up late in the column (so isn't in the first rows):
+        "late_text": pd.Series([np.nan] * (n - 10) + ["other"] * 10, dtype=object),
+        "dataset": ["train", "validation", "test", "train", "train"] * (n // 5),
+    })
+    normalized, report = data.normalize_training_columns(df, exclude=["dataset"])
+    expected = _normalize_reference(df, exclude=["dataset"])
+
+    assert report == {
+        "dropped": ["purpose", "late_text"],
+        "converted": ["has_telephone", "has_email", "is_foreign"],
+    }
+    assert list(normalized.columns) == list(expected.columns)
+    # What matters is the CSV the algorithm sees:
+    assert normalized.to_csv(index=False) == expected.to_csv(index=False)
+    assert "True" not in normalized.to_csv(index=False)
+
+
+#### Pushdown parsing
+
+@pytest.mark.parametrize("chunksize", [None, 7])
+@pytest.mark.parametrize("pushdown", [
+    {},
+    { "columns": ["amount", "txn_id"] },
+    { "row_filter": lambda df: df["has_telephone"] },
+    # Filter on a column that's only loaded for the filter, not in `columns`:
+    {
+        "columns": ["has_telephone", "amount"],
+        "row_filter": lambda df: df["dataset"] == "train",
+        "filter_columns": ["dataset"],
+    },
+    {
+        "columns": ["txn_id"],
+        "row_filter": lambda df: (df["amount"] > 30) & ~df["has_telephone"],
+        "filter_columns": ["amount", "has_telephone"],
+    },
+    # No matching rows:
+    {
+        "columns": ["txn_id"],
+        "row_filter": lambda df: df["dataset"] == "none",
+        "filter_columns": ["dataset"],
+    },
+])
+def test_read_csv_pushdown_matches_pandas(tmp_path, monkeypatch, pushdown, chunksize):
+    # (Small internal chunks, so filtering spans several)
+    monkeypatch.setattr(data, "FILTER_CHUNKSIZE", 5)
+    df = pd.concat([_typed_frame(0), _typed_frame(6), _typed_frame(12), _typed_frame(18)], ignore_index=True)
+    path = str(tmp_path / "data.csv")
+    df.to_csv(path, index=False)
+
+    # Reference result from plain Pandas: Load everything, then filter and project
+    expected = pd.read_csv(path)
+    assert expected["has_telephone"].dtype == bool
+    if "row_filter" in pushdown:
+        expected = expected[pushdown["row_filter"](expected)]
+    if "columns" in pushdown:
+        expected = expected[pushdown["columns"]]
+    expected = expected.reset_index(drop=True)
+
+    chunks = list(data._read_csv_pushdown(path, chunksize=chunksize, **pushdown))
+    if chunksize is None:
+        assert len(chunks) == 1
+    else:
+        assert len(chunks) == 4
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), expected)
+
+
+def test_read_csv_pushdown_rejects_usecols(tmp_path):
+    path = str(tmp_path / "data.csv")
+    _typed_frame(0).to_csv(path, index=False)
+    with pytest.raises(ValueError, match="usecols"):
+        next(data._read_csv_pushdown(path, columns=["txn_id"], usecols=["amount"]))
+
+
+#### IncrementalS3FolderLoader
+
+def test_incremental_loader_reads_only_new_and_changed_objects(s3_bucket, put_csv, tmp_path):
+    s3uri = f"s3://{s3_bucket}/capture"
+    put_csv("capture/part0.csv", _frame(0))
+    put_csv("capture/part1.csv", _frame(5))
+    cache = data.S3ObjectCache(str(tmp_path / "cache"))
+    loader = data.IncrementalS3FolderLoader(s3uri, cache=cache)
+
+    df = loader.refresh()
+    assert df["txn_id"].tolist() == list(range(10))
+    assert [entry["key"] for entry in loader.manifest] == ["capture/part0.csv", "capture/part1.csv"]
+    assert cache.stats()["misses"] == 2
+
+    # Nothing changed: Nothing is read
+    loader.refresh()
+    assert cache.stats()["misses"] == 2 and cache.stats()["hits"] == 0
+
+    # New object: Only it is read, and its rows appended
+    put_csv("capture/part2.csv", _frame(10))
+    df = loader.refresh()
+    assert df["txn_id"].tolist() == list(range(15))
+    assert cache.stats()["misses"] == 3 and cache.stats()["hits"] == 0
+
+    # Changed object: Its rows are replaced. Deleted object: Its rows are dropped
+    put_csv("capture/part0.csv", _frame(100, rows=2))
+    boto3.client("s3").delete_object(Bucket=s3_bucket, Key="capture/part1.csv")
+    df = loader.refresh()
+    assert df["txn_id"].tolist() == list(range(10, 15)) + [100, 101]
+    assert [entry["key"] for entry in loader.manifest] == ["capture/part2.csv", "capture/part0.csv"]
+    assert [entry["rows"] for entry in loader.manifest] == [5, 2]
+    assert cache.stats()["misses"] == 4
+    # Same rows as a full reload (which is in key order instead):
+    assert sorted(df["txn_id"]) == sorted(data.dataframe_from_s3_folder(s3uri)["txn_id"])
+
+
+def test_incremental_loader_resumes_from_saved_manifest(s3_bucket, put_csv, tmp_path):
+    s3uri = f"s3://{s3_bucket}/capture"
+    put_csv("capture/part0.csv", _frame(0))
+    snapshot_dir = str(tmp_path / "snapshots")
+    data.IncrementalS3FolderLoader(s3uri, state_name="capture_df", snapshot_dir=snapshot_dir).refresh()
+
+    put_csv("capture/part1.csv", _frame(5))
+    cache = data.S3ObjectCache(str(tmp_path / "cache"))
+    resumed = data.IncrementalS3FolderLoader(
+        s3uri, state_name="capture_df", snapshot_dir=snapshot_dir, cache=cache
+    )
+    assert [entry["key"] for entry in resumed.manifest] == ["capture/part0.csv"]
+    df = resumed.refresh()
+    assert df["txn_id"].tolist() == list(range(10))
+    # Only the new object was fetched:
+    assert cache.stats()["misses"] == 1
+
+    # State saved for a different prefix is ignored:
+    other = data.IncrementalS3FolderLoader(
+        f"s3://{s3_bucket}/other", state_name="capture_df", snapshot_dir=snapshot_dir
+    )
+    assert other.manifest == [] and other.df is None
+
+
+#### Sharded listing & parallel loading
+
+def _put_sharded_layout(s3_bucket: str) -> list:
+    """Put empty objects in a data-capture-like YYYY/MM/DD/HH layout, returning the sorted keys to expect"""
+    s3 = boto3.client("s3")
+    keys = ["capture/root.csv"]
+    for day in ("01", "02", "03"):
+        keys.append(f"capture/2024/01/{day}/summary.csv")
+        for hour in ("00", "13"):
+            keys += [f"capture/2024/01/{day}/{hour}/part{ix}.csv" for ix in range(3)]
+    keys.append("capture-other/not-included.csv")
+    for key in keys:
+        s3.put_object(Bucket=s3_bucket, Key=key, Body=b"")
+    return sorted(k for k in keys if k.startswith("capture/"))
+
+
+@pytest.mark.parametrize("shard_depth", [0, 1, 2, 5])
+def test_sharded_listing_matches_serial_listing(s3_bucket, shard_depth):
+    expected_keys = _put_sharded_layout(s3_bucket)
+    objs = data.list_s3_objects(f"s3://{s3_bucket}/capture/", shard_depth=shard_depth, max_workers=4)
+    assert [obj.key for obj in objs] == expected_keys
+    assert all(obj.bucket_name == s3_bucket and obj.e_tag for obj in objs)
+
+
+def test_sharded_listing_of_empty_prefix(s3_bucket):
+    assert data.list_s3_objects(f"s3://{s3_bucket}/missing/", shard_depth=2) == []
+
+
+def test_parallel_load_keeps_key_order(s3_bucket, put_csv):
+    # Keys deliberately not in creation order, and across sub-prefixes:
+    for ix, key in enumerate(["out/b/part1.csv", "out/a/part9.csv", "out/b/part0.csv", "out/a/part10.csv"]):
+        put_csv(key, _frame(ix * 10, rows=3))
+    expected = pd.concat(
+        [_frame(ix * 10, rows=3) for ix in (3, 1, 2, 0)],  # Key order: a/part10, a/part9, b/part0, b/part1
+        ignore_index=True,
+    )
+    for max_workers in (1, 4):
+        df = data.dataframe_from_s3_folder(f"s3://{s3_bucket}/out/", max_workers=max_workers)
+        pd.testing.assert_frame_equal(df, expected)
+
+
+#### Sampling
+
+def _put_sample_source(s3_bucket: str, put_csv, header: bool=True) -> pd.DataFrame:
+    """Upload 3 objects of multi-line CSV (the last without a trailing newline), returning the full data"""
+    df = pd.DataFrame({
+        "txn_id": range(300),
+        "note": [f"row {ix}" + "x" * (ix % 17) for ix in range(300)],
+        "amount": [ix * 1.5 for ix in range(300)],
+    })
+    put_csv("sample/part0.csv", df.iloc[:120], header=header)
+    put_csv("sample/part1.csv", df.iloc[120:250], header=header)
+    body = df.iloc[250:].to_csv(index=False, header=header).rstrip("\n").encode("utf-8")
+    boto3.client("s3").put_object(Bucket=s3_bucket, Key="sample/part2.csv", Body=body)
+    return df
+
+
+@pytest.mark.parametrize("header", [True, False])
+def test_range_sample_rows_are_complete_source_rows(s3_bucket, put_csv, header):
+    df = _put_sample_source(s3_bucket, put_csv, header=header)
+    kwargs = {} if header else { "header": None, "names": list(df.columns) }
+
+    for seed in range(5):
+        # (Small ranges, so most range boundaries fall mid-line)
+        sample = data.sample_from_s3_folder(
+            f"s3://{s3_bucket}/sample", n=40, strategy="ranges", range_bytes=100, min_ranges=4, seed=seed,
+            **kwargs,
+        )
+        assert 0 < len(sample) <= 40
+        # A header row read as data would make the columns text:
+        assert sample["txn_id"].dtype == "int64"
+        assert sample["txn_id"].is_unique
+        pd.testing.assert_frame_equal(
+            sample.sort_values("txn_id", ignore_index=True),
+            df.loc[sorted(sample["txn_id"])].reset_index(drop=True),
+        )
+
+
+def test_range_sample_of_every_range_reads_each_row_once(s3_bucket, put_csv):
+    df = _put_sample_source(s3_bucket, put_csv)
+    # Asking for more rows than there are fetches every range, which must partition the rows exactly:
+    for range_bytes in (37, 100, 1000):
+        sample = data.sample_from_s3_folder(
+            f"s3://{s3_bucket}/sample", n=1000, strategy="ranges", range_bytes=range_bytes, seed=1337
+        )
+        pd.testing.assert_frame_equal(sample.sort_values("txn_id", ignore_index=True), df)
+
+
+#### Batch transform joins
+
+def _put_objects(s3_bucket: str, objects: dict):
+    s3 = boto3.client("s3")
+    for key, body in objects.items():
+        s3.put_object(Bucket=s3_bucket, Key=key, Body=body)
+
+
+def _put_batch_transform(s3_bucket: str) -> pd.DataFrame:
+    """Upload batch transform-like inputs (in nested folders) & outputs, returning the expected joined data"""
+    _put_objects(s3_bucket, {
+        "bt-in/part0.csv": b"1,10.5\n2,20.5\n3,30.5\n",
+        "bt-in/sub/part1.csv": b"4,40.5\n5,50.5",
+        "bt-in/_SUCCESS": b"",
+        # Results as the algorithm container might write them: CRLF endings, and a trailing blank line
+        "bt-out/part0.csv.out": b"0.1\r\n0.2\r\n0.3\r\n\r\n",
+        "bt-out/sub/part1.csv.out": b"0.4\n0.5\n",
+    })
+    return pd.DataFrame({
+        "txn_id": [1, 2, 3, 4, 5],
+        "amount": [10.5, 20.5, 30.5, 40.5, 50.5],
+        "pred": [0.1, 0.2, 0.3, 0.4, 0.5],
+    })
+
+
+def test_iter_s3_lines_across_chunk_boundaries(s3_bucket):
+    body = b"first,1\r\nsecond,22\n\nthird,333\nlast"
+    _put_objects(s3_bucket, { "lines.csv": body })
+    for chunk_bytes in (1, 3, 7, 1024):
+        lines = list(data._iter_s3_lines(boto3.client("s3"), s3_bucket, "lines.csv", chunk_bytes=chunk_bytes))
+        assert lines == [b"first,1", b"second,22", b"third,333", b"last"]
+
+
+def test_batch_transform_joined_chunks(s3_bucket):
+    expected = _put_batch_transform(s3_bucket)
+    chunks = list(data.batch_transform_joined_chunks(
+        f"s3://{s3_bucket}/bt-in", f"s3://{s3_bucket}/bt-out", chunksize=2, names=list(expected.columns)
+    ))
+    # Chunks are bounded, and don't have to align with the part objects:
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), expected)
+
+
+def test_batch_transform_joined_chunks_skips_input_headers(s3_bucket):
+    _put_objects(s3_bucket, {
+        "bt-in/part0.csv": b"txn_id,amount\n1,10.5\n2,20.5\n",
+        "bt-out/part0.csv.out": b"0.1\n0.2\n",
+    })
+    df = pd.concat(data.batch_transform_joined_chunks(
+        f"s3://{s3_bucket}/bt-in", f"s3://{s3_bucket}/bt-out", input_header=True,
+        names=["txn_id", "amount", "pred"],
+    ))
+    pd.testing.assert_frame_equal(
+        df, pd.DataFrame({ "txn_id": [1, 2], "amount": [10.5, 20.5], "pred": [0.1, 0.2] })
+    )
+
+
+def test_join_batch_transform_to_file(s3_bucket, tmp_path):
+    expected = _put_batch_transform(s3_bucket)
+    out_path = str(tmp_path / "joined" / "results.csv")
+    rows_by_part = data.join_batch_transform_to_file(
+        f"s3://{s3_bucket}/bt-in", f"s3://{s3_bucket}/bt-out", out_path, names=list(expected.columns)
+    )
+    assert rows_by_part == { "bt-in/part0.csv": 3, "bt-in/sub/part1.csv": 2 }
+    pd.testing.assert_frame_equal(pd.read_csv(out_path), expected)
+
+
+@pytest.mark.parametrize("output_body,n_inputs,n_outputs", [
+    (b"0.1\n0.2\n", 3, 2),
+    (b"0.1\n0.2\n0.3\n0.4\n", 3, 4),
+])
+def test_batch_transform_row_count_mismatch(s3_bucket, tmp_path, output_body, n_inputs, n_outputs):
+    _put_objects(s3_bucket, {
+        "bt-in/part0.csv": b"1,10.5\n2,20.5\n3,30.5\n",
+        "bt-out/part0.csv.out": output_body,
+    })
+    message = f"{n_inputs} input rows but {n_outputs} output rows"
+    with pytest.raises(ValueError, match=message):
+        list(data.batch_transform_joined_chunks(f"s3://{s3_bucket}/bt-in", f"s3://{s3_bucket}/bt-out"))
+    with pytest.raises(ValueError, match=message):
+        data.join_batch_transform_to_file(
+            f"s3://{s3_bucket}/bt-in", f"s3://{s3_bucket}/bt-out", str(tmp_path / "results.csv")
+        )
+
+
+def test_batch_transform_unmatched_objects(s3_bucket):
+    _put_objects(s3_bucket, {
+        "bt-in/part0.csv": b"1,10.5\n",
+        "bt-in/part1.csv": b"2,20.5\n",
+        "bt-out/part0.csv.out": b"0.1\n",
+    })
+    with pytest.raises(ValueError, match="no batch transform output"):
+        list(data.batch_transform_joined_chunks(f"s3://{s3_bucket}/bt-in", f"s3://{s3_bucket}/bt-out"))
+
+    _put_objects(s3_bucket, { "bt-out/part1.csv.out": b"0.2\n", "bt-out/part2.csv.out": b"0.3\n" })
+    with pytest.raises(ValueError, match="No input object"):
+        list(data.batch_transform_joined_chunks(f"s3://{s3_bucket}/bt-in", f"s3://{s3_bucket}/bt-out"))
+
+
+#### Parquet & compressed folders
+
+def _typed_frame(start: int, rows: int=6) -> pd.DataFrame:
+    return pd.DataFrame({
+        "txn_id": range(start, start + rows),
+        "amount": [float(v) * 1.5 for v in range(start, start + rows)],
+        "has_telephone": [v % 3 == 0 for v in range(start, start + rows)],
+        "dataset": ["train", "validation", "test", "train", "train", "test"][:rows],
+    })
+
+
+def _put_parquet_folder(s3_bucket: str) -> pd.DataFrame:
+    parts = [_typed_frame(0), _typed_frame(6), _typed_frame(12)]
+    objects = { "pq/_SUCCESS": b"", "pq/.part-00000.snappy.parquet.crc": b"xx" }
+    for ix, part in enumerate(parts):
+        buffer = io.BytesIO()
+        part.to_parquet(buffer, index=False)
+        objects[f"pq/part-{ix:05d}.snappy.parquet"] = buffer.getvalue()
+    _put_objects(s3_bucket, objects)
+    return pd.concat(parts, ignore_index=True)
+
+
+def _put_gzip_folder(s3_bucket: str) -> pd.DataFrame:
+    parts = [_typed_frame(0), _typed_frame(6), _typed_frame(12)]
+    _put_objects(s3_bucket, {
+        f"gz/part{ix}.csv.gz": gzip.compress(part.to_csv(index=False).encode("utf-8"))
+        for ix, part in enumerate(parts)
+    })
+    return pd.concat(parts, ignore_index=True)
+
+
+def test_list_format_objects(s3_bucket):
+    _put_parquet_folder(s3_bucket)
+    _put_gzip_folder(s3_bucket)
+    _put_objects(s3_bucket, {
+        "mixed/part0.csv": b"a\n1\n",
+        "mixed/part1.out": b"2\n",
+        "mixed/notes.txt": b"",
+    })
+
+    def keys(prefix, data_format="auto"):
+        data_format, objs = data._list_format_objects(s3_bucket, prefix, data_format)
+        return data_format, [obj.key for obj in objs]
+
+    parquet_keys = [f"pq/part-{ix:05d}.snappy.parquet" for ix in range(3)]
+    assert keys("pq/") == ("parquet", parquet_keys)
+    assert keys("gz/") == ("csv", [f"gz/part{ix}.csv.gz" for ix in range(3)])
+    assert keys("mixed/") == ("csv", ["mixed/part0.csv", "mixed/part1.out"])
+    # Explicit Parquet mode reads any non-hidden, non-empty object regardless of extension:
+    assert keys("mixed/", "parquet") == ("parquet", ["mixed/part0.csv", "mixed/part1.out"])
+    assert keys("pq/", "csv") == ("csv", [])
+    with pytest.raises(ValueError):
+        data._list_format_objects(s3_bucket, "pq/", "json")
+
+
+@pytest.mark.parametrize("folder", ["pq", "gz"])
+def test_folder_read_with_pushdown(s3_bucket, tmp_path, folder):
+    full = _put_parquet_folder(s3_bucket) if folder == "pq" else _put_gzip_folder(s3_bucket)
+    s3uri = f"s3://{s3_bucket}/{folder}"
+    # Reference results from plain Pandas, without any pushdown:
+    columns = ["amount", "has_telephone", "txn_id"]
+    expected = full[full["dataset"] == "train"][columns].reset_index(drop=True)
+
+    pd.testing.assert_frame_equal(data.dataframe_from_s3_folder(s3uri), full)
+    pd.testing.assert_frame_equal(data.dataframe_from_s3_folder(s3uri, columns=columns), full[columns])
+    pushdown = {
+        "columns": columns,
+        # (Filtering on a column that's loaded only for the filter)
+        "row_filter": lambda df: df["dataset"] == "train",
+        "filter_columns": ["dataset"],
+    }
+    pd.testing.assert_frame_equal(data.dataframe_from_s3_folder(s3uri, **pushdown), expected)
+    pd.testing.assert_frame_equal(
+        data.dataframe_from_s3_folder(s3uri, cache=data.S3ObjectCache(str(tmp_path / "cache")), **pushdown),
+        expected,
+    )
+    chunks = list(data.dataframe_chunks_from_s3_folder(s3uri, chunksize=4, **pushdown))
+    assert all(len(chunk) <= 4 for chunk in chunks)
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), expected)
@@ -0,0 +1,103 @@
+"""Tests for util.featurestore offline (point-in-time) and online feature stores"""
+
+# External Dependencies:
+import numpy as np
+import pandas as pd
+
+# Local Dependencies:
+from util import featurestore
+
+
+DAY = 86400
+
+
+def _records(ids) -> pd.DataFrame:
+    """Two versions (a day apart) of each record in `ids`, with distinguishable feature values"""
+    return pd.DataFrame({
+        "txn_id": list(ids) * 2,
+        "txn_timestamp": [DAY] * len(ids) + [3 * DAY] * len(ids),
+        "credit_amount": [float(ix) for ix in range(2 * len(ids))],
+        "duration_months": [12] * (2 * len(ids)),
+    })
+
+
+#### OfflineFeatureStore
+
+def test_string_record_ids(tmp_path):
+    store = featurestore.OfflineFeatureStore(str(tmp_path / "store"))
+    store.ingest("credit", _records(["acct-b", "acct-a", "acct-c"]))
+    assert {(f["min_id"], f["max_id"]) for f in store.catalog("credit")} == {("acct-a", "acct-c")}
+
+    df = store.read_group("credit", record_ids=["acct-c", "acct-a"])
+    assert sorted(df["txn_id"].unique()) == ["acct-a", "acct-c"]
+    assert len(df) == 4
+
+    entity_df = pd.DataFrame({
+        "txn_id": ["acct-c", "acct-a", "acct-z"],
+        "txn_timestamp": [2 * DAY, 3 * DAY, 3 * DAY],
+    })
+    train_df = store.training_set(entity_df, { "credit": ["credit_amount"] })
+    assert train_df["txn_id"].tolist() == ["acct-c", "acct-a", "acct-z"]
+    # acct-c as of day 2 is its first version; acct-a as of day 3 its second; acct-z is unknown:
+    assert train_df["credit_amount"].tolist()[:2] == [2.0, 4.0]
+    assert np.isnan(train_df["credit_amount"].iloc[2])
+
+
+def test_empty_selection_keeps_group_schema(tmp_path):
+    store = featurestore.OfflineFeatureStore(str(tmp_path / "store"))
+    store.ingest("credit", _records([1, 2]))
+
+    df = store.read_group("credit", record_ids=[99])
+    assert len(df) == 0
+    assert list(df.columns) == ["txn_id", "txn_timestamp", "credit_amount", "duration_months"]
+    assert df["credit_amount"].dtype == np.float64
+
+    # No versions at or before any entity's time: Features are still added, as NaN
+    entity_df = pd.DataFrame({ "txn_id": [1, 2], "txn_timestamp": [0, 0] })
+    train_df = store.training_set(entity_df, { "credit": None })
+    assert list(train_df.columns) == ["txn_id", "txn_timestamp", "credit_amount", "duration_months"]
+    assert train_df["credit_amount"].isna().all()
+
+
+#### OnlineFeatureStore
+
+def _online_records(ids, value: float=0.0) -> pd.DataFrame:
+    return pd.DataFrame({
+        "txn_id": list(ids),
+        "txn_timestamp": [DAY] * len(ids),
+        "credit_amount": [value + record_id for record_id in ids],
+    })
+
+
+def test_get_many_refreshes_recency_for_eviction():
+    online = featurestore.OnlineFeatureStore(["credit_amount"], max_records=3)
+    online.put_many(_online_records([1, 2, 3]))
+
+    # Batch lookups count as uses: 1 & 3 are now more recent than 2, so 2 is evicted first
+    result = online.get_many([3, 1, 99])
+    assert result[:2, 0].tolist() == [3.0, 1.0]
+    assert np.isnan(result[2, 0])
+    online.put_many(_online_records([4]))
+    assert 2 not in online and all(record_id in online for record_id in (1, 3, 4))
+
+    # ...then 3 (looked up before 1 in that batch):
+    online.put_many(_online_records([5]))
+    assert 3 not in online and all(record_id in online for record_id in (1, 4, 5))
+
+    stats = online.stats()
+    assert stats["evictions"] == 2 and stats["records"] == 3
+    assert stats["hits"] == 2 and stats["misses"] == 1
+
+
+def test_get_many_after_eviction_reuses_slots_correctly():
+    online = featurestore.OnlineFeatureStore(["credit_amount"], max_records=2)
+    online.put_many(_online_records([1, 2]))
+    online.put_many(_online_records([3, 4], value=100.0))
+
+    result = online.get_many([1, 2, 3, 4])
+    assert np.isnan(result[:2]).all()
+    # Evicted records' slots now hold the new records' values (not stale ones):
+    assert result[2:, 0].tolist() == [103.0, 104.0]
+    pd.testing.assert_index_equal(
+        online.get_many_df([4, 3]).index, pd.Index([4, 3], name="txn_id")
+    )
@@ -0,0 +1,86 @@
+"""Tests for util.fingerprint DataFrame content fingerprints"""
+
+# External Dependencies:
+import numpy as np
+import pandas as pd
+
+# Local Dependencies:
+from util.fingerprint import dataframe_fingerprint
+
+
+def _frame() -> pd.DataFrame:
+    return pd.DataFrame({
+        "txn_id": [1, 2, 3, 4],
+        "credit_amount": [1000, 2500, 400, 9000],
+        "score": [0.1, 0.5, 0.9, 0.25],
+        "has_telephone": [True, False, True, True],
+        "dataset": ["train", "validation", "test", "train"],
+    })
+
+
+def test_equal_frames_get_equal_fingerprints():
+    df = _frame()
+    assert dataframe_fingerprint(df) == dataframe_fingerprint(_frame())
+    assert dataframe_fingerprint(df) == dataframe_fingerprint(df.copy())
+    # A different index (e.g. after filtering) doesn't matter unless asked for:
+    reindexed = _frame().set_index(pd.Index([10, 11, 12, 13]))
+    assert dataframe_fingerprint(reindexed) == dataframe_fingerprint(df)
+    assert dataframe_fingerprint(reindexed, include_index=True) != dataframe_fingerprint(
+        df, include_index=True
+    )
+
+
+def test_row_order_sensitivity():
+    df = _frame()
+    shuffled = df.sample(frac=1, random_state=1337)
+    assert not shuffled.index.equals(df.index)
+
+    assert dataframe_fingerprint(shuffled) != dataframe_fingerprint(df)
+    assert dataframe_fingerprint(shuffled, order_sensitive=False) == dataframe_fingerprint(
+        df, order_sensitive=False
+    )
+    assert dataframe_fingerprint(
+        shuffled.reset_index(drop=True), order_sensitive=False
+    ) == dataframe_fingerprint(df, order_sensitive=False)
+
+
+def test_dtype_changes_change_fingerprint():
+    df = _frame()
+    variants = [
+        df.astype({ "credit_amount": "float64" }),
+        df.astype({ "credit_amount": "Int64" }),
+        df.astype({ "dataset": "category" }),
+        df.astype({ "has_telephone": "int64" }),
+    ]
+    for order_sensitive in (True, False):
+        base = dataframe_fingerprint(df, order_sensitive=order_sensitive)
+        for variant in variants:
+            assert dataframe_fingerprint(variant, order_sensitive=order_sensitive) != base
+
+
+def test_no_collisions_between_small_changes():
+    df = _frame()
+    variants = {
+        "original": df,
+        "renamed column": df.rename(columns={ "score": "score2" }),
+        "swapped columns": df[["credit_amount", "txn_id", "score", "has_telephone", "dataset"]],
+        "swapped column values": df.assign(txn_id=df["credit_amount"], credit_amount=df["txn_id"]),
+        "dropped row": df.iloc[:-1],
+        "duplicated row": pd.concat([df, df.iloc[[0]]], ignore_index=True),
+        "missing value": df.assign(score=[0.1, np.nan, 0.9, 0.25]),
+        "empty text": df.assign(dataset=["train", "", "test", "train"]),
+        "no rows": df.iloc[:0],
+    }
+    rng = np.random.default_rng(1337)
+    for ix in range(200):
+        row = int(rng.integers(len(df)))
+        variants[f"changed amount {ix}"] = df.assign(
+            credit_amount=df["credit_amount"].where(df.index != row, 10000 + ix)
+        )
+
+    for order_sensitive in (True, False):
+        fingerprints = {
+            name: dataframe_fingerprint(variant, order_sensitive=order_sensitive)
+            for name, variant in variants.items()
+        }
+        assert len(set(fingerprints.values())) == len(fingerprints)
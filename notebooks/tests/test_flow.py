@@ -0,0 +1,385 @@
+"""Tests for util.flow local Data Wrangler flow execution"""
+
+# External Dependencies:
+import numpy as np
+import pandas as pd
+import pytest
+
+# Local Dependencies:
+from util import flow
+
+
+#### Expression parsing
+
+def test_parse_cast_with_precision():
+    assert flow.parse_expression("cast(a as decimal(10, 2))") == ("cast", ("col", "a"), "decimal")
+    assert flow.parse_expression("cast(a as long) + 1") == (
+        "binop", "+", ("cast", ("col", "a"), "long"), ("lit", 1)
+    )
+
+
+@pytest.mark.parametrize(
+    "formula",
+    ["cast(a as decimal(10", "cast(a as decimal(10, 2", "cast(a as decimal(10, 2)", "cast(a as long"],
+)
+def test_parse_unterminated_cast_raises(formula):
+    with pytest.raises(ValueError, match="Expected \\)"):
+        flow.parse_expression(formula)
+
+
+
+#### Window functions
+
+def _window_frame() -> pd.DataFrame:
+    """Partitions (including a null key) with tied & null ordering keys and null values"""
+    rng = np.random.default_rng(1337)
+    n = 60
+    return pd.DataFrame({
+        "p": pd.Series(rng.choice(["a", "b", "c"], n), dtype="object").where(rng.random(n) > 0.15, None),
+        "k": pd.Series(rng.integers(0, 5, n), dtype="float64").where(rng.random(n) > 0.2, np.nan),
+        "v": pd.Series(rng.integers(-20, 20, n), dtype="float64").where(rng.random(n) > 0.2, np.nan),
+    })
+
+
+def _spark_sort_key(value, ascending: bool):
+    """Spark ordering: Nulls first when ascending, last when descending"""
+    if pd.isna(value):
+        return -np.inf if ascending else np.inf
+    return value if ascending else -value
+
+
+def _brute_force_window(df: pd.DataFrame, fn: str, ascending=None) -> list:
+    """Spark window semantics row by row: Null partition keys form their own partition, and with an ORDER BY
+    the aggregates' default (RANGE) frame runs from the partition start to the current row's last peer"""
+    results = []
+    for ix in range(len(df)):
+        row = df.iloc[ix]
+        same_partition = (df["p"] == row["p"]) | (df["p"].isna() & pd.isna(row["p"]))
+        members = df[same_partition]
+        if ascending is None:
+            frame = members
+        else:
+            keys = members["k"].map(lambda v: _spark_sort_key(v, ascending))
+            key = _spark_sort_key(row["k"], ascending)
+            frame = members[keys <= key]
+            before = keys[keys < key]
+        values = frame["v"].dropna()
+        if fn == "rank":
+            results.append(len(before) + 1)
+        elif fn == "dense_rank":
+            results.append(before.nunique() + 1)
+        elif fn == "count":
+            results.append(len(values))
+        elif fn in ("sum", "min", "max", "avg"):
+            results.append(getattr(values, "mean" if fn == "avg" else fn)() if len(values) else np.nan)
+    return results
+
+
+@pytest.mark.parametrize("fn", ["rank", "dense_rank", "count", "sum", "avg", "min", "max"])
+@pytest.mark.parametrize("ascending", [True, False, None])
+def test_window_functions_match_brute_force(fn, ascending):
+    df = _window_frame()
+    arg = "" if fn in ("rank", "dense_rank") else "v"
+    order = "" if ascending is None else f" ORDER BY k{'' if ascending else ' DESC'}"
+    if ascending is None and fn in ("rank", "dense_rank"):
+        with pytest.raises(ValueError, match="requires an ORDER BY"):
+            flow.evaluate_expression(f"{fn}() OVER (PARTITION BY p)", df)
+        return
+    result = flow.evaluate_expression(f"{fn}({arg}) OVER (PARTITION BY p{order})", df)
+
+    expected = _brute_force_window(df, fn, ascending)
+    np.testing.assert_allclose(
+        result.astype("float64").to_numpy(), np.array(expected, dtype="float64"), equal_nan=True
+    )
+
+
+@pytest.mark.parametrize("ascending", [True, False])
+def test_row_number_is_stable_over_ties(ascending):
+    df = _window_frame()
+    result = flow.evaluate_expression(
+        f"row_number() OVER (PARTITION BY p ORDER BY k{'' if ascending else ' DESC'})", df
+    )
+    # (Spark doesn't define the order of ties: Locally they keep their input order)
+    expected = pd.Series(0, index=df.index)
+    for _, members in df.groupby(df["p"].fillna("<null>")):
+        keys = members["k"].map(lambda v: _spark_sort_key(v, ascending))
+        ordered = keys.sort_values(kind="stable").index
+        expected[ordered] = np.arange(1, len(ordered) + 1)
+    assert result.tolist() == expected.tolist()
+
+
+def test_window_sum_keeps_precision_across_partitions():
+    df = pd.DataFrame({ "p": ["a"] * 5 + ["b"] * 10, "v": [1e17] * 5 + [0.1] * 10 })
+    result = flow.evaluate_expression("sum(v) OVER (PARTITION BY p ORDER BY v)", df)
+    # Every "b" row is a peer of the others, so each gets the partition's whole sum - not lost to 1e17s:
+    assert result.iloc[5:].tolist() == pytest.approx([1.0] * 10, rel=1e-12)
+    result = flow.evaluate_expression("sum(v) OVER (PARTITION BY p)", df)
+    assert result.iloc[5:].tolist() == pytest.approx([1.0] * 10, rel=1e-12)
+
+
+#### Plan optimization
+
+def _node(node_id: str, operator: str, parameters: dict, input_id: str=None) -> flow.FlowNode:
+    return flow.FlowNode(
+        node_id=node_id,
+        type="SOURCE" if input_id is None else "TRANSFORM",
+        operator=operator,
+        parameters=parameters,
+        trained_parameters={},
+        input_ids=[] if input_id is None else [input_id],
+    )
+
+
+def _move_then_drop_flow(move_type: str, move_params: dict) -> dict:
+    """Flow that derives a column, moves a column, then drops two columns (one source, one derived)"""
+    move_key = {
+        "Move to index": "move_to_index_parameters",
+        "Move to start": "move_to_start_parameters",
+        "Move after": "move_after_parameters",
+    }[move_type]
+    nodes = [
+        _node("src", "sagemaker.s3_source_0.1", { "dataset_definition": { "name": "raw" } }),
+        _node(
+            "formula",
+            "sagemaker.spark.custom_formula_0.1",
+            { "output_column": "total", "formula": "a + b" },
+            "src",
+        ),
+        _node(
+            "move",
+            "sagemaker.spark.manage_columns_0.1",
+            {
+                "operator": "Move column",
+                "move_column_parameters": { "move_type": move_type, move_key: move_params },
+            },
+            "formula",
+        ),
+        _node(
+            "drop",
+            "sagemaker.spark.manage_columns_0.1",
+            { "operator": "Drop column", "drop_column_parameters": { "column_to_drop": ["b", "total"] } },
+            "move",
+        ),
+    ]
+    return flow.nodes_to_flow({ n.node_id: n for n in nodes })
+
+
+@pytest.mark.parametrize(
+    "move_type,move_params",
+    [
+        ("Move to index", { "column_to_move": "d", "index": 2 }),
+        ("Move to index", { "column_to_move": "a", "index": 3 }),
+        ("Move to start", { "column_to_move": "c" }),
+        ("Move after", { "column_to_move": "a", "target_column": "c" }),
+    ],
+)
+def test_optimized_plan_keeps_column_order(move_type, move_params):
+    test_flow = _move_then_drop_flow(move_type, move_params)
+    sources = { "raw": pd.DataFrame({ "a": ["1", "2"], "b": ["3", "4"], "c": ["x", "y"], "d": ["p", "q"] }) }
+
+    expected = flow.execute_flow(test_flow, sources=sources, optimize=False, verbose=False)
+    optimized = flow.execute_flow(test_flow, sources=sources, optimize=True, verbose=False)
+    pd.testing.assert_frame_equal(optimized, expected)
+
+
+def test_ordinal_encode_into_new_column_keeps_input():
+    nodes = [
+        _node("src", "sagemaker.s3_source_0.1", { "dataset_definition": { "name": "raw" } }),
+        _node(
+            "formula",
+            "sagemaker.spark.custom_formula_0.1",
+            { "output_column": "purpose", "formula": "concat(purpose, '_x')" },
+            "src",
+        ),
+        _node(
+            "encode",
+            "sagemaker.spark.encode_categorical_0.1",
+            {
+                "operator": "Ordinal encode",
+                "ordinal_encode_parameters": {
+                    "input_column": "purpose",
+                    "output_column": "purpose_code",
+                    "invalid_handling_strategy": "Keep",
+                },
+            },
+            "formula",
+        ),
+    ]
+    # The operator keeps its input column, so the plan mustn't think it's dropped:
+    assert flow.node_effect(nodes[2]) == (["purpose"], ["purpose_code"], [], False)
+    test_flow = flow.nodes_to_flow({ n.node_id: n for n in nodes })
+    sources = {
+        "raw": pd.DataFrame({ "purpose": ["car", "tv", "car", None], "amount": ["1", "2", "3", "4"] }),
+    }
+
+    expected = flow.execute_flow(test_flow, sources=sources, optimize=False, verbose=False)
+    assert list(expected.columns) == ["purpose", "amount", "purpose_code"]
+    optimized = flow.execute_flow(test_flow, sources=sources, optimize=True, verbose=False)
+    pd.testing.assert_frame_equal(optimized, expected)
+
+
+#### Sparse outputs
+
+def _encoding_flow() -> dict:
+    """Flow with a numeric label, a "Columns"-style one-hot encoding and a count vectorizer"""
+    nodes = [
+        _node("src", "sagemaker.s3_source_0.1", { "dataset_definition": { "name": "raw" } }),
+        _node(
+            "label",
+            "sagemaker.spark.custom_formula_0.1",
+            { "output_column": "y", "formula": "cast(y as long)" },
+            "src",
+        ),
+        _node(
+            "onehot",
+            "sagemaker.spark.encode_categorical_0.1",
+            {
+                "operator": "One-hot encode",
+                "one_hot_encode_parameters": {
+                    "input_column": "purpose",
+                    "invalid_handling_strategy": "Keep",
+                    "output_style": "Columns",
+                    "drop_last": False,
+                },
+            },
+            "label",
+        ),
+        _node(
+            "text",
+            "sagemaker.spark.featurize_text_0.1",
+            {
+                "operator": "Vectorize",
+                "vectorize_parameters": {
+                    "input_column": "notes",
+                    "output_format": "Columns",
+                    "tokenizer": "Standard",
+                    "vectorizer": "Count Vectorizer",
+                },
+            },
+            "onehot",
+        ),
+    ]
+    return flow.nodes_to_flow({ n.node_id: n for n in nodes })
+
+
+ENCODING_SOURCES = {
+    "raw": pd.DataFrame({
+        "y": ["1", "0", "1"],
+        "purpose": ["car", "tv", None],
+        "notes": ["new car car", "", None],
+    }),
+}
+
+
+def test_sparse_output_densifies_to_dense_output():
+    dense = flow.execute_flow(_encoding_flow(), sources=ENCODING_SOURCES, verbose=False)
+    sparse = flow.execute_flow(_encoding_flow(), sources=ENCODING_SOURCES, verbose=False, sparse=True)
+
+    encoded = ["purpose_car", "purpose_tv", "purpose_invalid", "notes_car", "notes_new"]
+    assert list(dense.columns) == ["y"] + encoded
+    assert all(isinstance(sparse[c].dtype, pd.SparseDtype) for c in encoded)
+    densified = sparse.apply(lambda c: c.sparse.to_dense() if isinstance(c.dtype, pd.SparseDtype) else c)
+    pd.testing.assert_frame_equal(densified, dense)
+
+    dense_matrix, columns = flow.to_csr(dense, encoded)
+    sparse_matrix, _ = flow.to_csr(sparse, encoded)
+    assert columns == encoded
+    np.testing.assert_array_equal(sparse_matrix.toarray(), dense_matrix.toarray())
+    np.testing.assert_array_equal(dense_matrix.toarray(), dense[encoded].to_numpy())
+
+
+def test_to_libsvm_text():
+    sparse = flow.execute_flow(_encoding_flow(), sources=ENCODING_SOURCES, verbose=False, sparse=True)
+    # Row 0: purpose "car" (0), "car" x2 (3) & "new" (4) in notes. Row 2: Null purpose kept as "invalid" (2)
+    assert flow.to_libsvm(sparse, "y") == "1 0:1 3:2 4:1\n0 1:1\n1 2:1\n"
+    assert flow.to_libsvm(sparse, "y", zero_based=False, chunk_rows=2) == "1 1:1 4:2 5:1\n0 2:1\n1 3:1\n"
+
+
+def test_to_libsvm_round_trips_through_svmlight_loader(tmp_path):
+    load_svmlight_file = pytest.importorskip("sklearn.datasets").load_svmlight_file
+    dense = flow.execute_flow(_encoding_flow(), sources=ENCODING_SOURCES, verbose=False)
+    path = flow.to_libsvm(dense, "y", path=str(tmp_path / "data.libsvm"))
+
+    X, y = load_svmlight_file(path, n_features=dense.shape[1] - 1, zero_based=True)
+    np.testing.assert_array_equal(y, dense["y"].to_numpy(dtype="float64"))
+    np.testing.assert_array_equal(X.toarray(), dense.drop(columns=["y"]).to_numpy())
+
+
+#### Result caching
+
+def _chain_flow(last_formula: str="y * 10") -> dict:
+    """Source -> x -> y -> z, each derived from the one before"""
+    nodes = [
+        _node("src", "sagemaker.s3_source_0.1", { "dataset_definition": { "name": "raw" } }),
+    ]
+    formulas = [("fx", "x", "cast(a as long) * 2"), ("fy", "y", "x + 1"), ("fz", "z", last_formula)]
+    for node_id, column, formula in formulas:
+        parameters = { "output_column": column, "formula": formula }
+        nodes.append(_node(node_id, "sagemaker.spark.custom_formula_0.1", parameters, nodes[-1].node_id))
+    return flow.nodes_to_flow({ n.node_id: n for n in nodes })
+
+
+def _last_run(cache: flow.FlowResultCache) -> list:
+    return cache.report()["last_run"].tolist()
+
+
+def test_cache_serves_unchanged_flow():
+    cache = flow.FlowResultCache()
+    sources = { "raw": pd.DataFrame({ "a": ["1", "2", "3"] }) }
+    first = flow.execute_flow(_chain_flow(), sources=sources, verbose=False, cache=cache)
+    assert _last_run(cache) == ["computed"] * 4
+    assert first["z"].tolist() == [30, 50, 70]
+
+    # Modifying a returned result mustn't affect the cache:
+    first.loc[0, "z"] = -1
+    second = flow.execute_flow(_chain_flow(), sources=sources, verbose=False, cache=cache)
+    assert _last_run(cache) == ["skipped", "skipped", "skipped", "hit"]
+    assert second["z"].tolist() == [30, 50, 70]
+
+
+def test_cache_recomputes_changed_source_data():
+    cache = flow.FlowResultCache()
+    flow.execute_flow(
+        _chain_flow(), sources={ "raw": pd.DataFrame({ "a": ["1", "2"] }) }, verbose=False, cache=cache
+    )
+    changed = flow.execute_flow(
+        _chain_flow(), sources={ "raw": pd.DataFrame({ "a": ["1", "5"] }) }, verbose=False, cache=cache
+    )
+    assert _last_run(cache) == ["computed"] * 4
+    assert changed["z"].tolist() == [30, 110]
+
+
+def test_parameter_change_recomputes_only_downstream_steps():
+    sources = { "raw": pd.DataFrame({ "a": ["1", "2", "3"] }) }
+    plan = flow.compile_flow(_chain_flow(), optimize=False)
+    edited_plan = flow.compile_flow(_chain_flow("y * 100"), optimize=False)
+    keys = plan.step_keys(sources)
+    edited_keys = edited_plan.step_keys(sources)
+    assert keys[:3] == edited_keys[:3] and keys[3] != edited_keys[3]
+
+    cache = flow.FlowResultCache()
+    flow.execute_flow(_chain_flow(), sources=sources, verbose=False, cache=cache)
+    edited = flow.execute_flow(_chain_flow("y * 100"), sources=sources, verbose=False, cache=cache)
+    assert _last_run(cache) == ["skipped", "skipped", "hit", "computed"]
+    pd.testing.assert_frame_equal(
+        edited, flow.execute_flow(_chain_flow("y * 100"), sources=sources, verbose=False)
+    )
+
+
+def test_cache_evicts_least_recently_used_at_max_bytes():
+    frames = {
+        name: pd.DataFrame({ "v": np.arange(100, dtype=np.int64) + ix }) for ix, name in enumerate("abc")
+    }
+    n_bytes = int(frames["a"].memory_usage(index=True, deep=True).sum())
+    cache = flow.FlowResultCache(max_bytes=2 * n_bytes)
+
+    assert cache.put("a", frames["a"]) and cache.put("b", frames["b"])
+    assert cache.get("a") is frames["a"]  # `b` is now the least recently used
+    assert cache.put("c", frames["c"])
+    assert cache.get("b") is None
+    assert cache.get("a") is frames["a"] and cache.get("c") is frames["c"]
+    assert cache.stats() == { "entries": 2, "bytes": 2 * n_bytes, "max_bytes": 2 * n_bytes, "evictions": 1 }
+
+    # Results too big for the cache at all are refused, without evicting anything:
+    assert not cache.put("big", pd.concat([frames["a"]] * 3, ignore_index=True))
+    assert cache.stats()["entries"] == 2
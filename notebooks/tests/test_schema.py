@@ -0,0 +1,63 @@
+"""Tests for util.schema, including the seed schema against what the Data Wrangler flow actually outputs"""
+
+# Python Built-Ins:
+import io
+import os
+
+# External Dependencies:
+import pandas as pd
+
+# Local Dependencies:
+from util import flow, schema
+
+FLOW_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "credit-prebuilt.flow")
+
+RAW_CSV = """txn_id,txn_timestamp,checking_acct_status,duration_months,credit_history,purpose,credit_amount,\
+savings_status,present_employment_yrs_lt,installment_rate_disp_income_pct,marital_status_and_gender,\
+other_parties,present_residence_since,highest_property,age_in_years,other_installment_plans,housing,\
+n_existing_credits_this_bank,job_type,n_dependants,telephone,foreign_worker,credit_risk
+0,1600000000,no checking account,15,3,radio_television,2013,100 <= ... < 500 DM,1,2,male : married/widowed,\
+none,3,unknown / no property 4,21,stores,for_free,2,3,1,yes,no,bad
+1,1600000001,0 <= ... < 200 DM,59,2,car_new,17297,100 <= ... < 500 DM,3,3,male : single,none,3,\
+real estate 1,23,stores,rent,2,1,1,no,yes,good
+2,1600000002,,,,,,,,,,,,,,,,,,,,,
+"""
+
+
+def _raw_source() -> pd.DataFrame:
+    """Raw credit data as the flow's source reads it (all text), with a row of missing values"""
+    return pd.read_csv(io.StringIO(RAW_CSV), dtype=str, keep_default_na=False, na_values=[""])
+
+
+def test_seed_schema_parses_flow_output(tmp_path):
+    source_id = next(
+        node_id for node_id, node in flow.parse_flow(FLOW_PATH).items() if "source" in node.operator
+    )
+    out_df = flow.execute_flow(FLOW_PATH, sources={ source_id: _raw_source() }, verbose=False)
+    # Data Wrangler writes missing values as empty CSV fields:
+    out_path = str(tmp_path / "flow-output.csv")
+    out_df.to_csv(out_path, index=False)
+
+    seed = schema.credit_default()
+    kwargs = schema.read_csv_kwargs(seed, out_path)
+    parsed = pd.read_csv(out_path, **kwargs)
+
+    assert list(parsed.columns) == list(out_df.columns)
+    # Every output column is covered by the schema:
+    assert set(kwargs["dtype"]) == set(out_df.columns)
+    for col in ("has_telephone", "is_foreign_worker", "gender_is_male", "highest_property"):
+        assert str(parsed[col].dtype) == "Int64"
+        assert parsed[col].isna().tolist() == [False, False, True]
+    assert parsed["has_telephone"].tolist()[:2] == [1, 0]
+
+
+def test_resolve_dtypes_prefers_exact_then_longest_prefix():
+    test_schema = {
+        "columns": { "purpose_other": "str" },
+        "prefixes": { "purpose_": "float64", "purpose_car_": "Int64" },
+    }
+    dtypes, unknown = schema.resolve_dtypes(
+        test_schema, ["purpose_other", "purpose_car_new", "purpose_business", "mystery"]
+    )
+    assert dtypes == { "purpose_other": "str", "purpose_car_new": "Int64", "purpose_business": "float64" }
+    assert unknown == ["mystery"]
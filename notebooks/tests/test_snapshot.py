@@ -0,0 +1,70 @@
+"""Tests for util.snapshot staleness checks"""
+
+# External Dependencies:
+import numpy as np
+import pandas as pd
+import pytest
+
+# Local Dependencies:
+from util import snapshot
+
+
+def test_round_trip_with_matching_expectations(tmp_path):
+    df = pd.DataFrame({
+        "txn_id": [1, 2, 3],
+        "score": [0.1, 0.5, 0.9],
+        "dataset": ["train", "test", "train"],
+    })
+    snapshot.save_dataframe("df", df, version="v1", snapshot_dir=str(tmp_path))
+
+    loaded = snapshot.load_dataframe(
+        "df", version="v1", columns=list(df.columns), dtypes=df.dtypes, snapshot_dir=str(tmp_path)
+    )
+    pd.testing.assert_frame_equal(loaded, df)
+    assert snapshot.snapshot_info("df", snapshot_dir=str(tmp_path))["dtypes"]["txn_id"] == "int64"
+
+
+def test_changed_column_dtype_is_stale(tmp_path):
+    expected = pd.DataFrame({ "txn_id": [1, 2, 3], "amount": [100, 250, 80] })
+    # Upstream data changed: `amount` now has a missing value, so it's float rather than int:
+    changed = expected.assign(amount=[100, np.nan, 80])
+    snapshot.save_dataframe("df", changed, snapshot_dir=str(tmp_path))
+
+    with pytest.raises(snapshot.StaleSnapshotError, match="amount"):
+        snapshot.load_dataframe("df", dtypes=expected.dtypes, snapshot_dir=str(tmp_path))
+    # Same column names, so a names-only check can't catch it:
+    snapshot.load_dataframe("df", columns=list(expected.columns), snapshot_dir=str(tmp_path))
+
+
+def test_categorical_dtype_change_is_stale(tmp_path):
+    df = pd.DataFrame({ "dataset": pd.Categorical(["train", "test", "train"]) })
+    snapshot.save_dataframe("df", df, snapshot_dir=str(tmp_path))
+
+    with pytest.raises(snapshot.StaleSnapshotError):
+        snapshot.load_dataframe("df", dtypes={ "dataset": "object" }, snapshot_dir=str(tmp_path))
+    loaded = snapshot.load_dataframe("df", dtypes={ "dataset": "category" }, snapshot_dir=str(tmp_path))
+    assert isinstance(loaded["dataset"].dtype, pd.CategoricalDtype)
+
+
+def test_load_converts_without_copying_numeric_columns(tmp_path):
+    df = pd.DataFrame({
+        "txn_id": [1, 2, 3],
+        "score": [0.1, 0.5, 0.9],
+        "amount": pd.array([100, None, 80], dtype="Int64"),
+        "has_telephone": [True, False, True],
+        "dataset": ["train", "test", "train"],
+    }, index=pd.Index([10, 11, 12], name="row"))
+    snapshot.save_dataframe("df", df, snapshot_dir=str(tmp_path))
+
+    loaded = snapshot.load_dataframe("df", snapshot_dir=str(tmp_path))
+    pd.testing.assert_frame_equal(loaded, df)
+    # Numeric columns are served from the memory-mapped file, so can't be modified in place...
+    with pytest.raises(ValueError, match="read-only"):
+        loaded.loc[10, "score"] = 1.0
+    # ...but a copy can:
+    copied = loaded.copy()
+    copied.loc[10, "score"] = 1.0
+    assert copied.loc[10, "score"] == 1.0
+
+    table = snapshot.load_dataframe("df", snapshot_dir=str(tmp_path), as_arrow=True)
+    assert table.column_names[:5] == list(df.columns)
@@ -0,0 +1,150 @@
+"""Tests for util.versioning dataset version stores, against a local moto S3 server"""
+
+# Python Built-Ins:
+import gzip
+import json
+
+# External Dependencies:
+import boto3
+import pandas as pd
+
+# Local Dependencies:
+from util import data, schema
+from util.versioning import DatasetVersionStore
+
+
+def _csv_bytes(df: pd.DataFrame, header: bool=True) -> bytes:
+    return df.to_csv(index=False, header=header).encode("utf-8")
+
+
+def _frame(start: int, rows: int=4) -> pd.DataFrame:
+    return pd.DataFrame({
+        "label": [v % 2 for v in range(start, start + rows)],
+        "amount": [float(v) * 1.5 for v in range(start, start + rows)],
+    })
+
+
+def _keys(s3_bucket: str, prefix: str) -> set:
+    return { obj.key for obj in data.list_s3_objects(f"s3://{s3_bucket}/{prefix}") }
+
+
+def _get_json(s3_uri: str):
+    bucket_name, _, key = s3_uri[len("s3://"):].partition("/")
+    return json.loads(boto3.client("s3").get_object(Bucket=bucket_name, Key=key)["Body"].read())
+
+
+#### Publishing
+
+def test_publish_same_data_twice_creates_no_new_objects(s3_bucket):
+    store = DatasetVersionStore(f"s3://{s3_bucket}/store")
+    datasets = { "train": [_csv_bytes(_frame(0)), _csv_bytes(_frame(4))], "test": [_csv_bytes(_frame(8))] }
+
+    version = store.publish(datasets)
+    keys = _keys(s3_bucket, "store/")
+    assert len(_keys(s3_bucket, "store/_objects/")) == 3
+    assert store.publish({ k: list(v) for k, v in datasets.items() }) == version
+    assert _keys(s3_bucket, "store/") == keys
+    assert store.latest_version() == version
+    assert len(store.list_versions()) == 1
+
+
+def test_publish_reuses_unchanged_parts(s3_bucket):
+    store = DatasetVersionStore(f"s3://{s3_bucket}/store")
+    first = store.publish({ "train": [_csv_bytes(_frame(0)), _csv_bytes(_frame(4))] })
+    second = store.publish({ "train": [_csv_bytes(_frame(0)), _csv_bytes(_frame(100))] })
+
+    assert second != first
+    # Only the changed part is stored again:
+    assert len(_keys(s3_bucket, "store/_objects/")) == 3
+    assert store.part_uris("train", first)[0] == store.part_uris("train", second)[0]
+    assert store.manifest(second)["parent"] == first
+    assert store.latest_version() == second
+    assert list(store.list_versions()["version"]) == [second, first]
+
+
+def test_manifest_contents(s3_bucket):
+    store = DatasetVersionStore(f"s3://{s3_bucket}/store")
+    parts = [_csv_bytes(_frame(0)), _csv_bytes(_frame(4))]
+    version = store.publish({ "train": parts }, ext=".csv", metadata={ "source": "s3://somewhere" })
+
+    manifest = store.manifest(version)
+    assert manifest["version"] == version
+    assert manifest["parent"] is None
+    assert manifest["metadata"] == { "source": "s3://somewhere" }
+    assert manifest["schemas"] == {}
+    assert list(manifest["datasets"]) == ["train"]
+    for entry, body in zip(manifest["datasets"]["train"], parts):
+        assert entry["size"] == len(body)
+        assert entry["key"] == f"_objects/{entry['sha256']}.csv"
+    assert store.part_uris("train", version) == [
+        f"s3://{s3_bucket}/store/{entry['key']}" for entry in manifest["datasets"]["train"]
+    ]
+
+    # Metadata isn't part of the version's identity:
+    assert store.publish({ "train": parts }, metadata={ "source": "s3://elsewhere" }) == version
+
+
+def test_channel_uri_is_sagemaker_manifest(s3_bucket):
+    store = DatasetVersionStore(f"s3://{s3_bucket}/store")
+    version = store.publish({ "train": [_csv_bytes(_frame(0)), _csv_bytes(_frame(4))] })
+
+    channel_uri = store.channel_uri("train", version)
+    assert channel_uri == f"s3://{s3_bucket}/store/_versions/{version}/train.manifest"
+    sm_manifest = _get_json(channel_uri)
+    # A common prefix, then the parts (in order) relative to it:
+    assert sm_manifest[0] == { "prefix": f"s3://{s3_bucket}/store/_objects/" }
+    assert [sm_manifest[0]["prefix"] + rel for rel in sm_manifest[1:]] == store.part_uris("train", version)
+
+
+def test_read_dataset_round_trip(s3_bucket):
+    store = DatasetVersionStore(f"s3://{s3_bucket}/store")
+    version = store.publish(
+        { "test": [gzip.compress(_csv_bytes(_frame(8), header=False), mtime=0)] }, ext=".csv.gz"
+    )
+    # (Compression is inferred from the stored parts' extension)
+    pd.testing.assert_frame_equal(
+        store.read_dataset("test", version, header=None, names=["label", "amount"]),
+        _frame(8),
+    )
+
+    plain = DatasetVersionStore(f"s3://{s3_bucket}/plain")
+    version = plain.publish({ "train": [_csv_bytes(_frame(0)), _csv_bytes(_frame(4))] })
+    pd.testing.assert_frame_equal(
+        plain.read_dataset("train", version),
+        pd.concat([_frame(0), _frame(4)], ignore_index=True),
+    )
+
+
+#### Dataset splits
+
+def test_split_to_version_store_keeps_schemas_in_manifest(s3_bucket, put_csv):
+    source = pd.DataFrame({
+        "txn_id": range(6),
+        "label": [0, 1, 0, 1, 1, 0],
+        "amount": [1.5, 2.0, 3.25, 4.0, 5.5, 6.0],
+        "dataset": ["train", "train", "test", "train", "test", "validation"],
+    })
+    put_csv("source/part0.csv", source)
+    store = DatasetVersionStore(f"s3://{s3_bucket}/store")
+
+    outputs = data.mock_featurestore_dataset_split(
+        f"s3://{s3_bucket}/source", f"s3://{s3_bucket}/out", version_store=store
+    )
+    version = store.latest_version()
+    assert outputs["test"] == store.part_uris("test", version)
+    # Nothing is written outside the store:
+    assert _keys(s3_bucket, "out/") == set()
+
+    test_schema = store.schema("test", version)
+    assert list(test_schema["columns"]) == ["label", "amount"]
+    test_df = store.read_dataset("test", version, **schema.read_csv_kwargs(test_schema, header=False))
+    expected = source[source["dataset"] == "test"][["label", "amount"]].reset_index(drop=True)
+    pd.testing.assert_frame_equal(test_df, expected, check_dtype=False)
+
+    # Re-running on unchanged data reuses the version (and writes nothing new):
+    keys = _keys(s3_bucket, "store/")
+    data.mock_featurestore_dataset_split(
+        f"s3://{s3_bucket}/source", f"s3://{s3_bucket}/out", version_store=store
+    )
+    assert store.latest_version() == version
+    assert _keys(s3_bucket, "store/") == keys
@@ -0,0 +1,41 @@
+"""Tests for util.wrangler processing input configuration"""
+
+# External Dependencies:
+import boto3
+import pytest
+
+pytest.importorskip("sagemaker")
+
+# Local Dependencies:
+from util import wrangler
+
+
+def _put_parts(s3_bucket: str, n: int=4) -> str:
+    s3 = boto3.client("s3")
+    for ix in range(n):
+        s3.put_object(Bucket=s3_bucket, Key=f"input/part{ix}.csv", Body=b"a,b\n1,2\n")
+    return f"s3://{s3_bucket}/input/"
+
+
+def test_multi_instance_inputs_replicated_by_default(s3_bucket):
+    s3uri = _put_parts(s3_bucket)
+    assert wrangler.s3_input_config(s3uri, instance_count=4) == ("File", "FullyReplicated")
+
+
+def test_explicit_distribution_type_is_used(s3_bucket):
+    s3uri = _put_parts(s3_bucket)
+    assert wrangler.s3_input_config(s3uri, instance_count=4, distribution_type="ShardedByS3Key") == (
+        "File", "ShardedByS3Key"
+    )
+    with pytest.raises(ValueError):
+        wrangler.s3_input_config(s3uri, instance_count=4, distribution_type="Sharded")
+
+
+def test_size_based_sharding_is_opt_in(s3_bucket, monkeypatch):
+    s3uri = _put_parts(s3_bucket)
+    monkeypatch.setattr(wrangler.defaults, "shard_threshold_bytes", 1)
+    assert wrangler.s3_input_config(s3uri, instance_count=4) == ("File", "ShardedByS3Key")
+    # Fewer objects than instances: Not sharded
+    assert wrangler.s3_input_config(s3uri, instance_count=8) == ("File", "FullyReplicated")
+    # Single-instance jobs have nothing to shard across:
+    assert wrangler.s3_input_config(s3uri, instance_count=1) == ("File", "FullyReplicated")
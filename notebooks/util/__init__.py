@@ -1,7 +1,13 @@
 """Utility code for SM MLOps workshop notebooks"""
 
 from . import data
+from . import featurestore
+from . import fingerprint
+from . import flow
 from . import project
 from . import plotting
+from . import schema
+from . import snapshot
 from . import uid
+from . import versioning
 from . import wrangler
@@ -1,46 +1,1292 @@
 """Utilities for reading & manipulating data in S3"""
 
 # Python Built-Ins:
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from itertools import zip_longest
+import hashlib
+import io
+import json
+import math
+import os
 import re
-from typing import List
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple, Union
+import uuid
 
 # External Dependencies:
 import boto3
+import numpy as np
 import pandas as pd
+import pyarrow.dataset as pads
+import pyarrow.fs as pafs
 
+# Local Dependencies:
+from . import schema as dataset_schema
+from . import snapshot
 
-def dataframe_from_s3_folder(s3uri: str, **kwargs):
-    """Read (multiple) .csv files under an `s3uri` prefix into one combined Pandas DataFrame
+# Rows per chunk when an eager load needs to parse in chunks (e.g. to apply a row filter):
+FILTER_CHUNKSIZE = 100000
 
-    Implementation assumes your environment is set up for pd.read_csv("s3://...") to work (i.e. s3fs is
-    installed with appropriate versions)
+# Supported CSV compression types (as Pandas `compression` names) and their file extensions:
+COMPRESSION_EXTENSIONS = {
+    "gzip": ".gz",
+    "zstd": ".zst",
+}
 
-    :param s3uri: Source data prefix
-    :param **kwargs: Passed through to Pandas.read_csv()
-    """
+
+def _split_s3uri(s3uri: str):
+    """Split an s3://bucket/prefix URI into (bucket_name, prefix), validating the scheme"""
     if not s3uri.lower().startswith("s3://"):
         raise ValueError(f"s3uri must be a valid S3 URI like s3://bucket/path... Got {s3uri}")
     bucket_name, _, prefix = s3uri[len("s3://"):].partition("/")
-    bucket = boto3.resource("s3").Bucket(bucket_name)
+    return bucket_name, prefix
+
+
+def _is_data_key(key: str) -> bool:
+    """Check whether an S3 object key looks like a loadable data file (.csv, or .out from batch transform)
+
+    Compressed variants (e.g. .csv.gz, .csv.zst) are accepted too: Pandas decompresses them transparently,
+    inferring the compression from the file extension.
+    """
+    key_lower = key.lower()
+    for suffix in COMPRESSION_EXTENSIONS.values():
+        if key_lower.endswith(suffix):
+            key_lower = key_lower[:-len(suffix)]
+            break
+    # Batch transform results come through with '.out', so we'll allow those too:
+    return key_lower.endswith(".csv") or key_lower.endswith(".out")
+
+
+def _is_parquet_key(key: str) -> bool:
+    """Check whether an S3 object key looks like a Parquet file (e.g. Spark's part-*.snappy.parquet)"""
+    return key.lower().endswith(".parquet")
+
+
+def _is_hidden_key(key: str) -> bool:
+    """Check whether an S3 object key is a marker/metadata file like Spark's _SUCCESS, or a folder marker"""
+    basename = key.rpartition("/")[2]
+    return basename == "" or basename.startswith("_") or basename.startswith(".")
+
+
+# Listed S3 object (attribute names match boto3's ObjectSummary, for interchangeability):
+S3Object = namedtuple("S3Object", ["bucket_name", "key", "e_tag", "size", "last_modified"])
+
+
+def _list_prefix_level(s3_client, bucket_name: str, prefix: str, delimiter: Optional[str]=None):
+    """List one S3 prefix (all pages), returning ([S3Object], [common sub-prefix])"""
+    objs = []
+    subprefixes = []
+    list_kwargs = { "Bucket": bucket_name, "Prefix": prefix }
+    if delimiter:
+        list_kwargs["Delimiter"] = delimiter
+    for page in s3_client.get_paginator("list_objects_v2").paginate(**list_kwargs):
+        objs += [
+            S3Object(bucket_name, o["Key"], o["ETag"], o["Size"], o["LastModified"])
+            for o in page.get("Contents", [])
+        ]
+        subprefixes += [p["Prefix"] for p in page.get("CommonPrefixes", [])]
+    return objs, subprefixes
+
+
+def list_s3_objects(
+    s3uri: str,
+    max_workers: int=16,
+    shard_depth: int=1,
+    delimiter: str="/",
+    s3_client=None,
+) -> List[S3Object]:
+    """List all objects under an S3 prefix, sharding the listing across sub-prefixes in parallel
+
+    S3 listing is paginated 1000 keys at a time, so one serial listing of a folder with tens of thousands of
+    objects (like data capture or many-part outputs) takes many round trips. Instead, this function first
+    discovers sub-prefixes using `delimiter` (down to `shard_depth` levels, e.g. the YYYY/MM/DD/HH folders
+    of data capture) and then lists each of them concurrently. Results are merged in key order.
+
+    :param s3uri: Prefix to list, like s3://bucket/folder/
+    :param max_workers: Maximum number of concurrent listing requests
+    :param shard_depth: Number of delimiter levels to discover sub-prefixes for before listing each fully
+        (0 = a plain serial listing)
+    :param delimiter: Delimiter for discovering sub-prefixes
+    :param s3_client: Optional boto3 S3 client to use (e.g. configured for a local S3 stand-in endpoint).
+        Defaults to boto3.client("s3").
+    """
+    bucket_name, prefix = _split_s3uri(s3uri)
+    s3_client = s3_client or boto3.client("s3")
+    objs = []
+    prefixes = [prefix]
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        # Discover sub-prefixes level by level (collecting any objects found directly at each level):
+        for _ in range(shard_depth):
+            if not len(prefixes):
+                break
+            next_prefixes = []
+            for level_objs, subprefixes in executor.map(
+                lambda p: _list_prefix_level(s3_client, bucket_name, p, delimiter),
+                prefixes,
+            ):
+                objs += level_objs
+                next_prefixes += subprefixes
+            prefixes = next_prefixes
+        # Then list the remaining prefixes' full contents concurrently:
+        for prefix_objs, _ in executor.map(
+            lambda p: _list_prefix_level(s3_client, bucket_name, p),
+            prefixes,
+        ):
+            objs += prefix_objs
+    return sorted(objs, key=lambda obj: obj.key)
+
+
+def _delete_keys(bucket_name: str, keys: List[str], max_workers: int=8, s3_client=None):
+    """Delete S3 objects by key, in concurrent batches of 1000 (the DeleteObjects API limit)"""
+    s3_client = s3_client or boto3.client("s3")
+    batches = [keys[i:i + 1000] for i in range(0, len(keys), 1000)]
+
+    def delete_batch(batch):
+        response = s3_client.delete_objects(
+            Bucket=bucket_name,
+            Delete={ "Objects": [{ "Key": key } for key in batch], "Quiet": True },
+        )
+        if len(response.get("Errors", [])):
+            raise RuntimeError(
+                f"Failed to delete {len(response['Errors'])} objects: {response['Errors'][:5]}"
+            )
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        list(executor.map(delete_batch, batches))
+
+
+def delete_s3_folder(s3uri: str, max_workers: int=8, s3_client=None) -> int:
+    """Delete every object under an S3 prefix, returning the number of objects deleted
+
+    :param s3uri: Prefix to delete, like s3://bucket/folder/ (be careful to include the trailing slash if
+        you don't want to also delete e.g. s3://bucket/folder-2/...)
+    :param max_workers: Maximum number of concurrent list/delete requests
+    :param s3_client: Optional boto3 S3 client to use
+    """
+    bucket_name, _ = _split_s3uri(s3uri)
+    objs = list_s3_objects(s3uri, max_workers=max_workers, s3_client=s3_client)
+    _delete_keys(bucket_name, [obj.key for obj in objs], max_workers=max_workers, s3_client=s3_client)
+    print(f"Deleted {len(objs)} objects from {s3uri}")
+    return len(objs)
+
+
+def _list_data_objects(bucket_name: str, prefix: str) -> List[S3Object]:
+    """List the loadable data objects under an S3 prefix, sorted by key"""
+    return [obj for obj in list_s3_objects(f"s3://{bucket_name}/{prefix}") if _is_data_key(obj.key)]
+
+
+def _list_format_objects(
+    bucket_name: str,
+    prefix: str,
+    data_format: str="auto",
+) -> Tuple[str, List[S3Object]]:
+    """List the data objects under an S3 prefix, resolving which format ("csv" or "parquet") to read them as
+
+    In "auto" mode, the folder is read as Parquet if it contains any `.parquet` objects, otherwise as CSV. In
+    explicit "parquet" mode, all non-hidden objects are assumed to be Parquet (whatever their extension).
+    """
+    data_format = data_format.lower()
+    if data_format not in ("auto", "csv", "parquet"):
+        raise ValueError(f"data_format must be 'auto', 'csv' or 'parquet'. Got '{data_format}'")
+    all_objs = list_s3_objects(f"s3://{bucket_name}/{prefix}")
+    if data_format == "parquet":
+        return "parquet", [obj for obj in all_objs if obj.size > 0 and not _is_hidden_key(obj.key)]
+    if data_format == "auto":
+        parquet_objs = [obj for obj in all_objs if _is_parquet_key(obj.key) and not _is_hidden_key(obj.key)]
+        if len(parquet_objs):
+            return "parquet", parquet_objs
+    return "csv", [obj for obj in all_objs if _is_data_key(obj.key)]
+
+
+class S3ObjectCache:
+    """Local disk cache for (immutable) S3 objects, keyed by bucket, key and ETag
+
+    Objects are stored as files under `cache_dir`, named by a hash of their bucket, key and ETag - so an
+    object that changes in S3 (new ETag) simply misses the cache, and the stale copy ages out. When the
+    total size of cached files exceeds `max_bytes`, least-recently-used files are evicted (recency is
+    tracked via file modification times, so it persists between notebook kernel sessions).
+
+    Pass an instance as the `cache` argument of the loaders in this module to enable caching, e.g:
+
+    >>> cache = util.data.S3ObjectCache("/tmp/s3cache", max_bytes=2 * 1024**3)
+    >>> df = util.data.dataframe_from_s3_folder(flow_output_s3uri, cache=cache)
+    >>> cache.stats()
+    """
+    def __init__(self, cache_dir: str, max_bytes: int=2 * 1024**3):
+        """Create (or re-open) a cache
+
+        :param cache_dir: Local folder to store cached objects in (created if it doesn't exist)
+        :param max_bytes: Size cap for the cache, above which least-recently-used objects are evicted
+        """
+        self.cache_dir = os.path.abspath(os.path.expanduser(cache_dir))
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def path_for(self, bucket_name: str, key: str, etag: str) -> str:
+        """Local path where the given object version is (or would be) cached"""
+        etag = etag.strip('"')  # boto3 listings return ETags wrapped in quotes
+        digest = hashlib.sha256(f"{bucket_name}/{key}#{etag}".encode()).hexdigest()
+        # Keep the original file name as a suffix so readers can still infer e.g. compression from it:
+        return os.path.join(self.cache_dir, f"{digest}-{os.path.basename(key)}")
+
+    def get(self, bucket_name: str, key: str, etag: str, fetch: Callable[[str], None]) -> str:
+        """Return a local path for the object, calling `fetch(local_path)` to download it on a cache miss
+
+        :param bucket_name: S3 bucket name of the object
+        :param key: S3 key of the object
+        :param etag: Current ETag of the object (as reported by S3 listing/HEAD)
+        :param fetch: Callable that writes the object's content to the given local file path. Anything that
+            can produce the content will do, e.g. a boto3 download_file() or a shutil.copyfile() from a local
+            folder standing in for S3.
+        """
+        path = self.path_for(bucket_name, key, etag)
+        try:
+            os.utime(path)  # Mark as recently used
+            with self._lock:
+                self.hits += 1
+            return path
+        except FileNotFoundError:
+            pass
+
+        with self._lock:
+            self.misses += 1
+        # Fetch to a temporary name first so concurrent readers never see a partial file:
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            fetch(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self._evict(keep=path)
+        return path
+
+    def _evict(self, keep: Optional[str]=None):
+        """Delete least-recently-used cached files until the cache is within max_bytes"""
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.cache_dir):
+                if entry.is_file() and not entry.name.endswith(".tmp"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total_bytes = sum(e[1] for e in entries)
+            for _, size, path in sorted(entries):
+                if total_bytes <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total_bytes -= size
+                self.evictions += 1
+
+    def size_bytes(self) -> int:
+        """Total size of the files currently in the cache"""
+        return sum(
+            e.stat().st_size for e in os.scandir(self.cache_dir)
+            if e.is_file() and not e.name.endswith(".tmp")
+        )
+
+    def clear(self):
+        """Delete all cached files (counters are kept)"""
+        with self._lock:
+            for entry in os.scandir(self.cache_dir):
+                if entry.is_file():
+                    os.remove(entry.path)
+
+    def stats(self) -> dict:
+        """Summary of cache hits, misses, evictions and current size"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size_bytes": self.size_bytes(),
+            "max_bytes": self.max_bytes,
+        }
+
+
+def _object_source(bucket_name: str, obj, cache: Optional[S3ObjectCache]=None) -> str:
+    """Path or URI Pandas should read `obj` (an S3Object) from: Via `cache` if one is provided"""
+    if cache is None:
+        return f"s3://{bucket_name}/{obj.key}"
+    return cache.get(
+        bucket_name,
+        obj.key,
+        obj.e_tag,
+        lambda path: boto3.client("s3").download_file(bucket_name, obj.key, path),
+    )
 
-    df = pd.DataFrame()
-    for obj in bucket.objects.filter(Prefix=prefix):
-        obj_key_lower = obj.key.lower()
-        # Batch transform results come through with '.out', so we'll allow those too:
-        if not (obj_key_lower.endswith(".csv") or obj_key_lower.endswith(".out")):
+
+def _pushdown_read_kwargs(
+    columns: Optional[List[str]],
+    filter_columns: List[str],
+    read_kwargs: dict,
+) -> dict:
+    """Pandas.read_csv() kwargs to parse only the columns needed for `columns` plus a row filter"""
+    if columns is None:
+        return read_kwargs
+    if "usecols" in read_kwargs:
+        raise ValueError("Specify either `columns` or the Pandas `usecols` argument, not both")
+    return { **read_kwargs, "usecols": list(dict.fromkeys(list(columns) + list(filter_columns))) }
+
+
+def _apply_pushdown(
+    df: pd.DataFrame,
+    columns: Optional[List[str]],
+    row_filter: Optional[Callable[[pd.DataFrame], pd.Series]],
+) -> pd.DataFrame:
+    """Filter a (chunk) DataFrame's rows by `row_filter`, then project to `columns` (in the given order)"""
+    if row_filter is not None:
+        df = df[row_filter(df)]
+    if columns is not None:
+        df = df[list(columns)]
+    return df
+
+
+def _read_csv_pushdown(
+    source: str,
+    columns: Optional[List[str]]=None,
+    row_filter: Optional[Callable[[pd.DataFrame], pd.Series]]=None,
+    filter_columns: List[str]=[],
+    chunksize: Optional[int]=None,
+    schema: Optional[dict]=None,
+    **kwargs,
+):
+    """Iterate DataFrame chunks of one CSV source, applying column projection and row filtering as it's parsed
+
+    Unused columns are skipped by the parser itself (via `usecols`), and rows are filtered per chunk so only
+    matching rows are ever accumulated. If `chunksize` is None, yields a single DataFrame (still reading in
+    chunks internally when a `row_filter` is set). If a `schema` is given (see util.schema), columns are
+    parsed with its explicit dtypes rather than inferred.
+    """
+    if schema is not None:
+        header = kwargs.pop("header", "infer")
+        kwargs = dataset_schema.read_csv_kwargs(schema, source, header=header is not None, **kwargs)
+    read_kwargs = _pushdown_read_kwargs(columns, filter_columns, kwargs)
+    if chunksize is None and row_filter is None:
+        yield _apply_pushdown(pd.read_csv(source, **read_kwargs), columns, row_filter)
+        return
+
+    with pd.read_csv(source, chunksize=chunksize or FILTER_CHUNKSIZE, **read_kwargs) as reader:
+        if chunksize is not None:
+            for chunk in reader:
+                yield _apply_pushdown(chunk, columns, row_filter)
+        else:
+            chunks = [_apply_pushdown(chunk, columns, row_filter) for chunk in reader]
+            yield pd.concat(chunks, axis=0, ignore_index=True) if len(chunks) else pd.DataFrame()
+
+
+def _memory_bytes(df: pd.DataFrame) -> int:
+    """Total memory used by a DataFrame, including the contents of object (e.g. string) columns"""
+    return int(df.memory_usage(deep=True).sum())
+
+
+def _compact(df: pd.DataFrame, max_category_fraction: float=0.5) -> pd.DataFrame:
+    """Convert low-cardinality text columns to category dtype and downcast numeric columns where lossless"""
+    compacted = {}
+    n_rows = len(df)
+    for colname in df.columns:
+        col = df[colname]
+        if pd.api.types.is_bool_dtype(col.dtype) or isinstance(col.dtype, pd.CategoricalDtype):
             continue
-        print(f"Loading {obj.key}")
-        obj_df = pd.read_csv(f"s3://{bucket_name}/{obj.key}", **kwargs)
-        df = pd.concat((df, obj_df), axis=0, ignore_index=True)
+        elif pd.api.types.is_integer_dtype(col.dtype):
+            # (The min of an all-missing nullable column is NA, which can't be compared)
+            col_min = col.min()
+            unsigned = n_rows > 0 and not pd.isna(col_min) and col_min >= 0
+            downcast = pd.to_numeric(col, downcast="unsigned" if unsigned else "integer")
+            if downcast.dtype != col.dtype:
+                compacted[colname] = downcast
+        elif pd.api.types.is_float_dtype(col.dtype):
+            downcast = pd.to_numeric(col, downcast="float")
+            # float32 can't represent every float64, so only keep the downcast if no values changed:
+            if downcast.dtype != col.dtype and np.array_equal(
+                downcast.to_numpy(dtype="float64"), col.to_numpy(), equal_nan=True,
+            ):
+                compacted[colname] = downcast
+        elif pd.api.types.is_object_dtype(col.dtype) or pd.api.types.is_string_dtype(col.dtype):
+            if (
+                n_rows > 0
+                and col.nunique() <= max_category_fraction * n_rows
+                and pd.api.types.infer_dtype(col, skipna=True) == "string"
+            ):
+                compacted[colname] = col.astype("category")
+
+    if not len(compacted):
+        return df
+    df = df.copy(deep=False)
+    for colname, values in compacted.items():
+        df[colname] = values
+    return df
+
+
+def _concat_compact(dfs: List[pd.DataFrame]) -> pd.DataFrame:
+    """Concatenate compacted DataFrames, unifying per-part categories so category columns stay categorical
+
+    (Pandas would otherwise fall back to object dtype when concatenating categoricals whose categories
+    differ).
+    """
+    cat_cols = [
+        col for col in dfs[0].columns
+        if all(col in df and isinstance(df[col].dtype, pd.CategoricalDtype) for df in dfs)
+    ]
+    if len(dfs) > 1 and len(cat_cols):
+        dtypes = {
+            col: pd.CategoricalDtype(pd.api.types.union_categoricals([df[col] for df in dfs]).categories)
+            for col in cat_cols
+        }
+        dfs = [df.astype(dtypes) for df in dfs]
+    return pd.concat(dfs, axis=0, ignore_index=True)
+
+
+def compact_dataframe(df: pd.DataFrame, max_category_fraction: float=0.5, verbose: bool=True):
+    """Reduce a DataFrame's memory footprint by using compact dtypes
+
+    - Text columns with at most `max_category_fraction` * len(df) distinct values become `category`
+    - Integer columns are downcast to the smallest (unsigned, if no negatives) integer type that fits
+    - Float columns are downcast to float32 only where this doesn't change any values
+
+    :param df: Source DataFrame (not modified)
+    :param max_category_fraction: Maximum ratio of distinct values to rows for a text column to be converted
+    :param verbose: Set False to skip printing the before/after memory usage
+    """
+    result = _compact(df, max_category_fraction=max_category_fraction)
+    if verbose:
+        before = _memory_bytes(df)
+        after = _memory_bytes(result)
+        print(f"Compacted DataFrame from {before / 1024**2:.2f}MB to {after / 1024**2:.2f}MB")
+    return result
+
+
+def _read_csv_object(
+    bucket_name: str,
+    obj,
+    cache: Optional[S3ObjectCache]=None,
+    compact: bool=False,
+    **kwargs,
+):
+    """Read one S3 object into a DataFrame, returning (key, df, elapsed_secs, raw_bytes)
+
+    raw_bytes is the in-memory size of the object's data before compaction if `compact` is set (since it's
+    relatively expensive to measure), otherwise None.
+
+    :param **kwargs: Passed through to _read_csv_pushdown() (i.e. pushdown args plus Pandas.read_csv() args)
+    """
+    t0 = time.perf_counter()
+    obj_df = next(_read_csv_pushdown(_object_source(bucket_name, obj, cache), **kwargs))
+    raw_bytes = None
+    if compact:
+        raw_bytes = _memory_bytes(obj_df)
+        obj_df = _compact(obj_df)
+    return obj.key, obj_df, time.perf_counter() - t0, raw_bytes
+
+
+def _parquet_dataset(
+    bucket_name: str,
+    objs: List[S3Object],
+    max_workers: int=1,
+    cache: Optional[S3ObjectCache]=None,
+) -> pads.Dataset:
+    """Open a list of Parquet objects as one pyarrow dataset (from S3 directly, or via the local `cache`)"""
+    if cache is None:
+        # Honour the same endpoint override variables as boto3 (e.g. for a local S3 stand-in):
+        endpoint = os.environ.get("AWS_ENDPOINT_URL_S3") or os.environ.get("AWS_ENDPOINT_URL")
+        if endpoint:
+            filesystem = pafs.S3FileSystem(endpoint_override=endpoint)
+        else:
+            filesystem = pafs.S3FileSystem(region=pafs.resolve_s3_region(bucket_name))
+        paths = [f"{bucket_name}/{obj.key}" for obj in objs]
+    else:
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            paths = list(executor.map(lambda obj: _object_source(bucket_name, obj, cache), objs))
+        filesystem = pafs.LocalFileSystem()
+    return pads.dataset(paths, format="parquet", filesystem=filesystem)
+
+
+def _read_parquet_pushdown(
+    dataset: pads.Dataset,
+    columns: Optional[List[str]]=None,
+    row_filter: Optional[Callable[[pd.DataFrame], pd.Series]]=None,
+    filter_columns: List[str]=[],
+    batch_size: Optional[int]=None,
+):
+    """Iterate DataFrames from a Parquet dataset, applying column projection and row filtering
+
+    Parquet is columnar, so projected-out columns are never fetched or decoded at all. Decoding is
+    multi-threaded across files and row groups. If `batch_size` is None, yields a single DataFrame (still
+    reading in batches internally when a `row_filter` is set).
+    """
+    read_columns = None if columns is None else list(dict.fromkeys(list(columns) + list(filter_columns)))
+    if batch_size is None and row_filter is None:
+        yield _apply_pushdown(
+            dataset.to_table(columns=read_columns, use_threads=True).to_pandas(),
+            columns,
+            row_filter,
+        )
+        return
+
+    batches = dataset.to_batches(
+        columns=read_columns,
+        batch_size=batch_size or FILTER_CHUNKSIZE,
+        use_threads=True,
+    )
+    if batch_size is not None:
+        for batch in batches:
+            yield _apply_pushdown(batch.to_pandas(), columns, row_filter)
+    else:
+        dfs = [_apply_pushdown(batch.to_pandas(), columns, row_filter) for batch in batches]
+        yield pd.concat(dfs, axis=0, ignore_index=True) if len(dfs) else pd.DataFrame()
+
+
+def _read_objects(
+    bucket_name: str,
+    objs: list,
+    max_workers: int=1,
+    cache: Optional[S3ObjectCache]=None,
+    **kwargs,
+) -> Tuple[List[pd.DataFrame], int]:
+    """Read a list of S3 objects concurrently, returning ([df per object, in order], total_raw_bytes)
+
+    :param **kwargs: Passed through to _read_csv_object()
+    """
+    t0 = time.perf_counter()
+    obj_dfs = []
+    raw_bytes = 0
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        # executor.map() yields results in input (i.e. key) order, even though they may finish out of order:
+        results = executor.map(lambda obj: _read_csv_object(bucket_name, obj, cache, **kwargs), objs)
+        for key, obj_df, elapsed, obj_raw_bytes in results:
+            print(f"Loaded {key} ({len(obj_df)} rows) in {elapsed:.2f}s")
+            obj_dfs.append(obj_df)
+            raw_bytes += obj_raw_bytes or 0
+    if len(obj_dfs) > 1:
+        print(f"Loaded {len(obj_dfs)} objects in {time.perf_counter() - t0:.2f}s total")
+    return obj_dfs, raw_bytes
+
+
+def dataframe_from_s3_folder(
+    s3uri: str,
+    max_workers: int=1,
+    cache: Optional[S3ObjectCache]=None,
+    columns: Optional[List[str]]=None,
+    row_filter: Optional[Callable[[pd.DataFrame], pd.Series]]=None,
+    filter_columns: List[str]=[],
+    compact: bool=False,
+    data_format: str="auto",
+    schema: Optional[Union[dict, str]]=None,
+    **kwargs,
+):
+    """Read (multiple) .csv or .parquet files under an `s3uri` prefix into one combined Pandas DataFrame
+
+    Implementation assumes your environment is set up for pd.read_csv("s3://...") to work (i.e. s3fs is
+    installed with appropriate versions)
+
+    By default, folders containing `.parquet` objects (e.g. Data Wrangler output with
+    `output_content_type="PARQUET"`) are read as a single multi-threaded pyarrow dataset, and other folders
+    as CSV (`.csv` and batch transform `.out` objects).
+
+    Objects are always combined in S3 key order (regardless of `max_workers`), and concatenated in a single
+    pass at the end rather than one object at a time - so loading many part files stays linear in cost.
+
+    `columns` and `row_filter` are applied while each object is parsed, so unwanted fields and records never
+    accumulate in memory. For example to load just the training segment of a Data Wrangler output, without
+    the feature store and segment columns:
+
+    >>> df = util.data.dataframe_from_s3_folder(
+    >>>     flow_output_s3uri,
+    >>>     columns=[c for c in all_columns if c not in ("txn_id", "txn_timestamp", "dataset")],
+    >>>     row_filter=lambda chunk: chunk["dataset"] == "train",
+    >>>     filter_columns=["dataset"],
+    >>> )
+
+    :param s3uri: Source data prefix
+    :param max_workers: Number of objects to fetch & parse concurrently (default 1, i.e. sequential). For
+        folders of many part files (e.g. Data Wrangler or batch transform outputs), try 8-16.
+    :param cache: Optional S3ObjectCache to serve unchanged objects from local disk instead of re-downloading
+    :param columns: Optional list of columns to load (others are skipped by the parser)
+    :param row_filter: Optional predicate taking a DataFrame chunk and returning a boolean Series of rows to
+        keep. Sees `columns` plus `filter_columns`.
+    :param filter_columns: Extra columns to parse only for use by `row_filter` (dropped from the result).
+        Ignored if `columns` is not set (since all columns are loaded anyway).
+    :param compact: Set True to store low-cardinality text as `category` and downcast numerics (see
+        compact_dataframe()). Applied to each object as it's loaded, to keep peak memory down.
+    :param data_format: "auto" (default), "csv" or "parquet" (treat all objects as Parquet, regardless of
+        file extension)
+    :param schema: Optional util.schema schema (dict, or s3:// URI / path of one) to parse CSVs with explicit
+        dtypes instead of inferring them. Pass `header=None` for headerless files, which then take their
+        column names from the schema.
+    :param **kwargs: Passed through to Pandas.read_csv() (CSV only)
+    """
+    bucket_name, prefix = _split_s3uri(s3uri)
+    data_format, objs = _list_format_objects(bucket_name, prefix, data_format)
+    if data_format == "parquet":
+        if not len(objs):
+            return pd.DataFrame()
+        if len(kwargs):
+            print(f"WARNING: Ignoring Pandas.read_csv() arguments for Parquet data: {list(kwargs)}")
+        t0 = time.perf_counter()
+        dataset = _parquet_dataset(bucket_name, objs, max_workers=max_workers, cache=cache)
+        df = next(_read_parquet_pushdown(dataset, columns, row_filter, filter_columns))
+        print(f"Loaded {len(objs)} Parquet objects ({len(df)} rows) in {time.perf_counter() - t0:.2f}s")
+        return compact_dataframe(df) if compact else df
+
+    obj_dfs, raw_bytes = _read_objects(
+        bucket_name,
+        objs,
+        max_workers=max_workers,
+        cache=cache,
+        columns=columns,
+        row_filter=row_filter,
+        filter_columns=filter_columns,
+        compact=compact,
+        schema=None if schema is None else dataset_schema.as_schema(schema),
+        **kwargs,
+    )
+
+    if not len(obj_dfs):
+        return pd.DataFrame()
+    if not compact:
+        return pd.concat(obj_dfs, axis=0, ignore_index=True)
+
+    df = _concat_compact(obj_dfs)
+    print(f"Compacted DataFrame from {raw_bytes / 1024**2:.2f}MB to {_memory_bytes(df) / 1024**2:.2f}MB")
+    return df
+
+
+def dataframe_chunks_from_s3_folder(
+    s3uri: str,
+    chunksize: int=100000,
+    cache: Optional[S3ObjectCache]=None,
+    columns: Optional[List[str]]=None,
+    row_filter: Optional[Callable[[pd.DataFrame], pd.Series]]=None,
+    filter_columns: List[str]=[],
+    compact: bool=False,
+    data_format: str="auto",
+    schema: Optional[Union[dict, str]]=None,
+    **kwargs,
+):
+    """Iterate over (multiple) .csv or .parquet files under an `s3uri` prefix as bounded-size DataFrames
+
+    Like dataframe_from_s3_folder(), but never materializes the whole dataset: Each object is read with
+    Pandas' `chunksize` so at most one chunk (of up to `chunksize` rows) is held in memory at a time. Use
+    this to aggregate, filter or re-write folders that are too big to load at once. CSV chunks are yielded in
+    S3 key order, and never span multiple objects. Parquet folders are streamed as record batches of up to
+    `chunksize` rows.
+
+    :param s3uri: Source data prefix
+    :param chunksize: Maximum number of rows per yielded DataFrame (before `row_filter` is applied)
+    :param cache: Optional S3ObjectCache to serve unchanged objects from local disk instead of re-downloading
+    :param columns: Optional list of columns to load (others are skipped by the parser)
+    :param row_filter: Optional predicate taking a DataFrame chunk and returning a boolean Series of rows to
+        keep. Sees `columns` plus `filter_columns`.
+    :param filter_columns: Extra columns to parse only for use by `row_filter` (dropped from the result)
+    :param compact: Set True to compact each chunk's dtypes (see compact_dataframe()). Note category columns
+        are inferred per chunk, so their categories may differ between chunks.
+    :param data_format: "auto" (default), "csv" or "parquet" - as for dataframe_from_s3_folder()
+    :param schema: Optional util.schema schema for explicit CSV dtypes - as for dataframe_from_s3_folder()
+    :param **kwargs: Passed through to Pandas.read_csv() (CSV only)
+    """
+    bucket_name, prefix = _split_s3uri(s3uri)
+    data_format, objs = _list_format_objects(bucket_name, prefix, data_format)
+    if data_format == "parquet":
+        if len(objs):
+            print(f"Streaming {len(objs)} Parquet objects")
+            dataset = _parquet_dataset(bucket_name, objs, cache=cache)
+            for chunk in _read_parquet_pushdown(dataset, columns, row_filter, filter_columns, chunksize):
+                yield _compact(chunk) if compact else chunk
+        return
+
+    if schema is not None:
+        schema = dataset_schema.as_schema(schema)
+    for obj in objs:
+        print(f"Streaming {obj.key}")
+        for chunk in _read_csv_pushdown(
+            _object_source(bucket_name, obj, cache),
+            columns=columns,
+            row_filter=row_filter,
+            filter_columns=filter_columns,
+            chunksize=chunksize,
+            schema=schema,
+            **kwargs,
+        ):
+            yield _compact(chunk) if compact else chunk
+
+
+def _reservoir_sample(items: list, k: int, rng: np.random.Generator) -> list:
+    """Uniformly choose up to `k` of `items` in one pass (reservoir sampling, Algorithm R), keeping order"""
+    reservoir = []
+    for ix, item in enumerate(items):
+        if ix < k:
+            reservoir.append((ix, item))
+        else:
+            slot = rng.integers(0, ix + 1)
+            if slot < k:
+                reservoir[slot] = (ix, item)
+    return [item for _, item in sorted(reservoir, key=lambda pair: pair[0])]
+
+
+def _range_lines(
+    s3_client,
+    bucket_name: str,
+    obj,
+    offset: int,
+    range_bytes: int,
+    skip_header: bool,
+    overflow_bytes: int=64 * 1024,
+) -> List[bytes]:
+    """Fetch the complete lines *starting* within [offset, offset + range_bytes) of an S3 object
+
+    Reads from one byte before `offset` (to tell whether a line starts exactly at it) and over-reads by
+    `overflow_bytes` to complete the last line - so adjacent ranges never share or split a line.
+    """
+    read_from = max(offset - 1, 0)
+    read_to = min(offset + range_bytes + overflow_bytes, obj.size) - 1
+    body = s3_client.get_object(
+        Bucket=bucket_name,
+        Key=obj.key,
+        Range=f"bytes={read_from}-{read_to}",
+    )["Body"].read()
+    start = 0
+    if offset > 0 or skip_header:
+        # Skip the (rest of the) line in progress at `offset`, which belongs to the previous range:
+        start = body.find(b"\n") + 1
+        if start == 0:
+            return []
+    limit = offset + range_bytes - read_from
+    lines = []
+    while start < min(limit, len(body)):
+        line_end = body.find(b"\n", start)
+        if line_end < 0:
+            # An unterminated line is only complete if it's the end of the object:
+            if read_from + len(body) >= obj.size:
+                lines.append(body[start:])
+            break
+        if line_end > start:
+            lines.append(body[start:line_end])
+        start = line_end + 1
+    return lines
+
+
+def sample_from_s3_folder(
+    s3uri: str,
+    n: int=10000,
+    strategy: str="auto",
+    range_bytes: int=256 * 1024,
+    min_ranges: int=32,
+    max_workers: int=16,
+    seed: Optional[int]=None,
+    **kwargs,
+) -> pd.DataFrame:
+    """Quickly load an approximate random sample of about `n` rows from the CSV files under an S3 prefix
+
+    For exploration, a representative sample is usually enough - and much faster than loading everything.
+    Strategies:
+
+    - "ranges": Split every object into `range_bytes` blocks and fetch a random subset of blocks (so objects
+      are picked in proportion to their size) concurrently, using S3 byte-range requests. Only complete lines
+      starting in each block are used, and each block contributes a reservoir sample of its rows. The cost
+      depends on `n` rather than the folder size. Needs uncompressed objects, and assumes (as is usual for
+      ML data) that no quoted field values contain line breaks.
+    - "objects": Pick whole objects at random (weighted by size) until there are enough rows, then sample
+      rows from them. Works with compressed objects, but may read more data.
+    - "auto" (default): "ranges" if all objects are uncompressed, else "objects".
+
+    Since rows are sampled in blocks, the sample is a slightly clustered (not perfectly uniform) one: Fine
+    for EDA, but use a full load for anything statistically sensitive.
+
+    :param s3uri: Source data prefix
+    :param n: Number of rows to sample (fewer if the data has fewer rows)
+    :param strategy: "auto", "ranges" or "objects" (see above)
+    :param range_bytes: Size of each fetched byte range, for the "ranges" strategy
+    :param min_ranges: Minimum number of byte ranges to sample from (if the data has that many), so even
+        small samples are spread across the dataset
+    :param max_workers: Number of concurrent S3 requests
+    :param seed: Optional random seed, for a repeatable sample
+    :param **kwargs: Passed through to Pandas.read_csv() (e.g. `header=None` and `names` for headerless data)
+    """
+    t0 = time.perf_counter()
+    strategy = strategy.lower()
+    if strategy not in ("auto", "ranges", "objects"):
+        raise ValueError(f"strategy must be 'auto', 'ranges' or 'objects'. Got '{strategy}'")
+    bucket_name, prefix = _split_s3uri(s3uri)
+    objs = [obj for obj in _list_data_objects(bucket_name, prefix) if obj.size > 0]
+    if not len(objs):
+        return pd.DataFrame()
+    compressed = [
+        obj.key for obj in objs
+        if any(obj.key.lower().endswith(suffix) for suffix in COMPRESSION_EXTENSIONS.values())
+    ]
+    if strategy == "auto":
+        strategy = "objects" if len(compressed) else "ranges"
+    elif strategy == "ranges" and len(compressed):
+        raise ValueError(
+            f"Can't byte-range sample compressed objects (e.g. {compressed[0]}): Use strategy='objects'"
+        )
+    rng = np.random.default_rng(seed)
+    sizes = np.array([obj.size for obj in objs], dtype=np.float64)
+
+    if strategy == "objects":
+        # Visit objects in a random size-weighted order, until we've seen enough rows to sample from:
+        order = rng.choice(len(objs), size=len(objs), replace=False, p=sizes / sizes.sum())
+        dfs = []
+        n_rows = 0
+        for ix in order:
+            obj_df = next(_read_csv_pushdown(_object_source(bucket_name, objs[ix]), **kwargs))
+            dfs.append(obj_df)
+            n_rows += len(obj_df)
+            if n_rows >= n:
+                break
+        df = pd.concat(dfs, axis=0, ignore_index=True)
+        df = df.sample(n=min(n, len(df)), random_state=seed).reset_index(drop=True)
+        print(
+            f"Sampled {len(df)} rows from {len(dfs)} of {len(objs)} objects in "
+            f"{time.perf_counter() - t0:.2f}s"
+        )
+        return df
+
+    s3_client = boto3.client("s3")
+    has_header = kwargs.get("header", "infer") is not None
+    # Probe the start of the first object for the header line and typical row size:
+    probe = s3_client.get_object(
+        Bucket=bucket_name,
+        Key=objs[0].key,
+        Range=f"bytes=0-{min(range_bytes, objs[0].size) - 1}",
+    )["Body"].read()
+    header_line = probe.split(b"\n", 1)[0] if has_header else None
+    probe_lines = max(1, probe.count(b"\n"))
+    bytes_per_row = len(probe) / probe_lines
+
+    # Choose distinct blocks uniformly across all objects (=> objects weighted by size), with some headroom
+    # for the estimated rows per block being off:
+    block_counts = np.ceil(sizes / range_bytes).astype(np.int64)
+    rows_per_block = max(1.0, range_bytes / bytes_per_row)
+    n_blocks = int(min(block_counts.sum(), max(min_ranges, math.ceil(1.2 * n / rows_per_block))))
+    block_ids = np.sort(rng.choice(int(block_counts.sum()), size=n_blocks, replace=False))
+    block_starts = np.concatenate([[0], np.cumsum(block_counts)[:-1]])
+    blocks = []
+    for block_id in block_ids:
+        ix_obj = int(np.searchsorted(block_starts, block_id, side="right") - 1)
+        blocks.append((objs[ix_obj], int(block_id - block_starts[ix_obj]) * range_bytes))
+
+    per_block = math.ceil(n / n_blocks)
+    block_seeds = rng.integers(0, 2**32, size=n_blocks)
+
+    def sample_block(args):
+        (obj, offset), block_seed = args
+        lines = _range_lines(s3_client, bucket_name, obj, offset, range_bytes, skip_header=has_header)
+        return _reservoir_sample(lines, per_block, np.random.default_rng(block_seed))
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        sampled = [line for lines in executor.map(sample_block, zip(blocks, block_seeds)) for line in lines]
+    if len(sampled) > n:
+        sampled = _reservoir_sample(sampled, n, rng)
+    csv_bytes = b"\n".join(([header_line] if header_line is not None else []) + sampled)
+    df = pd.read_csv(io.BytesIO(csv_bytes), **kwargs)
+    print(
+        f"Sampled {len(df)} rows from {n_blocks} byte ranges of {len(objs)} objects in "
+        f"{time.perf_counter() - t0:.2f}s"
+    )
     return df
 
 
+class IncrementalS3FolderLoader:
+    """Stateful loader for S3 folders that grow over time, which only reads new or changed objects
+
+    Each refresh() lists the folder and compares it with a manifest of the objects already ingested (key,
+    ETag and LastModified): New objects are read and appended to the previous result, changed objects are
+    re-read (replacing their previous rows) and deleted objects' rows are dropped. Repeated refreshes of
+    e.g. a batch transform output or data capture prefix therefore cost time proportional to the new data.
+
+    Rows are grouped by source object, in the order objects were first ingested (so a fresh load is in key
+    order, and later additions are appended at the end).
+
+    If a `state_name` is given, the manifest and combined result are persisted with util.snapshot - so a
+    new notebook kernel can pick up where the last one left off:
+
+    >>> loader = util.data.IncrementalS3FolderLoader(capture_s3uri, state_name="capture_df")
+    >>> df = loader.refresh()  # Reads everything the first time
+    >>> df = loader.refresh()  # Later: Reads only objects added/changed since
+    """
+    def __init__(
+        self,
+        s3uri: str,
+        state_name: Optional[str]=None,
+        snapshot_dir: Optional[str]=None,
+        max_workers: int=1,
+        cache: Optional[S3ObjectCache]=None,
+        **kwargs,
+    ):
+        """Create (or resume) an incremental loader
+
+        :param s3uri: Source data prefix
+        :param state_name: Optional util.snapshot name to persist the ingested result & manifest under
+        :param snapshot_dir: Optional override of the util.snapshot folder
+        :param max_workers: Number of objects to fetch & parse concurrently
+        :param cache: Optional S3ObjectCache for object downloads
+        :param **kwargs: Passed through to the object reader, as for dataframe_from_s3_folder() (e.g.
+            `columns`, `row_filter`, or Pandas.read_csv() arguments)
+        """
+        self.s3uri = s3uri
+        self.bucket_name, self.prefix = _split_s3uri(s3uri)
+        self.state_name = state_name
+        self.snapshot_dir = snapshot_dir
+        self.max_workers = max_workers
+        self.cache = cache
+        self.read_kwargs = kwargs
+        # Manifest entries in row order: { "key", "etag", "last_modified", "rows" }
+        self.manifest: List[dict] = []
+        self.df: Optional[pd.DataFrame] = None
+        if state_name:
+            self._load_state()
+
+    def _manifest_version(self) -> str:
+        """Tag tying a persisted result snapshot to the manifest it was saved with"""
+        manifest_str = json.dumps([self.s3uri, self.manifest], sort_keys=True)
+        return hashlib.sha256(manifest_str.encode("utf-8")).hexdigest()
+
+    def _load_state(self):
+        try:
+            manifest = snapshot.load_value(f"{self.state_name}-manifest", snapshot_dir=self.snapshot_dir)
+        except FileNotFoundError:
+            return
+        if manifest.get("s3uri") != self.s3uri:
+            print(f"Ignoring saved state '{self.state_name}': It was for {manifest.get('s3uri')}")
+            return
+        self.manifest = manifest["objects"]
+        try:
+            self.df = snapshot.load_dataframe(
+                self.state_name,
+                version=self._manifest_version(),
+                snapshot_dir=self.snapshot_dir,
+            )
+        except (FileNotFoundError, snapshot.StaleSnapshotError) as e:
+            print(f"Discarding saved state '{self.state_name}' (will reload all objects): {e}")
+            self.manifest = []
+            self.df = None
+
+    def _save_state(self):
+        snapshot.save_dataframe(
+            self.state_name,
+            self.df,
+            version=self._manifest_version(),
+            snapshot_dir=self.snapshot_dir,
+        )
+        snapshot.save_value(
+            f"{self.state_name}-manifest",
+            { "s3uri": self.s3uri, "objects": self.manifest },
+            snapshot_dir=self.snapshot_dir,
+        )
+
+    def refresh(self) -> pd.DataFrame:
+        """Ingest any new/changed objects in the folder, and return the updated combined DataFrame"""
+        current = {
+            obj.key: obj for obj in _list_data_objects(self.bucket_name, self.prefix)
+        }
+        # Work out which previously-ingested row ranges are still valid:
+        keep_mask = []
+        kept_entries = []
+        n_changed = 0
+        n_removed = 0
+        for entry in self.manifest:
+            obj = current.get(entry["key"])
+            unchanged = obj is not None and obj.e_tag == entry["etag"]
+            if unchanged:
+                kept_entries.append(entry)
+            elif obj is None:
+                n_removed += 1
+            else:
+                n_changed += 1
+            keep_mask.append(np.full(entry["rows"], unchanged))
+        known_keys = set(entry["key"] for entry in kept_entries)
+        to_read = [obj for key, obj in current.items() if key not in known_keys]
+
+        print(
+            f"{len(kept_entries)} objects unchanged, {len(to_read) - n_changed} new, {n_changed} changed, "
+            f"{n_removed} removed"
+        )
+        if not len(to_read) and not n_removed and self.df is not None:
+            return self.df
+
+        new_dfs, _ = _read_objects(
+            self.bucket_name,
+            to_read,
+            max_workers=self.max_workers,
+            cache=self.cache,
+            **self.read_kwargs,
+        )
+        prev_dfs = []
+        if self.df is not None and len(kept_entries):
+            if len(kept_entries) == len(self.manifest):
+                prev_dfs.append(self.df)  # Pure append: No need to filter the previous result
+            else:
+                prev_dfs.append(self.df[np.concatenate(keep_mask)])
+        frames = prev_dfs + new_dfs
+        if not len(frames):
+            self.df = pd.DataFrame()
+        elif self.read_kwargs.get("compact"):
+            self.df = _concat_compact(frames)
+        else:
+            self.df = pd.concat(frames, axis=0, ignore_index=True)
+        self.manifest = kept_entries + [
+            {
+                "key": obj.key,
+                "etag": obj.e_tag,
+                "last_modified": obj.last_modified.isoformat() if obj.last_modified else None,
+                "rows": len(obj_df),
+            }
+            for obj, obj_df in zip(to_read, new_dfs)
+        ]
+        if self.state_name:
+            self._save_state()
+        return self.df
+
+
+def _iter_s3_lines(s3_client, bucket_name: str, key: str, chunk_bytes: int=1024**2):
+    """Stream an S3 object's non-blank lines (as bytes, without line endings), a chunk at a time"""
+    body = s3_client.get_object(Bucket=bucket_name, Key=key)["Body"]
+    pending = b""
+    for chunk in body.iter_chunks(chunk_bytes):
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            line = line.rstrip(b"\r")
+            if line:
+                yield line
+    pending = pending.rstrip(b"\r")
+    if pending:
+        yield pending
+
+
+def _batch_transform_pairs(input_s3uri: str, output_s3uri: str) -> List[Tuple[str, str, str]]:
+    """Match batch transform output objects to their inputs, as (bucket_name, input_key, output_key) tuples
+
+    Batch transform writes the results for input `{input_prefix}/{path}` to `{output_prefix}/{path}.out`.
+    """
+    in_bucket, in_prefix = _split_s3uri(input_s3uri.rstrip("/") + "/")
+    out_bucket, out_prefix = _split_s3uri(output_s3uri.rstrip("/") + "/")
+    if in_bucket != out_bucket:
+        raise ValueError(
+            f"Batch transform input and output must be in the same bucket. Got {in_bucket}, {out_bucket}"
+        )
+    input_keys = {
+        obj.key[len(in_prefix):] for obj in list_s3_objects(f"s3://{in_bucket}/{in_prefix}")
+        if not _is_hidden_key(obj.key)
+    }
+    output_keys = [
+        obj.key for obj in list_s3_objects(f"s3://{out_bucket}/{out_prefix}") if obj.key.endswith(".out")
+    ]
+    pairs = []
+    for output_key in output_keys:
+        rel_key = output_key[len(out_prefix):-len(".out")]
+        if rel_key not in input_keys:
+            raise ValueError(f"No input object {in_prefix}{rel_key} found for output {output_key}")
+        input_keys.remove(rel_key)
+        pairs.append((in_bucket, in_prefix + rel_key, output_key))
+    if len(input_keys):
+        raise ValueError(
+            f"{len(input_keys)} input objects have no batch transform output (incomplete job?) e.g. "
+            f"{sorted(input_keys)[:5]}"
+        )
+    return pairs
+
+
+def _iter_batch_transform_joined_lines(
+    input_s3uri: str,
+    output_s3uri: str,
+    input_header: bool=False,
+    s3_client=None,
+):
+    """Stream (input_key, joined CSV line) pairs of each input line with its batch transform output line
+
+    Raises ValueError at the end of any part whose input and output row counts don't match.
+    """
+    s3_client = s3_client or boto3.client("s3")
+    for bucket_name, input_key, output_key in _batch_transform_pairs(input_s3uri, output_s3uri):
+        input_lines = _iter_s3_lines(s3_client, bucket_name, input_key)
+        if input_header:
+            next(input_lines, None)
+        output_lines = _iter_s3_lines(s3_client, bucket_name, output_key)
+        n_rows = 0
+        for input_line, output_line in zip_longest(input_lines, output_lines):
+            if input_line is None or output_line is None:
+                # One stream ended early: Count the rest of the other for the error message
+                n_inputs = n_rows + (input_line is not None) + sum(1 for _ in input_lines)
+                n_outputs = n_rows + (output_line is not None) + sum(1 for _ in output_lines)
+                raise ValueError(
+                    f"Row count mismatch for {input_key}: {n_inputs} input rows but {n_outputs} output "
+                    f"rows in {output_key}"
+                )
+            n_rows += 1
+            yield input_key, input_line + b"," + output_line
+
+
+def batch_transform_joined_chunks(
+    input_s3uri: str,
+    output_s3uri: str,
+    chunksize: int=100000,
+    input_header: bool=False,
+    names: Optional[List[str]]=None,
+    **kwargs,
+):
+    """Iterate over batch transform inputs joined to their results, as bounded-size DataFrames
+
+    For a batch transform job with `split_type="Line"` and `assemble_with="Line"`, each output object
+    `{output_s3uri}/{path}.out` has one result line per line of the input object `{input_s3uri}/{path}`.
+    This streams each pair of objects line by line and yields DataFrames of up to `chunksize` rows, with the
+    input columns followed by the result columns - so memory use doesn't grow with the size of the job, and
+    the transform doesn't need `join_source="Input"` (which makes the output objects much bigger).
+
+    Row counts are checked per object pair, raising ValueError on a mismatch.
+
+    :param input_s3uri: Batch transform input data prefix
+    :param output_s3uri: Batch transform output prefix
+    :param chunksize: Maximum number of rows per yielded DataFrame
+    :param input_header: Set True if the input objects have a header row (to skip - so set `names` too)
+    :param names: Optional column names for the joined rows (input columns then output columns)
+    :param **kwargs: Passed through to Pandas.read_csv() (e.g. `dtype`)
+    """
+    buffer = []
+
+    def parse(lines):
+        return pd.read_csv(io.BytesIO(b"\n".join(lines)), header=None, names=names, **kwargs)
+
+    for _, line in _iter_batch_transform_joined_lines(input_s3uri, output_s3uri, input_header=input_header):
+        buffer.append(line)
+        if len(buffer) >= chunksize:
+            yield parse(buffer)
+            buffer = []
+    if len(buffer):
+        yield parse(buffer)
+
+
+def join_batch_transform_to_file(
+    input_s3uri: str,
+    output_s3uri: str,
+    out_path: str,
+    input_header: bool=False,
+    names: Optional[List[str]]=None,
+) -> Dict[str, int]:
+    """Write batch transform inputs joined to their results straight to a local CSV, returning rows per part
+
+    Like batch_transform_joined_chunks(), but never parses the data: Joined lines are streamed directly to
+    `out_path` (with a header row, if `names` are given). Returns { input_key: n_rows }.
+    """
+    rows_by_part = {}
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    with open(out_path, "wb") as f:
+        if names is not None:
+            f.write(",".join(names).encode("utf-8") + b"\n")
+        for input_key, line in _iter_batch_transform_joined_lines(
+            input_s3uri,
+            output_s3uri,
+            input_header=input_header,
+        ):
+            f.write(line + b"\n")
+            rows_by_part[input_key] = rows_by_part.get(input_key, 0) + 1
+    print(f"Wrote {sum(rows_by_part.values())} joined rows from {len(rows_by_part)} parts to {out_path}")
+    return rows_by_part
+
+
+def _csv_part_bounds(df: pd.DataFrame, part_target_bytes: int, sample_rows: int=1000) -> List[int]:
+    """Row offsets splitting `df` into contiguous parts of roughly `part_target_bytes` each once CSV-encoded
+
+    The CSV size per row is estimated by encoding a sample of (up to `sample_rows`) rows, rather than the
+    whole frame.
+    """
+    n_rows = len(df)
+    if n_rows == 0:
+        return [0, 0]
+    sample = df.iloc[:sample_rows]
+    bytes_per_row = len(sample.to_csv(index=False, header=False).encode("utf-8")) / len(sample)
+    n_parts = max(1, min(n_rows, math.ceil(n_rows * bytes_per_row / part_target_bytes)))
+    return [round(i * n_rows / n_parts) for i in range(n_parts + 1)]
+
+
+def _delete_stale_parts(out_s3uri: str, keep_uris: List[str]):
+    """Delete 'part*' objects directly under an S3 folder that aren't in `keep_uris` (from previous runs)"""
+    bucket_name, prefix = _split_s3uri(out_s3uri + "/")
+    keep_keys = set(_split_s3uri(uri)[1] for uri in keep_uris)
+    stale = [
+        obj.key for obj in list_s3_objects(f"{out_s3uri}/", shard_depth=0)
+        if obj.key[len(prefix):].startswith("part") and "/" not in obj.key[len(prefix):]
+        and obj.key not in keep_keys
+    ]
+    if len(stale):
+        print(f"Removing {len(stale)} stale part files from {out_s3uri}")
+        _delete_keys(bucket_name, stale)
+
+
+def _sample_values(col: pd.Series, sample_size: int) -> pd.Series:
+    """Non-null values from (up to) `sample_size` rows spread evenly through `col`"""
+    n_rows = len(col)
+    if n_rows > sample_size:
+        col = col.iloc[np.linspace(0, n_rows - 1, sample_size).astype(int)]
+    return col.dropna()
+
+
+def normalize_training_columns(
+    df: pd.DataFrame,
+    exclude: List[str]=[],
+    sample_size: int=1000,
+) -> Tuple[pd.DataFrame, Dict[str, List[str]]]:
+    """Prepare a DataFrame's column types for algorithms (like XGBoost) that only accept numeric CSV
+
+    - Text columns are dropped
+    - Boolean columns are converted to "true"/"false" strings (rather than Python-style `True`/`False`)
+
+    Columns are classified by dtype, plus a check of up to `sample_size` values spread through the column
+    for object-dtype columns (so mixed/late values are less likely to be missed than by checking only the
+    first row). Conversions are applied to whole columns at once.
+
+    :param df: Source data
+    :param exclude: Column names to leave untouched
+    :param sample_size: Maximum number of values to inspect per object-dtype column
+    :returns: (normalized_df, report) where report is a dict with keys "dropped" and "converted", each
+        listing the affected column names
+    """
+    dropped = []
+    converted = {}
+    for colname in df.columns:
+        if colname in exclude:
+            continue
+        col = df[colname]
+        if pd.api.types.is_bool_dtype(col.dtype):
+            values = np.where(col.to_numpy(dtype=bool, na_value=False), "true", "false")
+            # (Nullable "boolean" columns may have missing values, which stay missing)
+            converted[colname] = pd.Series(values, index=col.index).where(col.notna())
+        elif pd.api.types.is_object_dtype(col.dtype) or pd.api.types.is_string_dtype(col.dtype):
+            # Object columns may hold booleans (e.g. where `,true,` values were read alongside blanks):
+            sample = _sample_values(col, sample_size)
+            if len(sample) and sample.map(lambda v: isinstance(v, (bool, np.bool_))).all():
+                # (Dict lookup maps vectorially, and leaves missing values as NaN)
+                converted[colname] = col.map({ True: "true", False: "false" })
+            elif sample.map(lambda v: isinstance(v, str)).any():
+                dropped.append(colname)
+
+    result = df.drop(columns=dropped)
+    for colname, values in converted.items():
+        result[colname] = values
+    return result, { "dropped": dropped, "converted": list(converted) }
+
+
 def mock_featurestore_dataset_split(
     source_s3uri: str,
     out_s3uri: str,
     dataset_label_col: str="dataset",
     datasets_with_headers: str=r"train.*",
     drop_cols: List[str]=[],
+    part_target_bytes: int=64 * 1024**2,
+    max_workers: int=8,
+    compression: Optional[str]=None,
+    schema: Optional[Union[dict, str]]=None,
+    version_store=None,
 ):
     """Split a Data Wrangler output dataset by dataset segment (train/val/test)
 
@@ -48,52 +1294,114 @@ def mock_featurestore_dataset_split(
     column... Analogous to how a real-world process might split a source dataset (in SM Feature Store) by
     queries (to S3)... For environments where Feature Store is not available.
 
+    The source is split in a single pass (groupby on the flag column), and each segment is written as one or
+    more `partN.csv` files of roughly `part_target_bytes` each - uploaded concurrently. Multi-part segments
+    can be consumed by multi-instance training jobs with S3DataDistributionType="ShardedByS3Key". Any
+    leftover part files from previous runs with more parts are removed.
+
+    Each segment's concrete column schema (names in file order, and dtypes) is written alongside as
+    `{out_s3uri}/_schemas/{segment}.json` - outside the segment folders, so training and batch transform jobs
+    don't pick it up as data. Use it to read back headerless segments, for example:
+
+    >>> test_df = util.data.dataframe_from_s3_folder(
+    >>>     f"{out_s3uri}/test",
+    >>>     schema=f"{out_s3uri}/_schemas/test.json",
+    >>>     header=None,
+    >>> )
+
     :param source_s3uri: Source dataset folder in S3
     :param out_s3uri: Root output folder in S3 (will create subfolders by dataset segment)
     :param dataset_label_col: Column label for the dataset flag (string e.g. train/val/test) field
     :param datasets_with_headers: RegEx identifying which segments will be output with column headers
+    :param drop_cols: Additional columns to exclude from the output segments
+    :param part_target_bytes: Approximate target size of each output part file (uncompressed CSV bytes)
+    :param max_workers: Number of part files to encode & upload concurrently
+    :param compression: Optional "gzip" or "zstd" to compress the output parts (as `partN.csv.gz` or
+        `partN.csv.zst`). Check that whatever consumes the data supports the format: For example SageMaker
+        built-in algorithms accept gzip but not zstd.
+    :param schema: Optional util.schema schema to parse the source CSVs with (e.g.
+        util.schema.credit_default())
+    :param version_store: Optional util.versioning.DatasetVersionStore to publish the parts to as a new
+        (deduplicated, content-addressed) version, instead of (re-)writing `{out_s3uri}/{segment}/` folders.
+        Only parts whose content changed since earlier versions are uploaded. The returned URIs are then the
+        stored part objects: Use version_store.channel_uri(segment) for training inputs. The segment schemas
+        are published in the version manifest (see version_store.schema(segment)) rather than `_schemas/`.
     """
+    if compression is not None and compression not in COMPRESSION_EXTENSIONS:
+        raise ValueError(
+            f"compression must be None or one of {list(COMPRESSION_EXTENSIONS)}. Got {compression}"
+        )
+    file_ext = ".csv" + (COMPRESSION_EXTENSIONS[compression] if compression else "")
+
     # Load the full dataframe:
-    df = dataframe_from_s3_folder(source_s3uri)
-    # Drop FeatureStore fields not required for training, if present:
-    df.drop(columns=["txn_id", "txn_timestamp"], errors="ignore")
+    df = dataframe_from_s3_folder(source_s3uri, schema=schema)
+    # Drop FeatureStore fields not required for training and any other `drop_cols`, if present:
+    df = df.drop(columns=list(dict.fromkeys(["txn_id", "txn_timestamp"] + drop_cols)), errors="ignore")
 
     if out_s3uri.endswith("/"):
         out_s3uri = out_s3uri[:-1]
 
-    datasets = df[dataset_label_col].unique()
+    # Safety mechanism: Drop any string columns which will mess up the algorithm training job (for demo, in
+    # case the user had to quit data prep early or made an error), and fix boolean fields `,true,` from DW
+    # getting converted to Python `,True,`:
+    df, report = normalize_training_columns(df, exclude=[dataset_label_col])
+    if len(report["dropped"]):
+        print(f"WARNING: Text columns not supported by XGBoost - dropping {report['dropped']}")
+    if len(report["converted"]):
+        print(f"Converted boolean columns to true/false: {report['converted']}")
+
     outputs = {}
-    for dsname in datasets:
-        outfile = f"{out_s3uri}/{dsname}/part0.csv"
-        dsheaders = (
+    schemas = {}
+    uploads = []
+    # Single pass over the source: groupby assigns rows to segments at once, rather than one mask per segment
+    for dsname, part_df in df.groupby(dataset_label_col, sort=False):
+        dsname = str(dsname)
+        dsheaders = bool(
             re.match(datasets_with_headers, dsname) if isinstance(datasets_with_headers, str)
-            else datasets_with_headersr
-        )
-        part_df = df[df[dataset_label_col] == dsname].drop(
-            columns=[dataset_label_col] + drop_cols,
+            else datasets_with_headers
         )
+        part_df = part_df.drop(columns=[dataset_label_col])
+        schemas[dsname] = dataset_schema.from_dataframe(part_df, name=dsname)
 
-        # Safety mechanism: Drop any string columns which will mess up the algorithm training job
-        # (for demo, in case the user had to quit data prep early or made an error)
-        str_cols = [
-            col for col in part_df
-            if (pd.api.types.is_string_dtype(part_df[col].dtype) and isinstance(part_df[col].iloc[0], str))
-        ]
-        if len(str_cols):
-            print(f"WARNING: Text columns not supported by XGBoost - dropping {str_cols}")
-            part_df = part_df.drop(columns=str_cols)
-
-        # Fix for boolean fields `,true,` from DW getting converted to Python `,True,`
-        for col in part_df:
-            # pd.api.types.is_bool_dtype() doesn't seem to work in this situation for some reason - cols get
-            # read in as object dtype with boolean values
-            if isinstance(part_df[col].iloc[0], bool) and len(part_df[col].unique()) <= 2:
-                part_df[col] = part_df[col].map(lambda x: "true" if x else "false")
-
-        part_df.to_csv(
-            outfile,
-            index=False,
-            header=dsheaders,
+        bounds = _csv_part_bounds(part_df, part_target_bytes)
+        outputs[dsname] = []
+        for ixpart in range(len(bounds) - 1):
+            outfile = f"{out_s3uri}/{dsname}/part{ixpart}{file_ext}"
+            outputs[dsname].append(outfile)
+            uploads.append((part_df.iloc[bounds[ixpart]:bounds[ixpart + 1]], outfile, dsheaders))
+
+    if version_store is not None:
+        # Encode parts locally so they can be hashed (with fixed gzip timestamps, so unchanged data hashes the
+        # same every run):
+        def encode(args):
+            part_df, _, dsheaders = args
+            buffer = io.BytesIO()
+            part_compression = { "method": "gzip", "mtime": 0 } if compression == "gzip" else compression
+            part_df.to_csv(buffer, index=False, header=dsheaders, compression=part_compression)
+            return buffer.getvalue()
+
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            bodies = dict(zip([outfile for _, outfile, _ in uploads], executor.map(encode, uploads)))
+        datasets = {
+            dsname: [bodies[outfile] for outfile in outfiles] for dsname, outfiles in outputs.items()
+        }
+        version = version_store.publish(
+            datasets, ext=file_ext, metadata={ "source": source_s3uri }, schemas=schemas
         )
-        outputs[dsname] = [outfile]
+        return { dsname: version_store.part_uris(dsname, version) for dsname in datasets }
+
+    for dsname, schema_dict in schemas.items():
+        dataset_schema.save_schema(schema_dict, f"{out_s3uri}/_schemas/{dsname}.json")
+
+    def upload(args):
+        part_df, outfile, dsheaders = args
+        part_df.to_csv(outfile, index=False, header=dsheaders, compression=compression)
+        return outfile
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        for outfile in executor.map(upload, uploads):
+            print(f"Wrote {outfile}")
+
+    for dsname, outfiles in outputs.items():
+        _delete_stale_parts(f"{out_s3uri}/{dsname}", outfiles)
     return outputs
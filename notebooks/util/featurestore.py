@@ -0,0 +1,430 @@
+"""Local emulation of a feature store, for environments where SageMaker Feature Store is not available
+
+OfflineFeatureStore keeps each feature group's records as time-partitioned Parquet files (one folder per
+`partition_secs` window of event time, with rows sorted by record ID within each file), plus a small JSON
+catalog of every file's record ID and event time ranges. Building a training set joins feature groups to
+an "entity" DataFrame of (record ID, event time) pairs point-in-time correctly: Each entity row gets the
+latest version of each feature group's record at or before its event time - never a future value.
+
+Training sets only read the files whose ID and time ranges could contribute (per the catalog), and push the
+ID filter down into the Parquet reader - so the cost scales with the entities requested, not the store size.
+
+OnlineFeatureStore serves the latest feature vector per record ID from a bounded in-memory table, for
+low-latency scoring experiments without round trips to S3. (See benchmarks.py to measure its latency)
+
+>>> store = util.featurestore.OfflineFeatureStore("data/feature-store")
+>>> store.ingest("credit", util.data.dataframe_from_s3_folder(flow_output_s3uri))
+>>> train_df = store.training_set(labels_df, { "credit": ["credit_amount", "duration_months"] })
+"""
+
+# Python Built-Ins:
+from collections import OrderedDict
+import json
+import os
+from typing import Dict, List, Optional
+import uuid
+
+# External Dependencies:
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as pads
+import pyarrow.parquet as pq
+
+CATALOG_FILE = "_catalog.json"
+
+
+class OfflineFeatureStore:
+    """Offline store of feature groups as time-partitioned Parquet, with point-in-time training set joins"""
+
+    def __init__(
+        self,
+        root_dir: str,
+        record_id: str="txn_id",
+        event_time: str="txn_timestamp",
+        partition_secs: int=86400,
+        row_group_size: int=64 * 1024,
+    ):
+        """Create or open a local offline feature store
+
+        :param root_dir: Local folder for the store (created if needed)
+        :param record_id: Name of the record identifier column in every feature group
+        :param event_time: Name of the event time column (integer epoch seconds) in every feature group
+        :param partition_secs: Width of the event time partitions (default 1 day)
+        :param row_group_size: Max rows per Parquet row group. Since files are sorted by record ID, smaller
+            groups let ID lookups skip more of each file (via row group statistics)
+        """
+        self.root_dir = root_dir
+        self.record_id = record_id
+        self.event_time = event_time
+        self.partition_secs = partition_secs
+        self.row_group_size = row_group_size
+        os.makedirs(root_dir, exist_ok=True)
+
+    def _group_dir(self, group_name: str) -> str:
+        if not group_name or os.path.sep in group_name or group_name.startswith((".", "_")):
+            raise ValueError(f"Feature group name must be a plain folder name. Got '{group_name}'")
+        return os.path.join(self.root_dir, group_name)
+
+    def list_feature_groups(self) -> List[str]:
+        """Names of the feature groups in the store"""
+        return sorted(
+            name for name in os.listdir(self.root_dir)
+            if os.path.isfile(os.path.join(self.root_dir, name, CATALOG_FILE))
+        )
+
+    def catalog(self, group_name: str) -> List[dict]:
+        """List a feature group's files, with their row count and record ID & event time ranges"""
+        path = os.path.join(self._group_dir(group_name), CATALOG_FILE)
+        if not os.path.isfile(path):
+            raise ValueError(f"No feature group '{group_name}' in store {self.root_dir}")
+        with open(path) as f:
+            return json.load(f)["files"]
+
+    def _save_catalog(self, group_name: str, files: List[dict]):
+        path = os.path.join(self._group_dir(group_name), CATALOG_FILE)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({ "record_id": self.record_id, "event_time": self.event_time, "files": files }, f)
+        os.replace(tmp_path, path)
+
+    def ingest(self, group_name: str, df: pd.DataFrame) -> int:
+        """Add records (new records, or new versions of existing ones) to a feature group
+
+        Versions of a record are distinguished by event time, so re-ingesting a record with a later
+        `event_time` doesn't overwrite history. Returns the number of files written.
+
+        :param group_name: Feature group to add to (created if it doesn't exist)
+        :param df: Records, which must include the store's `record_id` and `event_time` columns
+        """
+        missing = [c for c in (self.record_id, self.event_time) if c not in df]
+        if missing:
+            raise ValueError(f"Feature group records must include columns {missing}")
+        group_dir = self._group_dir(group_name)
+        os.makedirs(group_dir, exist_ok=True)
+        try:
+            files = self.catalog(group_name)
+        except ValueError:
+            files = []
+
+        df = df.sort_values([self.record_id, self.event_time], kind="stable")
+        partitions = df[self.event_time].to_numpy() // self.partition_secs
+        for partition in np.unique(partitions):
+            part_df = df[partitions == partition]
+            rel_path = os.path.join(
+                f"partition={partition * self.partition_secs}",
+                f"{uuid.uuid4().hex}.parquet",
+            )
+            path = os.path.join(group_dir, rel_path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            table = pa.Table.from_pandas(part_df, preserve_index=False)
+            pq.write_table(table, path, row_group_size=self.row_group_size)
+            # (.tolist() gives plain JSON-able Python values, for string as well as numeric IDs)
+            min_id, max_id = part_df[self.record_id].agg(["min", "max"]).tolist()
+            min_time, max_time = part_df[self.event_time].agg(["min", "max"]).tolist()
+            files.append({
+                "path": rel_path,
+                "rows": len(part_df),
+                "min_id": min_id,
+                "max_id": max_id,
+                "min_time": min_time,
+                "max_time": max_time,
+            })
+        self._save_catalog(group_name, files)
+        n_files = len(np.unique(partitions))
+        print(f"Ingested {len(df)} records into feature group '{group_name}' ({n_files} files)")
+        return n_files
+
+    def read_group(
+        self,
+        group_name: str,
+        columns: Optional[List[str]]=None,
+        record_ids: Optional[List]=None,
+        start_time: Optional[int]=None,
+        end_time: Optional[int]=None,
+    ) -> pd.DataFrame:
+        """Read (all versions of) a feature group's records, reading only the files that could match
+
+        :param group_name: Feature group to read
+        :param columns: Optional feature columns to read (the record ID and event time are always included)
+        :param record_ids: Optional record IDs to read
+        :param start_time: Optional minimum event time (inclusive)
+        :param end_time: Optional maximum event time (inclusive)
+        """
+        group_dir = self._group_dir(group_name)
+        all_files = self.catalog(group_name)
+        files = all_files
+        min_id = max_id = None
+        if record_ids is not None:
+            record_ids = np.unique(np.asarray(record_ids))
+            if not len(record_ids):
+                files = []
+            else:
+                min_id, max_id = record_ids[[0, -1]].tolist()
+        files = [
+            f for f in files
+            if (min_id is None or (f["max_id"] >= min_id and f["min_id"] <= max_id))
+            and (start_time is None or f["max_time"] >= start_time)
+            and (end_time is None or f["min_time"] <= end_time)
+        ]
+        if columns is not None:
+            columns = list(dict.fromkeys([self.record_id, self.event_time] + list(columns)))
+        if not len(files):
+            if not len(all_files):
+                return pd.DataFrame(columns=columns or [self.record_id, self.event_time])
+            # Nothing matched, but still return the group's columns & types (e.g. for joins to add as NaN):
+            schema = pq.read_schema(os.path.join(group_dir, all_files[0]["path"]))
+            return schema.empty_table().select(columns or schema.names).to_pandas()
+
+        expr = None
+        conditions = []
+        if record_ids is not None:
+            conditions.append(pc.field(self.record_id).isin(pa.array(record_ids)))
+        if start_time is not None:
+            conditions.append(pc.field(self.event_time) >= start_time)
+        if end_time is not None:
+            conditions.append(pc.field(self.event_time) <= end_time)
+        for condition in conditions:
+            expr = condition if expr is None else expr & condition
+
+        dataset = pads.dataset([os.path.join(group_dir, f["path"]) for f in files], format="parquet")
+        return dataset.to_table(columns=columns, filter=expr).to_pandas()
+
+    def training_set(
+        self,
+        entity_df: pd.DataFrame,
+        features: Dict[str, Optional[List[str]]],
+        max_age_secs: Optional[int]=None,
+    ) -> pd.DataFrame:
+        """Point-in-time join feature groups onto `entity_df`
+
+        For each row of `entity_df` (which must have the store's `record_id` and `event_time` columns, e.g.
+        labels as-of some time), adds the features from the latest version of the record in each feature group
+        with event time <= the row's. Rows with no such version get NaN features. The result keeps
+        `entity_df`'s rows in their original order.
+
+        :param entity_df: Records (and times) to fetch features for
+        :param features: { feature_group_name: [feature columns] } - or None for all of a group's columns
+        :param max_age_secs: Optionally ignore feature versions more than this many seconds older than the
+            entity row (like a feature store TTL) - which also lets older partitions be skipped entirely
+        """
+        key_cols = [self.record_id, self.event_time]
+        missing = [c for c in key_cols if c not in entity_df]
+        if missing:
+            raise ValueError(f"entity_df must include columns {missing}")
+
+        # merge_asof needs both sides sorted by the time key: Remember the original order to restore after
+        result = entity_df.reset_index(drop=True)
+        result["_entity_order"] = np.arange(len(result))
+        result = result.sort_values(self.event_time, kind="stable")
+        min_time = result[self.event_time].min()
+        max_time = result[self.event_time].max()
+        for group_name, group_columns in features.items():
+            group_df = self.read_group(
+                group_name,
+                columns=group_columns,
+                record_ids=result[self.record_id].unique(),
+                start_time=None if max_age_secs is None else min_time - max_age_secs,
+                end_time=max_time,
+            )
+            clashes = [c for c in group_df.columns if c in result and c not in key_cols]
+            if clashes:
+                raise ValueError(
+                    f"Feature group '{group_name}' columns {clashes} already exist in the result"
+                )
+            group_df = group_df.sort_values(self.event_time, kind="stable").astype(
+                { k: result[k].dtype for k in key_cols }
+            )
+            result = pd.merge_asof(
+                result,
+                group_df,
+                on=self.event_time,
+                by=self.record_id,
+                direction="backward",
+                tolerance=max_age_secs,
+            )
+        result = result.sort_values("_entity_order").drop(columns=["_entity_order"])
+        return result.set_index(entity_df.index)
+
+
+class OnlineFeatureStore:
+    """In-memory emulation of an online feature store: The latest feature vector per record ID
+
+    Feature vectors are held in one preallocated numeric array (a row "slot" per record) with an ID->slot
+    lookup, so memory is fixed at `max_records` x n_features regardless of how many records are put. When
+    full, the least recently used (put or got) record is evicted to make room.
+
+    >>> online = util.featurestore.OnlineFeatureStore.from_offline(store, "credit", max_records=10000)
+    >>> X = online.get_many(batch_df["txn_id"])  # Rows of NaN for any unknown/evicted IDs
+    """
+
+    def __init__(
+        self,
+        feature_names: List[str],
+        max_records: int=100000,
+        dtype=np.float32,
+        record_id: str="txn_id",
+        event_time: str="txn_timestamp",
+    ):
+        """Create an empty online store
+
+        :param feature_names: Names of the (numeric) features to store, in vector order
+        :param max_records: Maximum number of records to hold before evicting the least recently used
+        :param dtype: Numpy dtype to store feature values as
+        :param record_id: Name of the record identifier column in put DataFrames
+        :param event_time: Name of the event time column in put DataFrames
+        """
+        if max_records < 1:
+            raise ValueError(f"max_records must be at least 1. Got {max_records}")
+        self.feature_names = list(feature_names)
+        self.max_records = max_records
+        self.record_id = record_id
+        self.event_time = event_time
+        self._values = np.full((max_records, len(self.feature_names)), np.nan, dtype=dtype)
+        self._times = np.zeros(max_records, dtype=np.int64)
+        # Ordered least -> most recently used:
+        self._slots = OrderedDict()
+        self._free_slots = list(range(max_records - 1, -1, -1))
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_dataframe(
+        cls,
+        df: pd.DataFrame,
+        feature_names: Optional[List[str]]=None,
+        record_id: str="txn_id",
+        event_time: str="txn_timestamp",
+        **kwargs,
+    ) -> "OnlineFeatureStore":
+        """Create an online store loaded with the latest features per record from `df`
+
+        :param df: Records, e.g. a Data Wrangler output loaded with util.data.dataframe_from_s3_folder()
+        :param feature_names: Features to store (default: all numeric columns except the ID and time)
+        :param **kwargs: Passed through to the OnlineFeatureStore constructor (e.g. `max_records`)
+        """
+        if feature_names is None:
+            feature_names = [
+                c for c in df.select_dtypes(include=["number", "bool"]).columns
+                if c not in (record_id, event_time)
+            ]
+        store = cls(feature_names, record_id=record_id, event_time=event_time, **kwargs)
+        store.put_many(df)
+        return store
+
+    @classmethod
+    def from_offline(
+        cls,
+        offline_store: OfflineFeatureStore,
+        group_name: str,
+        feature_names: Optional[List[str]]=None,
+        **kwargs,
+    ) -> "OnlineFeatureStore":
+        """Create an online store loaded with the latest features per record of an offline feature group"""
+        df = offline_store.read_group(group_name, columns=feature_names)
+        return cls.from_dataframe(
+            df,
+            feature_names=feature_names,
+            record_id=offline_store.record_id,
+            event_time=offline_store.event_time,
+            **kwargs,
+        )
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, record_id) -> bool:
+        return record_id in self._slots
+
+    def put_many(self, df: pd.DataFrame) -> int:
+        """Store the latest feature vector per record from `df`, returning the number of records updated
+
+        Records older than the version already stored (by event time) are ignored. If `df` has no event time
+        column, its rows always replace what's stored.
+        """
+        if self.event_time in df:
+            df = df.sort_values(self.event_time, kind="stable")
+            times = df[self.event_time].to_numpy(dtype=np.int64)
+        else:
+            times = np.zeros(len(df), dtype=np.int64)
+        ids = df[self.record_id].tolist()
+        values = df[self.feature_names].to_numpy(dtype=self._values.dtype)
+        # Keep only the last (latest) row per ID:
+        last_row = { record_id: ix for ix, record_id in enumerate(ids) }
+        updated = 0
+        for record_id, ix in last_row.items():
+            slot = self._slots.get(record_id)
+            if slot is None:
+                slot = self._allocate(record_id)
+            elif times[ix] < self._times[slot]:
+                continue
+            else:
+                self._slots.move_to_end(record_id)
+            self._values[slot] = values[ix]
+            self._times[slot] = times[ix]
+            updated += 1
+        return updated
+
+    def _allocate(self, record_id) -> int:
+        if self._free_slots:
+            slot = self._free_slots.pop()
+        else:
+            _, slot = self._slots.popitem(last=False)
+            self.evictions += 1
+        self._slots[record_id] = slot
+        return slot
+
+    def get(self, record_id) -> Optional[np.ndarray]:
+        """Latest feature vector for one record (or None if not stored)"""
+        slot = self._slots.get(record_id)
+        if slot is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._slots.move_to_end(record_id)
+        return self._values[slot].copy()
+
+    def get_many(self, record_ids) -> np.ndarray:
+        """Latest feature vectors for a batch of records, as a (len(record_ids), n_features) array
+
+        Rows for records not in the store are all NaN. Gathers all found rows in one vectorized copy.
+        """
+        slots = np.empty(len(record_ids), dtype=np.int64)
+        found = np.zeros(len(record_ids), dtype=bool)
+        for ix, record_id in enumerate(record_ids):
+            slot = self._slots.get(record_id)
+            if slot is not None:
+                slots[ix] = slot
+                found[ix] = True
+                self._slots.move_to_end(record_id)
+        n_found = int(found.sum())
+        self.hits += n_found
+        self.misses += len(record_ids) - n_found
+
+        result = np.full((len(record_ids), len(self.feature_names)), np.nan, dtype=self._values.dtype)
+        result[found] = self._values[slots[found]]
+        return result
+
+    def get_many_df(self, record_ids) -> pd.DataFrame:
+        """Like get_many(), but returning a DataFrame indexed by record ID"""
+        return pd.DataFrame(
+            self.get_many(record_ids),
+            columns=self.feature_names,
+            index=pd.Index(record_ids, name=self.record_id),
+        )
+
+    def stats(self) -> dict:
+        """Lookup statistics and memory use of the store"""
+        lookups = self.hits + self.misses
+        return {
+            "records": len(self._slots),
+            "max_records": self.max_records,
+            "value_bytes": self._values.nbytes + self._times.nbytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else None,
+            "evictions": self.evictions,
+        }
+
@@ -0,0 +1,79 @@
+"""Cheap, stable content fingerprints for DataFrames and S3 prefixes
+
+Useful as cache keys and skip-if-unchanged checks - for example as the `version` of a util.snapshot:
+
+>>> raw_version = util.fingerprint.s3_prefix_fingerprint(raw_s3uri)
+>>> util.snapshot.save_dataframe("raw_df", raw_df, version=raw_version)
+
+DataFrame fingerprints hash each column with Pandas' vectorized hash_pandas_object() and digest the resulting
+hash arrays, so they take well under a second for millions of rows (see benchmarks.py to measure). S3 prefix
+fingerprints only list the prefix, and combine each object's key, ETag and size - so they cost no downloads.
+"""
+
+# Python Built-Ins:
+import hashlib
+
+# External Dependencies:
+import numpy as np
+import pandas as pd
+
+# Local Dependencies:
+from .data import list_s3_objects
+
+
+def dataframe_fingerprint(
+    df: pd.DataFrame,
+    include_index: bool=False,
+    order_sensitive: bool=True,
+) -> str:
+    """Fingerprint the content (column names, dtypes and values) of a DataFrame, as a hex string
+
+    Equal DataFrames always get the same fingerprint, in any process or session. Different ones get different
+    fingerprints with overwhelming probability (values are hashed to 64 bits per cell, then digested with
+    BLAKE2b).
+
+    :param df: DataFrame to fingerprint
+    :param include_index: Set True to also hash the index values
+    :param order_sensitive: Set False to get the same fingerprint regardless of row order (rows are hashed
+        whole, and the row hashes summed)
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{len(df)} rows".encode("utf-8"))
+    for col in df.columns:
+        digest.update(f"\0{col}\0{df[col].dtype}".encode("utf-8"))
+    if include_index:
+        digest.update(f"\0index\0{df.index.dtype}".encode("utf-8"))
+
+    if not order_sensitive:
+        row_hashes = pd.util.hash_pandas_object(df, index=include_index).to_numpy()
+        # uint64 addition wraps around, which is fine (and order-independent) for combining hashes:
+        digest.update(np.uint64(row_hashes.sum(dtype=np.uint64)).tobytes())
+        return digest.hexdigest()
+
+    for col in range(df.shape[1]):
+        digest.update(pd.util.hash_pandas_object(df.iloc[:, col], index=False).to_numpy().tobytes())
+    if include_index:
+        digest.update(pd.util.hash_pandas_object(df.index.to_series(), index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def s3_prefix_fingerprint(s3uri: str, **kwargs) -> str:
+    """Fingerprint the objects under an S3 prefix from their listing (key, ETag and size), as a hex string
+
+    Changes whenever an object under the prefix is added, removed or overwritten with different content - with
+    no object downloads required. Keys are taken relative to the prefix, so an identical copy of a folder at
+    another prefix gets the same fingerprint.
+
+    Note that an object re-uploaded with identical content in a different multipart layout gets a different
+    ETag, so it may change the fingerprint even though the data didn't.
+
+    :param s3uri: Prefix to fingerprint, like s3://bucket/folder/
+    :param **kwargs: Passed through to util.data.list_s3_objects() (e.g. `max_workers`)
+    """
+    _, _, prefix = s3uri[len("s3://"):].partition("/")
+    digest = hashlib.blake2b(digest_size=16)
+    for obj in list_s3_objects(s3uri, **kwargs):
+        etag = obj.e_tag.strip('"')
+        digest.update(f"{obj.key[len(prefix):]}\0{etag}\0{obj.size}\n".encode("utf-8"))
+    return digest.hexdigest()
+
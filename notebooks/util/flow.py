@@ -0,0 +1,2071 @@
+"""Local Pandas/NumPy execution of SageMaker Data Wrangler .flow files
+
+Data Wrangler flows normally run on Spark (in Data Wrangler itself, or a Processing job - see util.wrangler).
+For quick iteration on small-to-medium data, execute_flow() instead parses the flow graph and runs its
+transforms locally with vectorized Pandas/NumPy implementations of the common operators:
+
+- infer_and_cast_type, cast_single_data_type
+- custom_formula (a Spark SQL expression subset, including window functions - see parse_expression())
+- manage_columns (drop, duplicate, rename, move)
+- search_and_edit (extract using regex, split string by delimiter, find and replace substring)
+- handle_missing (fill, impute, drop)
+- manage_vectors (flatten)
+- encode_categorical (one-hot and ordinal encode)
+- featurize_text (vectorize with count vectorizer)
+
+Trained parameters saved in the flow (e.g. inferred schemas, one-hot labels, count vectorizer vocabularies)
+are re-used where present, so results match the Spark job's. Otherwise they're fitted on the local data.
+
+>>> df = util.flow.execute_flow("credit-prebuilt.flow", sources={ "german.csv": raw_s3uri })
+>>> util.flow.compare_flow_output(df, flow_output_s3uri, key="txn_id")
+
+Flows are run as a FlowPlan of steps (see compile_flow()). With `optimize=True`, chains of per-column
+transforms are fused into single passes, and columns are dropped right after their last use (or never
+computed/read at all, if unused):
+
+>>> print(util.flow.compile_flow("credit-prebuilt.flow").explain())
+
+With `sparse=True`, one-hot and count vectorizer outputs (in "Columns" style) are built directly as sparse
+matrices and kept as Pandas sparse columns, so wide encodings cost memory in proportion to their non-zero
+values. Export them to SciPy CSR or libsvm without densifying:
+
+>>> df = util.flow.execute_flow("credit-prebuilt.flow", sources=sources, sparse=True)
+>>> train_df = df[df["dataset"] == "train"].drop(columns=["dataset"])
+>>> util.flow.to_libsvm(train_df, "credit_default", f"{train_s3uri}/train.libsvm")
+
+Note that functions with no exact local equivalent (like Spark's `rand(seed)`) produce different values
+than on Spark.
+"""
+
+# Python Built-Ins:
+import base64
+from collections import namedtuple, OrderedDict
+import hashlib
+import io
+import json
+import math
+import operator
+import os
+import re
+import time
+from typing import Callable, Dict, List, Optional, Tuple, Union
+import zipfile
+
+# External Dependencies:
+import boto3
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import scipy.sparse
+
+# Local Dependencies:
+from .data import dataframe_from_s3_folder
+from .fingerprint import dataframe_fingerprint, s3_prefix_fingerprint
+
+
+FlowNode = namedtuple(
+    "FlowNode",
+    ["node_id", "type", "operator", "parameters", "trained_parameters", "input_ids"],
+)
+
+# Registry of local implementations, by operator name (version suffix removed): See @flow_operator
+OPERATORS = {}
+# ...and of variants producing Pandas sparse columns, for operators whose outputs are mostly zeros:
+SPARSE_OPERATORS = {}
+
+
+def flow_operator(name: str, sparse: bool=False):
+    """Register function(df, parameters, trained_parameters) -> df as the local version of a flow operator
+
+    :param sparse: Register `fn` as the operator's sparse-output variant, used by run_node(sparse=True)
+    """
+    def decorator(fn: Callable[[pd.DataFrame, dict, dict], pd.DataFrame]):
+        (SPARSE_OPERATORS if sparse else OPERATORS)[name] = fn
+        return fn
+    return decorator
+
+
+def _operator_name(full_operator: str) -> str:
+    """'sagemaker.spark.custom_formula_0.1' -> 'custom_formula', 'sagemaker.s3_source_0.1' -> 's3_source'"""
+    name = full_operator.split(".spark.")[-1].split("sagemaker.")[-1]
+    return re.sub(r"_\d+(\.\d+)*$", "", name)
+
+
+#### Flow graph
+
+def load_flow(flow: Union[str, dict]) -> dict:
+    """Load a .flow file from a local path or s3:// URI (or pass through an already-loaded flow dict)"""
+    if isinstance(flow, dict):
+        return flow
+    if flow.lower().startswith("s3://"):
+        bucket_name, _, key = flow[len("s3://"):].partition("/")
+        return json.loads(boto3.resource("s3").Object(bucket_name, key).get()["Body"].read())
+    with open(flow) as f:
+        return json.load(f)
+
+
+def _json_param(value):
+    """Trained parameters are sometimes stored as JSON strings rather than objects"""
+    if isinstance(value, str) and value[:1] in ("{", "["):
+        return json.loads(value)
+    return value
+
+
+def parse_flow(flow: Union[str, dict]) -> Dict[str, FlowNode]:
+    """Parse a flow's nodes into { node_id: FlowNode }, in file order"""
+    flow = load_flow(flow)
+    nodes = {}
+    for node in flow["nodes"]:
+        nodes[node["node_id"]] = FlowNode(
+            node_id=node["node_id"],
+            type=node["type"],
+            operator=node["operator"],
+            parameters=node.get("parameters", {}),
+            trained_parameters={ k: _json_param(v) for k, v in node.get("trained_parameters", {}).items() },
+            input_ids=[i["node_id"] for i in node.get("inputs", [])],
+        )
+    return nodes
+
+
+def node_label(node: FlowNode) -> str:
+    """Short human-readable description of a node, like 'custom_formula(credit_default)'"""
+    name = _operator_name(node.operator)
+    params = node.parameters
+    if node.type == "SOURCE":
+        return f"source({params.get('dataset_definition', {}).get('name', node.node_id)})"
+
+    def find_column(params: dict) -> Optional[str]:
+        for key in ("output_column", "column", "input_column", "column_to_drop", "column_to_move"):
+            if isinstance(params.get(key), str) and params[key]:
+                return params[key]
+        nested = (
+            find_column(v) for k, v in params.items() if isinstance(v, dict) and k.endswith("_parameters")
+        )
+        return next((col for col in nested if col), None)
+
+    detail = find_column(params)
+    op = params.get("operator")
+    return f"{name}[{op}]({detail})" if op else f"{name}({detail or ''})"
+
+
+def flow_output_nodes(flow: Union[str, dict]) -> List[str]:
+    """IDs of the flow's final transform nodes (those no other transform takes as input)"""
+    nodes = parse_flow(flow)
+    consumed = {
+        input_id for node in nodes.values() if node.type in ("TRANSFORM", "SOURCE")
+        for input_id in node.input_ids
+    }
+    return [
+        node_id for node_id, node in nodes.items()
+        if node.type in ("TRANSFORM", "SOURCE") and node_id not in consumed
+    ]
+
+
+def flow_lineage(flow: Union[str, dict], output_node: Optional[str]=None) -> List[FlowNode]:
+    """The ordered list of nodes needed to compute `output_node` (default the flow's single final node)"""
+    nodes = parse_flow(flow)
+    if output_node is None:
+        outputs = flow_output_nodes(nodes_to_flow(nodes))
+        if len(outputs) != 1:
+            raise ValueError(
+                f"Flow has {len(outputs)} output nodes: Please specify output_node from {outputs}"
+            )
+        output_node = outputs[0]
+    if output_node not in nodes:
+        raise ValueError(f"Node {output_node} not found in flow")
+
+    ordered = []
+    visited = set()
+
+    def visit(node_id):
+        if node_id in visited:
+            return
+        visited.add(node_id)
+        for input_id in nodes[node_id].input_ids:
+            visit(input_id)
+        ordered.append(nodes[node_id])
+
+    visit(output_node)
+    return ordered
+
+
+def nodes_to_flow(nodes: Dict[str, FlowNode]) -> dict:
+    """Inverse of parse_flow() (enough to re-parse - trained parameters are kept as objects)"""
+    return {
+        "metadata": { "version": 1 },
+        "nodes": [
+            {
+                "node_id": n.node_id,
+                "type": n.type,
+                "operator": n.operator,
+                "parameters": n.parameters,
+                "trained_parameters": n.trained_parameters,
+                "inputs": [{ "name": "df", "node_id": i, "output_name": "default" } for i in n.input_ids],
+                "outputs": [{ "name": "default" }],
+            }
+            for n in nodes.values()
+        ],
+    }
+
+
+#### Execution
+
+def _read_source(node: FlowNode, source=None, skip_columns: List[str]=[]) -> pd.DataFrame:
+    """Load a SOURCE node's data (as all-string columns, like Spark's CSV reader) from an override or S3
+
+    :param skip_columns: Columns not to load (where present)
+    """
+    if isinstance(source, pd.DataFrame):
+        return source.drop(columns=skip_columns, errors="ignore").copy()
+    context = node.parameters.get("dataset_definition", {}).get("s3ExecutionContext", {})
+    s3uri = source or context.get("s3Uri")
+    if not s3uri:
+        raise ValueError(f"No data source for node {node_label(node)}: Please provide one in `sources`")
+    header = 0 if context.get("s3HasHeader", True) else None
+    read_kwargs = { "dtype": str, "header": header, "keep_default_na": False, "na_values": [""] }
+    if skip_columns and header is not None:
+        read_kwargs["usecols"] = lambda col: col not in skip_columns
+    if s3uri.lower().startswith("s3://"):
+        df = dataframe_from_s3_folder(s3uri, **read_kwargs)
+    else:
+        df = pd.read_csv(s3uri, **read_kwargs)
+    if header is None:
+        df.columns = [f"_c{ix}" for ix in range(df.shape[1])]
+        df = df.drop(columns=skip_columns, errors="ignore")
+    return df.astype("string")
+
+
+def run_node(node: FlowNode, df: pd.DataFrame, sparse: bool=False) -> pd.DataFrame:
+    """Apply one TRANSFORM node to `df` locally
+
+    :param sparse: Use the operator's sparse-output variant, if it has one (see execute_flow())
+    """
+    name = _operator_name(node.operator)
+    if sparse and name in SPARSE_OPERATORS:
+        return SPARSE_OPERATORS[name](df, node.parameters, node.trained_parameters)
+    if name not in OPERATORS:
+        raise NotImplementedError(
+            f"Operator {node.operator} ({node_label(node)}) has no local implementation. Supported: "
+            f"{sorted(OPERATORS)}"
+        )
+    return OPERATORS[name](df, node.parameters, node.trained_parameters)
+
+
+def execute_flow(
+    flow: Union[str, dict],
+    sources: Optional[Dict[str, Union[str, pd.DataFrame]]]=None,
+    output_node: Optional[str]=None,
+    optimize: bool=False,
+    verbose: bool=True,
+    cache: Optional["FlowResultCache"]=None,
+    sparse: bool=False,
+) -> pd.DataFrame:
+    """Run a Data Wrangler flow locally, returning the output DataFrame of `output_node`
+
+    :param flow: Path or s3:// URI of a .flow file (or a loaded flow dict)
+    :param sources: Optional overrides for the flow's data sources: { source_name_or_node_id: data }, where
+        data is an S3 URI, local CSV path or DataFrame. Sources not listed are read from the S3 URIs in the
+        flow.
+    :param output_node: ID of the node to compute (default: the flow's single final transform)
+    :param optimize: Set True to run an optimized plan (see compile_flow()), printed first if `verbose`
+    :param verbose: Print each step's timing as it runs
+    :param cache: Optional FlowResultCache to re-use step results from earlier runs: Only steps from the
+        first one with changed parameters (or input data) onwards are re-computed.
+    :param sparse: Set True for one-hot and count vectorizer outputs in "Columns" style to be Pandas sparse
+        columns, so their memory is proportional to the non-zero values rather than rows x categories/terms.
+        See to_csr() and to_libsvm() to export the result.
+    """
+    plan = compile_flow(
+        flow, output_node=output_node, optimize=optimize, verbose=verbose and optimize, sparse=sparse
+    )
+    return plan.execute(sources, verbose=verbose, cache=cache)
+
+
+def compare_flow_output(
+    local_df: pd.DataFrame,
+    processing_output: Union[str, pd.DataFrame],
+    key: Optional[str]=None,
+    rtol: float=1e-6,
+) -> pd.DataFrame:
+    """Compare a locally executed flow's output with the output of a Data Wrangler Processing job
+
+    Returns a DataFrame with one row per column: whether it's present in each output, and the number of rows
+    whose values differ. Columns derived from random numbers (e.g. random splits) are expected to differ.
+
+    :param local_df: Output of execute_flow()
+    :param processing_output: The Processing job's output S3 URI (or the loaded DataFrame)
+    :param key: Optional unique row ID column to align rows on (otherwise rows are compared in order)
+    :param rtol: Relative tolerance for comparing numeric values
+    """
+    remote_df = (
+        dataframe_from_s3_folder(processing_output) if isinstance(processing_output, str)
+        else processing_output
+    )
+    if len(local_df) != len(remote_df):
+        print(f"WARNING: Row counts differ (local {len(local_df)}, processing job {len(remote_df)})")
+    if key is not None:
+        local_df = local_df.set_index(key).sort_index()
+        remote_df = remote_df.set_index(key).sort_index()
+        local_df, remote_df = local_df.align(remote_df, join="inner", axis=0)
+    else:
+        n = min(len(local_df), len(remote_df))
+        local_df = local_df.iloc[:n].reset_index(drop=True)
+        remote_df = remote_df.iloc[:n].reset_index(drop=True)
+
+    rows = []
+    for col in list(dict.fromkeys(list(local_df.columns) + list(remote_df.columns))):
+        mismatches = None
+        if col in local_df and col in remote_df:
+            left = local_df[col]
+            if isinstance(left.dtype, pd.SparseDtype):
+                left = left.sparse.to_dense()
+            right = remote_df[col]
+            left_num = pd.to_numeric(left, errors="coerce").astype("float64")
+            right_num = pd.to_numeric(right, errors="coerce").astype("float64")
+            if left_num.notna().equals(left.notna()) and right_num.notna().equals(right.notna()):
+                same = np.isclose(left_num, right_num, rtol=rtol, equal_nan=True)
+            else:
+                same = (left.astype("string").fillna("") == right.astype("string").fillna("")).to_numpy()
+            mismatches = int((~same).sum())
+        rows.append({
+            "column": col,
+            "in_local": col in local_df,
+            "in_processing_job": col in remote_df,
+            "mismatched_rows": mismatches,
+        })
+    return pd.DataFrame(rows)
+
+
+def to_csr(df: pd.DataFrame, columns: Optional[List[str]]=None) -> Tuple[scipy.sparse.csr_matrix, List[str]]:
+    """Convert numeric (dense or Pandas sparse) columns of a flow output to a SciPy CSR matrix
+
+    Sparse columns (from execute_flow(sparse=True)) are converted without densifying, so this stays cheap for
+    wide one-hot and count vectorizer outputs. Returns (matrix, column names), with columns in `df` order.
+
+    :param df: Flow output DataFrame
+    :param columns: Columns to include (default all). All must be numeric or boolean: Nulls become NaNs.
+    """
+    columns = list(df.columns if columns is None else columns)
+    non_numeric = [
+        c for c in columns
+        if not (pd.api.types.is_numeric_dtype(df[c].dtype) or pd.api.types.is_bool_dtype(df[c].dtype))
+    ]
+    if non_numeric:
+        raise ValueError(f"Can't convert non-numeric columns to a sparse matrix: {non_numeric}")
+    rows, cols, data = [], [], []
+    for ix, col in enumerate(columns):
+        values = df[col]
+        if isinstance(values.dtype, pd.SparseDtype) and values.sparse.fill_value == 0:
+            row_ix = values.array.sp_index.indices
+            col_values = values.array.sp_values.astype(np.float64)
+        else:
+            if isinstance(values.dtype, pd.SparseDtype):
+                values = values.sparse.to_dense()
+            dense = values.astype("float64").to_numpy(dtype=np.float64, na_value=np.nan)
+            row_ix = np.flatnonzero(dense != 0)  # (Keeps NaNs)
+            col_values = dense[row_ix]
+        rows.append(row_ix)
+        cols.append(np.full(len(row_ix), ix, dtype=np.int32))
+        data.append(col_values)
+    matrix = scipy.sparse.csr_matrix(
+        (
+            np.concatenate(data) if data else np.zeros(0),
+            (
+                np.concatenate(rows) if rows else np.zeros(0, dtype=np.int32),
+                np.concatenate(cols) if cols else np.zeros(0, dtype=np.int32),
+            ),
+        ),
+        shape=(len(df), len(columns)),
+    )
+    return matrix, columns
+
+
+def to_libsvm(
+    df: pd.DataFrame,
+    label_column: str,
+    path: Optional[str]=None,
+    columns: Optional[List[str]]=None,
+    zero_based: bool=True,
+    chunk_rows: int=100000,
+) -> str:
+    """Write a flow output as libsvm (svmlight) text, e.g. for SageMaker XGBoost's "text/libsvm" content type
+
+    Each row becomes a line "{label} {index}:{value} ...", listing only the non-zero features. Null (NaN)
+    features are left out too, which XGBoost treats as missing.
+
+    :param df: Flow output DataFrame (sparse columns from execute_flow(sparse=True) are never densified)
+    :param label_column: Numeric target column, written first on each line
+    :param path: Local path or s3:// URI to write to. If not set, the text is returned instead of the path.
+    :param columns: Feature columns, in index order (default all columns except the label). See to_csr().
+    :param zero_based: Number features from 0 (as XGBoost expects by default), rather than 1
+    :param chunk_rows: Number of rows to format at a time
+    """
+    if columns is None:
+        columns = [c for c in df.columns if c != label_column]
+    matrix, _ = to_csr(df, columns)
+    matrix.data[np.isnan(matrix.data)] = 0.0
+    matrix.eliminate_zeros()
+    labels = pd.to_numeric(df[label_column]).astype("float64").to_numpy(dtype=np.float64, na_value=np.nan)
+    if np.isnan(labels).any():
+        raise ValueError(f"Label column {label_column} has {np.isnan(labels).sum()} null values")
+
+    # Format each distinct feature index and value just once:
+    offset = 0 if zero_based else 1
+    index_text = np.array([f"{ix + offset}:" for ix in range(matrix.shape[1])], dtype=object)
+    label_codes, label_uniques = pd.factorize(labels)
+    label_text = np.array(["%.16g" % v for v in label_uniques], dtype=object)[label_codes]
+    buffer = io.StringIO()
+    for start in range(0, matrix.shape[0], chunk_rows):
+        chunk = matrix[start:start + chunk_rows]
+        chunk.sort_indices()
+        value_codes, value_uniques = pd.factorize(chunk.data)
+        value_text = np.array(["%.16g" % v for v in value_uniques], dtype=object)
+        features = (index_text[chunk.indices] + value_text[value_codes]).tolist()
+        indptr = chunk.indptr
+        for row, label in enumerate(label_text[start:start + chunk_rows].tolist()):
+            buffer.write(" ".join([label] + features[indptr[row]:indptr[row + 1]]))
+            buffer.write("\n")
+
+    if path is None:
+        return buffer.getvalue()
+    if path.lower().startswith("s3://"):
+        bucket_name, _, key = path[len("s3://"):].partition("/")
+        boto3.resource("s3").Object(bucket_name, key).put(Body=buffer.getvalue().encode("utf-8"))
+    else:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(buffer.getvalue())
+    return path
+
+
+#### Spark types & trained models
+
+SPARK_INTEGER_TYPES = ("int", "integer", "long", "bigint", "short", "smallint", "tinyint", "byte")
+SPARK_FLOAT_TYPES = ("double", "float", "decimal", "real")
+
+
+def _spark_model_rows(encoded: str) -> List[dict]:
+    """Decode a Spark ML model saved in a flow's trained parameters, returning its data rows
+
+    Data Wrangler stores fitted Spark models as base85-encoded zips of the model folder, whose `data/`
+    Parquet file holds e.g. a StringIndexer's labels or a CountVectorizer's vocabulary.
+    """
+    with zipfile.ZipFile(io.BytesIO(base64.b85decode(encoded))) as archive:
+        data_files = [n for n in archive.namelist() if n.startswith("data/") and n.endswith(".parquet")]
+        rows = []
+        for name in sorted(data_files):
+            rows += pq.read_table(io.BytesIO(archive.read(name))).to_pylist()
+    return rows
+
+
+def _to_numeric(values: pd.Series, dtype: str) -> pd.Series:
+    """Parse values as numbers: Strictly first (fast), falling back to Pandas' coercing parser if needed"""
+    try:
+        return values.astype(dtype)
+    except (TypeError, ValueError):
+        return pd.to_numeric(values, errors="coerce")
+
+
+def cast_series(values: pd.Series, spark_type: str) -> pd.Series:
+    """Cast a Series to (the nullable Pandas equivalent of) a Spark SQL type, with unparseable values -> null
+
+    Like Spark, casting text to a number that doesn't parse gives null rather than an error, and casting
+    fractional numbers to integer types truncates towards zero.
+    """
+    spark_type = spark_type.lower().strip()
+    if spark_type in SPARK_INTEGER_TYPES:
+        if pd.api.types.is_bool_dtype(values):
+            return values.astype("Int64")
+        numeric = _to_numeric(values, "Int64")
+        if pd.api.types.is_float_dtype(numeric):
+            numeric = np.trunc(numeric.astype("float64"))
+        return numeric.astype("Int64")
+    if spark_type in SPARK_FLOAT_TYPES:
+        if pd.api.types.is_bool_dtype(values):
+            return values.astype("Float64").astype("float64")
+        return _to_numeric(values, "float64").astype("float64")
+    if spark_type in ("string", "str"):
+        if pd.api.types.is_bool_dtype(values):
+            return values.map({ True: "true", False: "false" }, na_action="ignore").astype("string")
+        return values.astype("string")
+    if spark_type in ("boolean", "bool"):
+        if pd.api.types.is_bool_dtype(values):
+            return values.astype("boolean")
+        if pd.api.types.is_numeric_dtype(values):
+            return (values != 0).astype("boolean").mask(values.isna())
+        text = values.astype("string").str.strip().str.lower()
+        return text.map({ "true": True, "false": False }, na_action="ignore").astype("boolean")
+    if spark_type in ("date", "timestamp"):
+        result = pd.to_datetime(values, errors="coerce")
+        return result.dt.normalize() if spark_type == "date" else result
+    raise NotImplementedError(f"Casting to Spark type '{spark_type}' is not supported locally")
+
+
+def _infer_spark_type(values: pd.Series) -> str:
+    """Infer the Spark type of a text column like infer_and_cast_type: long, double, boolean or string"""
+    present = values.dropna()
+    if not len(present):
+        return "string"
+    text = present.astype("string").str.strip()
+    if text.str.fullmatch(r"[+-]?\d+").all():
+        return "long"
+    if pd.to_numeric(text, errors="coerce").notna().all():
+        return "double"
+    if text.str.lower().isin(["true", "false"]).all():
+        return "boolean"
+    return "string"
+
+
+#### Spark SQL expressions (for custom formulas)
+
+_TOKEN_RE = re.compile(
+    r"""\s*(?:
+        (?P<number>(?:\d+\.\d*|\.\d+|\d+)(?:[eE][+-]?\d+)?)
+        |(?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+        |(?P<quoted>`[^`]+`)
+        |(?P<name>[A-Za-z_][A-Za-z0-9_]*)
+        |(?P<op>==|!=|<>|<=|>=|\|\||[-+*/%<>=(),\[\]])
+    )""",
+    re.VERBOSE,
+)
+
+_KEYWORDS = {
+    "and", "or", "not", "case", "when", "then", "else", "end", "cast", "as", "is", "null", "in", "like",
+    "over", "partition", "by", "order", "asc", "desc", "true", "false", "nulls", "first", "last", "between",
+}
+
+# Binary operator binding powers (higher binds tighter):
+_BINARY_POWER = {
+    "or": 1,
+    "and": 2,
+    "=": 4, "==": 4, "!=": 4, "<>": 4, "<": 4, "<=": 4, ">": 4, ">=": 4, "is": 4, "in": 4, "like": 4,
+    "between": 4,
+    "||": 5,
+    "+": 6, "-": 6,
+    "*": 7, "/": 7, "%": 7,
+}
+
+
+def _tokenize(text: str) -> List[tuple]:
+    tokens = []
+    pos = 0
+    text = text.strip()
+    while pos < len(text):
+        match = _TOKEN_RE.match(text, pos)
+        if not match or match.end() == pos:
+            raise ValueError(f"Couldn't parse formula at position {pos}: '{text[pos:pos + 20]}...'")
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "name" and value.lower() in _KEYWORDS:
+            tokens.append(("kw", value.lower()))
+        elif kind == "quoted":
+            tokens.append(("name", value[1:-1]))
+        elif kind == "string":
+            tokens.append(("string", re.sub(r"\\(.)", r"\1", value[1:-1])))
+        elif kind == "number":
+            tokens.append(("number", float(value) if re.search(r"[.eE]", value) else int(value)))
+        else:
+            tokens.append((kind, value))
+        pos = match.end()
+        while pos < len(text) and text[pos].isspace():
+            pos += 1
+    return tokens
+
+
+class _Parser:
+    """Pratt parser for a subset of Spark SQL expressions, producing a tuple-based AST:
+
+    ("lit", value) | ("col", name) | ("call", fn, [args]) | ("binop", op, left, right) | ("not", x) |
+    ("neg", x) | ("cast", x, type) | ("case", [(cond, value)], else) | ("index", x, i) |
+    ("isnull", x, negated) | ("in", x, [values], negated) | ("like", x, pattern, negated) |
+    ("window", call, [partition_exprs], [(order_expr, ascending)])
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.tokens = _tokenize(text)
+        self.pos = 0
+
+    def peek(self, offset: int=0):
+        ix = self.pos + offset
+        return self.tokens[ix] if ix < len(self.tokens) else (None, None)
+
+    def next(self):
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def accept(self, kind: str, value=None) -> bool:
+        tkind, tvalue = self.peek()
+        if tkind == kind and (value is None or tvalue == value):
+            self.pos += 1
+            return True
+        return False
+
+    def expect(self, kind: str, value=None):
+        if not self.accept(kind, value):
+            raise ValueError(
+                f"Expected {value or kind} but got '{self.peek()[1]}' in formula: {self.text}"
+            )
+
+    def parse(self):
+        expr = self.expression(0)
+        if self.pos < len(self.tokens):
+            raise ValueError(f"Unexpected '{self.peek()[1]}' in formula: {self.text}")
+        return expr
+
+    def expression(self, min_power: int):
+        left = self.prefix()
+        while True:
+            kind, value = self.peek()
+            negated = False
+            if kind == "kw" and value == "not" and self.peek(1)[1] in ("in", "like", "between"):
+                negated = True
+                kind, value = self.peek(1)
+            if kind not in ("op", "kw") or value not in _BINARY_POWER:
+                break
+            power = _BINARY_POWER[value]
+            if power <= min_power:
+                break
+            self.pos += 2 if negated else 1
+            if value == "is":
+                is_not = self.accept("kw", "not")
+                self.expect("kw", "null")
+                left = ("isnull", left, is_not)
+            elif value == "in":
+                self.expect("op", "(")
+                values = [self.expression(0)]
+                while self.accept("op", ","):
+                    values.append(self.expression(0))
+                self.expect("op", ")")
+                left = ("in", left, values, negated)
+            elif value == "like":
+                left = ("like", left, self.expression(power), negated)
+            elif value == "between":
+                low = self.expression(power)
+                self.expect("kw", "and")
+                high = self.expression(power)
+                expr = ("binop", "and", ("binop", ">=", left, low), ("binop", "<=", left, high))
+                left = ("not", expr) if negated else expr
+            else:
+                left = ("binop", "==" if value == "=" else value, left, self.expression(power))
+        return left
+
+    def prefix(self):
+        kind, value = self.next()
+        if kind == "number" or kind == "string":
+            expr = ("lit", value)
+        elif kind == "kw" and value in ("true", "false"):
+            expr = ("lit", value == "true")
+        elif kind == "kw" and value == "null":
+            expr = ("lit", None)
+        elif kind == "kw" and value == "not":
+            expr = ("not", self.expression(3))
+        elif kind == "op" and value == "-":
+            expr = ("neg", self.expression(8))
+        elif kind == "op" and value == "+":
+            expr = self.expression(8)
+        elif kind == "op" and value == "(":
+            expr = self.expression(0)
+            self.expect("op", ")")
+        elif kind == "kw" and value == "case":
+            expr = self.case()
+        elif kind == "kw" and value == "cast":
+            self.expect("op", "(")
+            inner = self.expression(0)
+            self.expect("kw", "as")
+            type_kind, type_name = self.next()
+            if type_kind != "name":
+                raise ValueError(f"Expected a type name in CAST, got '{type_name}' in formula: {self.text}")
+            if self.accept("op", "("):
+                # Ignore precision/scale, e.g. decimal(10,2)
+                while self.pos < len(self.tokens) and self.peek() != ("op", ")"):
+                    self.next()
+                self.expect("op", ")")
+            self.expect("op", ")")
+            expr = ("cast", inner, type_name.lower())
+        elif kind == "name":
+            if self.accept("op", "("):
+                args = []
+                if self.peek() == ("op", "*") and self.peek(1) == ("op", ")"):
+                    # count(*) counts rows, like count(1)
+                    self.pos += 2
+                    args.append(("lit", 1))
+                elif not self.accept("op", ")"):
+                    args.append(self.expression(0))
+                    while self.accept("op", ","):
+                        args.append(self.expression(0))
+                    self.expect("op", ")")
+                expr = ("call", value.lower(), args)
+                if self.accept("kw", "over"):
+                    expr = self.window(expr)
+            else:
+                expr = ("col", value)
+        else:
+            raise ValueError(f"Unexpected '{value}' in formula: {self.text}")
+
+        while self.accept("op", "["):
+            index = self.expression(0)
+            self.expect("op", "]")
+            expr = ("index", expr, index)
+        return expr
+
+    def case(self):
+        subject = None
+        if self.peek() != ("kw", "when"):
+            subject = self.expression(0)
+        branches = []
+        while self.accept("kw", "when"):
+            cond = self.expression(0)
+            if subject is not None:
+                cond = ("binop", "==", subject, cond)
+            self.expect("kw", "then")
+            branches.append((cond, self.expression(0)))
+        otherwise = ("lit", None)
+        if self.accept("kw", "else"):
+            otherwise = self.expression(0)
+        self.expect("kw", "end")
+        return ("case", branches, otherwise)
+
+    def window(self, call):
+        self.expect("op", "(")
+        partition_by = []
+        order_by = []
+        if self.accept("kw", "partition"):
+            self.expect("kw", "by")
+            partition_by.append(self.expression(0))
+            while self.accept("op", ","):
+                partition_by.append(self.expression(0))
+        if self.accept("kw", "order"):
+            self.expect("kw", "by")
+            while True:
+                expr = self.expression(0)
+                ascending = not self.accept("kw", "desc")
+                if ascending:
+                    self.accept("kw", "asc")
+                order_by.append((expr, ascending))
+                if not self.accept("op", ","):
+                    break
+        self.expect("op", ")")
+        return ("window", call, partition_by, order_by)
+
+
+def parse_expression(formula: str) -> tuple:
+    """Parse a Spark SQL expression (as used in custom formula transforms) into a tuple-based AST
+
+    Supports literals, columns (optionally `quoted`), arithmetic, comparisons, AND/OR/NOT, IS [NOT] NULL,
+    [NOT] IN, [NOT] LIKE, BETWEEN, CAST, CASE WHEN, array indexing, common scalar functions, and window
+    functions like `row_number() OVER (PARTITION BY a ORDER BY b DESC)` (see WINDOW_FUNCTIONS).
+    """
+    return _Parser(formula).parse()
+
+
+def expression_columns(expr: tuple) -> List[str]:
+    """Names of the columns an expression AST references"""
+    kind = expr[0]
+    if kind == "col":
+        return [expr[1]]
+    if kind == "lit":
+        return []
+    columns = []
+    for part in expr[1:]:
+        if isinstance(part, tuple):
+            columns += expression_columns(part)
+        elif isinstance(part, list):
+            for item in part:
+                if isinstance(item, tuple) and len(item) and isinstance(item[0], tuple):
+                    # (cond, value) case branches, or (expr, ascending) window orderings
+                    for sub in item:
+                        if isinstance(sub, tuple):
+                            columns += expression_columns(sub)
+                elif isinstance(item, tuple):
+                    columns += expression_columns(item)
+    return list(dict.fromkeys(columns))
+
+
+def _on_uniques(values: pd.Series, fn: Callable[[pd.Series], pd.Series]) -> pd.Series:
+    """Apply a per-value transform fn(Series) -> Series to only the distinct values of a column
+
+    Text columns are usually low-cardinality, so this is typically much faster than string-processing every
+    row. Null is treated as one more distinct value.
+    """
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    return fn(pd.Series(uniques, dtype=values.dtype)).reindex(codes).set_axis(values.index)
+
+
+def _as_text_if_text(values: pd.Series) -> pd.Series:
+    """Use the (vectorized) string dtype for object Series of text, e.g. elements taken from arrays"""
+    if values.dtype == object and pd.api.types.infer_dtype(values, skipna=True) in ("string", "empty"):
+        return values.astype("string")
+    return values
+
+
+def _broadcast(value, index: pd.Index) -> pd.Series:
+    if isinstance(value, pd.Series):
+        return value
+    if value is None:
+        return pd.Series(pd.NA, index=index, dtype="object")
+    return pd.Series(value, index=index)
+
+
+def _to_boolean(value, index: pd.Index) -> pd.Series:
+    """Nullable boolean Series (Kleene logic for &, |, ~)"""
+    series = _broadcast(value, index)
+    if series.dtype == "boolean":
+        return series
+    if series.isna().all():
+        return pd.Series(pd.NA, index=index, dtype="boolean")
+    return series.astype("boolean")
+
+
+def _compare(op: Callable, left, right, index: pd.Index) -> pd.Series:
+    """Elementwise comparison with SQL null semantics (null if either side is null)"""
+    nulls = _broadcast(pd.isna(left), index) | _broadcast(pd.isna(right), index)
+    if any(isinstance(v, pd.Series) and v.dtype == object for v in (left, right)):
+        # e.g. elements of array columns: Compare value by value
+        pairs = zip(_broadcast(left, index), _broadcast(right, index), nulls)
+        result = pd.Series([False if null else op(l, r) for l, r, null in pairs], index=index)
+    else:
+        result = op(left, right)
+    return _broadcast(result, index).astype("boolean").mask(nulls)
+
+
+def _arith(op: Callable, left, right, index: pd.Index):
+    left_s = _broadcast(left, index)
+    right_s = _broadcast(right, index)
+    if op is operator.truediv or op is operator.mod:
+        left_f = pd.to_numeric(left_s, errors="coerce").astype("float64")
+        right_f = pd.to_numeric(right_s, errors="coerce").astype("float64")
+        with np.errstate(divide="ignore", invalid="ignore"):
+            result = op(left_f, right_f) if op is operator.truediv else np.fmod(left_f, right_f)
+        # SQL gives null (not inf) for division by zero:
+        return result.where(right_f != 0)
+    return op(pd.to_numeric(left_s, errors="coerce"), pd.to_numeric(right_s, errors="coerce"))
+
+
+def _string_fn(fn: Callable[[pd.Series], pd.Series]):
+    return lambda args, index: fn(_broadcast(args[0], index).astype("string"), *args[1:])
+
+
+def _fn_random(args, index):
+    seed = args[0] if len(args) else None
+    return pd.Series(np.random.default_rng(seed).random(len(index)), index=index)
+
+
+def _fn_coalesce(args, index):
+    result = _broadcast(args[0], index)
+    for arg in args[1:]:
+        result = result.where(result.notna(), _broadcast(arg, index))
+    return result
+
+
+def _fn_concat(args, index):
+    parts = [_broadcast(arg, index).astype("string") for arg in args]
+    result = parts[0]
+    for part in parts[1:]:
+        result = result + part
+    return result
+
+
+def _fn_round(args, index):
+    digits = args[1] if len(args) > 1 else 0
+    values = pd.to_numeric(_broadcast(args[0], index), errors="coerce").astype("float64")
+    # SQL rounds half away from zero (Python/NumPy round half to even)
+    scale = 10.0 ** digits
+    return np.sign(values) * np.floor(np.abs(values) * scale + 0.5) / scale
+
+
+def _fn_substring(args, index):
+    values = _broadcast(args[0], index).astype("string")
+    start = int(args[1])
+    length = int(args[2]) if len(args) > 2 else None
+    # 1-based positions (0 behaves like 1), and negative positions count from the end
+    start_ix = start - 1 if start > 0 else (start if start < 0 else 0)
+    if length is None:
+        return values.str.slice(start_ix)
+    end_ix = start_ix + length if start_ix < 0 and start_ix + length < 0 else (
+        None if start_ix < 0 else start_ix + length
+    )
+    return values.str.slice(start_ix, end_ix)
+
+
+def _numeric_fn(fn: Callable):
+    def apply(args, index):
+        values = pd.to_numeric(_broadcast(args[0], index), errors="coerce").astype("float64")
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return pd.Series(fn(values.to_numpy()), index=index).where(values.notna())
+    return apply
+
+
+def _fn_log(args, index):
+    if len(args) == 1:
+        return _numeric_fn(np.log)(args, index)
+    base = float(args[0])
+    return _numeric_fn(lambda v: np.log(v) / math.log(base))([args[1]], index)
+
+
+SQL_FUNCTIONS = {
+    "abs": lambda args, index: pd.to_numeric(_broadcast(args[0], index), errors="coerce").abs(),
+    "ceil": _numeric_fn(np.ceil),
+    "ceiling": _numeric_fn(np.ceil),
+    "coalesce": _fn_coalesce,
+    "concat": _fn_concat,
+    "exp": _numeric_fn(np.exp),
+    "floor": _numeric_fn(np.floor),
+    "if": lambda args, index: _case([(args[0], args[1])], args[2], index),
+    "isnotnull": lambda args, index: _broadcast(args[0], index).notna().astype("boolean"),
+    "isnull": lambda args, index: _broadcast(args[0], index).isna().astype("boolean"),
+    "length": _string_fn(lambda s: s.str.len().astype("Int64")),
+    "ln": _numeric_fn(np.log),
+    "log": _fn_log,
+    "log10": _numeric_fn(np.log10),
+    "lower": _string_fn(lambda s: s.str.lower()),
+    "ltrim": _string_fn(lambda s: s.str.lstrip()),
+    "nvl": _fn_coalesce,
+    "rand": _fn_random,
+    "random": _fn_random,
+    "regexp_extract": _string_fn(
+        lambda s, pattern, group=1: s.str.extract(f"({pattern})" if group == 0 else pattern, expand=True)[
+            0 if group == 0 else group - 1
+        ].fillna("")
+    ),
+    "regexp_replace": _string_fn(lambda s, pattern, repl: s.str.replace(pattern, repl, regex=True)),
+    "round": _fn_round,
+    "rtrim": _string_fn(lambda s: s.str.rstrip()),
+    "sqrt": _numeric_fn(np.sqrt),
+    "substr": _fn_substring,
+    "substring": _fn_substring,
+    "trim": _string_fn(lambda s: s.str.strip()),
+    "upper": _string_fn(lambda s: s.str.upper()),
+}
+
+
+def _case(branches: list, otherwise, index: pd.Index) -> pd.Series:
+    result = _broadcast(otherwise, index).astype("object")
+    decided = pd.Series(False, index=index)
+    for cond, value in branches:
+        # Null conditions count as false, and the first true branch wins:
+        take = _to_boolean(cond, index).fillna(False).astype(bool) & ~decided
+        result = result.where(~take, _broadcast(value, index).astype("object"))
+        decided |= take
+    return result.infer_objects()
+
+
+def _evaluate(expr: tuple, df: pd.DataFrame):
+    """Evaluate an expression AST against `df`, returning a Series (or a scalar, for constant expressions)"""
+    kind = expr[0]
+    index = df.index
+    if kind == "lit":
+        return expr[1]
+    if kind == "col":
+        if expr[1] not in df:
+            raise ValueError(f"Formula references unknown column '{expr[1]}'")
+        return df[expr[1]]
+    if kind == "binop":
+        op = expr[1]
+        left = _evaluate(expr[2], df)
+        right = _evaluate(expr[3], df)
+        if op == "and":
+            return _to_boolean(left, index) & _to_boolean(right, index)
+        if op == "or":
+            return _to_boolean(left, index) | _to_boolean(right, index)
+        if op == "||":
+            return _fn_concat([left, right], index)
+        comparisons = {
+            "==": operator.eq, "!=": operator.ne, "<>": operator.ne,
+            "<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge,
+        }
+        if op in comparisons:
+            return _compare(comparisons[op], left, right, index)
+        arithmetic = {
+            "+": operator.add, "-": operator.sub, "*": operator.mul, "/": operator.truediv, "%": operator.mod,
+        }
+        return _arith(arithmetic[op], left, right, index)
+    if kind == "not":
+        return ~_to_boolean(_evaluate(expr[1], df), index)
+    if kind == "neg":
+        return -pd.to_numeric(_broadcast(_evaluate(expr[1], df), index), errors="coerce")
+    if kind == "cast":
+        return cast_series(_broadcast(_evaluate(expr[1], df), index), expr[2])
+    if kind == "case":
+        return _case(
+            [(_evaluate(cond, df), _evaluate(value, df)) for cond, value in expr[1]],
+            _evaluate(expr[2], df),
+            index,
+        )
+    if kind == "index":
+        values = _broadcast(_evaluate(expr[1], df), index)
+        ix = int(_evaluate(expr[2], df))
+        return _as_text_if_text(values.str.get(ix))
+    if kind == "isnull":
+        result = _broadcast(_evaluate(expr[1], df), index).isna()
+        return (~result if expr[2] else result).astype("boolean")
+    if kind == "in":
+        values = _broadcast(_evaluate(expr[1], df), index)
+        options = [_evaluate(v, df) for v in expr[2]]
+        result = values.isin(options).astype("boolean").mask(values.isna())
+        return ~result if expr[3] else result
+    if kind == "like":
+        pattern = _evaluate(expr[2], df)
+        regex = "".join(
+            ".*" if ch == "%" else "." if ch == "_" else re.escape(ch) for ch in str(pattern)
+        )
+        values = _broadcast(_evaluate(expr[1], df), index).astype("string")
+        result = values.str.fullmatch(regex, flags=re.DOTALL).astype("boolean")
+        return ~result if expr[3] else result
+    if kind == "call":
+        if expr[1] not in SQL_FUNCTIONS:
+            raise NotImplementedError(f"Function '{expr[1]}' is not supported in local flow execution")
+        return SQL_FUNCTIONS[expr[1]]([_evaluate(arg, df) for arg in expr[2]], index)
+    if kind == "window":
+        return _evaluate_window(expr, df)
+    raise ValueError(f"Unknown expression node {kind}")
+
+
+WINDOW_FUNCTIONS = ("row_number", "rank", "dense_rank", "count", "sum", "avg", "min", "max")
+
+
+def _sorted_codes(values: pd.Series) -> Tuple[np.ndarray, pd.Series]:
+    """Order-preserving integer codes of `values` (-1 for null), and the sorted distinct values they index"""
+    codes, uniques = pd.factorize(values, sort=True)
+    return codes.astype(np.int64), pd.Series(uniques)
+
+
+def _segmented_cummax(values: np.ndarray, segment: np.ndarray) -> np.ndarray:
+    """Running max of non-negative integer `values` within each (contiguous, ascending) segment ID"""
+    span = int(values.max()) + 1 if len(values) else 1
+    return np.maximum.accumulate(values + segment * span) - segment * span
+
+
+def _segmented_cumsum(values: np.ndarray, segment: np.ndarray) -> np.ndarray:
+    """Running sum of `values` within each (contiguous) segment ID
+
+    Restarts from zero at each segment, rather than subtracting global running totals - which would lose
+    floating point precision in segments after large sums.
+    """
+    return pd.Series(values).groupby(segment, sort=False).cumsum().to_numpy()
+
+
+def _evaluate_window(expr: tuple, df: pd.DataFrame) -> pd.Series:
+    """Vectorized window function: One stable sort by partition & order keys, then segmented NumPy scans
+
+    Follows Spark SQL's semantics: Nulls sort first ascending and last descending, and with an ORDER BY the
+    aggregates (count, sum, avg, min, max) run over the default frame - from the partition start up to the
+    current row *and its peers* (ties). Without ORDER BY they cover the whole partition.
+    """
+    _, (_, fn, args), partition_by, order_by = expr
+    if fn not in WINDOW_FUNCTIONS:
+        raise NotImplementedError(f"Window function '{fn}' is not supported locally. Try: {WINDOW_FUNCTIONS}")
+    if fn in ("row_number", "rank", "dense_rank") and not order_by:
+        raise ValueError(f"Window function {fn}() requires an ORDER BY")
+    index = df.index
+    n = len(df)
+
+    # Integer codes for the partition (combining multiple keys) and each ordering key:
+    partition = np.zeros(n, dtype=np.int64)
+    for part_expr in partition_by:
+        codes, _ = pd.factorize(_broadcast(_evaluate(part_expr, df), index), use_na_sentinel=False)
+        partition = pd.factorize(partition * (codes.max() + 1 if n else 1) + codes)[0].astype(np.int64)
+    order_keys = []
+    for order_expr, ascending in order_by:
+        codes, uniques = _sorted_codes(_broadcast(_evaluate(order_expr, df), index))
+        order_keys.append(codes if ascending else np.where(codes < 0, len(uniques), len(uniques) - 1 - codes))
+
+    # np.lexsort is stable, and sorts by the last key first:
+    sort_ix = np.lexsort(order_keys[::-1] + [partition])
+    positions = np.arange(n)
+    new_segment = np.ones(n, dtype=bool)
+    new_segment[1:] = partition[sort_ix][1:] != partition[sort_ix][:-1]
+    new_peers = new_segment.copy()
+    for key in order_keys:
+        sorted_key = key[sort_ix]
+        new_peers[1:] |= sorted_key[1:] != sorted_key[:-1]
+    segment = np.cumsum(new_segment) - 1
+    segment_start = positions[new_segment][segment]
+
+    result_dtype = "Int64"
+    nulls = None
+    if fn == "row_number":
+        result = positions - segment_start + 1
+    elif fn == "rank":
+        peer_start = np.maximum.accumulate(np.where(new_peers, positions, 0))
+        result = peer_start - segment_start + 1
+    elif fn == "dense_rank":
+        n_peer_groups = np.cumsum(new_peers)
+        result = n_peer_groups - n_peer_groups[segment_start] + 1
+    else:
+        # Aggregates: Running values within the partition, read at the end of each row's frame
+        frame_start = new_peers if order_by else new_segment
+        frame_id = np.cumsum(frame_start) - 1
+        frame_end = np.append(positions[frame_start][1:] - 1, n - 1)[frame_id]
+        values = _broadcast(_evaluate(args[0], df), index) if args else pd.Series(1, index=index)
+        present = values.notna().to_numpy()[sort_ix]
+        counts = _segmented_cumsum(present.astype(np.int64), segment)[frame_end]
+        if fn in ("min", "max"):
+            codes, uniques = _sorted_codes(values)
+            codes = codes[sort_ix]
+            n_uniques = len(uniques)
+            # Codes shifted to >= 1 (best value highest) so that nulls (0) never win:
+            shifted = np.where(codes < 0, 0, codes + 1 if fn == "max" else n_uniques - codes)
+            best = _segmented_cummax(shifted, segment)[frame_end]
+            best_codes = np.where(best == 0, -1, best - 1 if fn == "max" else n_uniques - best)
+            inverse = np.empty(n, dtype=np.int64)
+            inverse[sort_ix] = positions
+            return uniques.reindex(best_codes[inverse]).set_axis(index)
+        if fn == "count":
+            result = counts
+        else:
+            numeric = pd.to_numeric(values, errors="coerce")
+            is_integer = pd.api.types.is_integer_dtype(numeric) or pd.api.types.is_bool_dtype(numeric)
+            if fn == "sum" and is_integer:
+                raw = numeric.astype("Int64").fillna(0).to_numpy(dtype=np.int64)[sort_ix]
+            else:
+                raw = numeric.astype("float64").fillna(0.0).to_numpy()[sort_ix]
+                result_dtype = "float64"
+            result = _segmented_cumsum(raw, segment)[frame_end]
+            if fn == "avg":
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    result = result / counts
+            nulls = counts == 0
+
+    unsorted = np.empty(n, dtype=result.dtype)
+    unsorted[sort_ix] = result
+    series = pd.Series(unsorted, index=index).astype(result_dtype)
+    if nulls is not None:
+        null_mask = np.empty(n, dtype=bool)
+        null_mask[sort_ix] = nulls
+        series = series.mask(null_mask)
+    return series
+
+
+def evaluate_expression(formula: Union[str, tuple], df: pd.DataFrame) -> pd.Series:
+    """Evaluate a Spark SQL expression (text or parsed AST) against `df`, returning a Series of len(df)"""
+    expr = parse_expression(formula) if isinstance(formula, str) else formula
+    return _broadcast(_evaluate(expr, df), df.index)
+
+
+#### Operators
+
+def _set_column(df: pd.DataFrame, column: str, values) -> pd.DataFrame:
+    """Set a column in place (keeping its position) or append it, without modifying `df`"""
+    df = df.copy(deep=False)
+    df[column] = values
+    return df
+
+
+@flow_operator("infer_and_cast_type")
+def _op_infer_and_cast_type(df: pd.DataFrame, parameters: dict, trained: dict) -> pd.DataFrame:
+    schema = _json_param(trained.get("schema")) or { col: _infer_spark_type(df[col]) for col in df.columns }
+    df = df.copy(deep=False)
+    for col, spark_type in schema.items():
+        if col in df:
+            df[col] = cast_series(df[col], spark_type)
+    return df
+
+
+def _fill_missing(values: pd.Series, fill_value: str) -> pd.Series:
+    """Fill nulls with a (text) fill value, converted to the column's type"""
+    if pd.api.types.is_numeric_dtype(values):
+        fill_value = pd.to_numeric(pd.Series([fill_value]), errors="coerce").iloc[0]
+        if pd.api.types.is_integer_dtype(values) and float(fill_value).is_integer():
+            fill_value = int(fill_value)
+    return values.fillna(fill_value)
+
+
+def _elementwise_transform(name: str, parameters: dict) -> Optional[Tuple[str, str, Callable]]:
+    """(input column, output column, fn) for a transform that maps each value of one column independently
+
+    Returns None for other transforms. Since fn(Series) -> Series only depends on each value, chains of these
+    can be fused into one pass, and run on a column's distinct values only (see _apply_elementwise()).
+    """
+    op = parameters.get("operator")
+    if name == "cast_single_data_type":
+        column = parameters["column"]
+        data_type = parameters["data_type"]
+        return column, parameters.get("output_column") or column, lambda s: cast_series(s, data_type)
+    if name == "search_and_edit" and op == "Extract using regex":
+        params = parameters["extract_using_regex_parameters"]
+        fn = lambda s: s.astype("string").str.extract(f"({params['pattern']})", expand=True)[0]
+    elif name == "search_and_edit" and op == "Split string by delimiter":
+        params = parameters["split_string_by_delimiter_parameters"]
+        limit = int(params.get("limit") or 0)
+        fn = lambda s: s.astype("string").str.split(
+            params["delimiter"], n=limit - 1 if limit > 0 else -1, regex=False
+        ).astype("object")
+    elif name == "search_and_edit" and op == "Find and replace substring":
+        params = parameters["find_and_replace_substring_parameters"]
+        fn = lambda s: s.astype("string").str.replace(
+            params["pattern"], params.get("replacement", ""), regex=True
+        )
+    elif name == "handle_missing" and op == "Fill missing":
+        params = parameters["fill_missing_parameters"]
+        fn = lambda s: _fill_missing(s, params["fill_value"])
+    else:
+        return None
+    return params["input_column"], params.get("output_column") or params["input_column"], fn
+
+
+def _apply_elementwise(values: pd.Series, fns: List[Callable[[pd.Series], pd.Series]]) -> pd.Series:
+    """Apply a chain of elementwise fns to a column (to each distinct value only, for text columns)"""
+    def chain(series: pd.Series) -> pd.Series:
+        for fn in fns:
+            series = fn(series)
+        return series
+
+    if values.dtype != object and pd.api.types.is_string_dtype(values):
+        return _on_uniques(values, chain)
+    return chain(values)
+
+
+def _run_elementwise(df: pd.DataFrame, name: str, parameters: dict) -> pd.DataFrame:
+    in_column, out_column, fn = _elementwise_transform(name, parameters)
+    return _set_column(df, out_column, _apply_elementwise(df[in_column], [fn]))
+
+
+@flow_operator("cast_single_data_type")
+def _op_cast_single_data_type(df: pd.DataFrame, parameters: dict, trained: dict) -> pd.DataFrame:
+    return _run_elementwise(df, "cast_single_data_type", parameters)
+
+
+@flow_operator("custom_formula")
+def _op_custom_formula(df: pd.DataFrame, parameters: dict, trained: dict) -> pd.DataFrame:
+    return _set_column(df, parameters["output_column"], evaluate_expression(parameters["formula"], df))
+
+
+def _as_list(value) -> List[str]:
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+
+@flow_operator("manage_columns")
+def _op_manage_columns(df: pd.DataFrame, parameters: dict, trained: dict) -> pd.DataFrame:
+    op = parameters["operator"]
+    if op == "Drop column":
+        return df.drop(columns=_as_list(parameters["drop_column_parameters"]["column_to_drop"]))
+    if op == "Duplicate column":
+        params = parameters["duplicate_column_parameters"]
+        return _set_column(df, params["new_name"], df[params["input_column"]].copy())
+    if op == "Rename column":
+        params = parameters["rename_column_parameters"]
+        return df.rename(columns={ params["input_column"]: params["new_name"] })
+    if op == "Move column":
+        params = parameters["move_column_parameters"]
+        move_type = params["move_type"]
+        type_params = params.get(
+            {
+                "Move to start": "move_to_start_parameters",
+                "Move to end": "move_to_end_parameters",
+                "Move to index": "move_to_index_parameters",
+                "Move after": "move_after_parameters",
+                "Move before": "move_before_parameters",
+            }.get(move_type, ""),
+            {},
+        )
+        column = type_params["column_to_move"]
+        others = [c for c in df.columns if c != column]
+        if move_type == "Move to start":
+            ix = 0
+        elif move_type == "Move to end":
+            ix = len(others)
+        elif move_type == "Move to index":
+            ix = int(type_params["index"])
+        elif move_type in ("Move after", "Move before"):
+            ix = others.index(type_params["target_column"]) + (move_type == "Move after")
+        else:
+            raise NotImplementedError(f"manage_columns move type '{move_type}' is not supported locally")
+        return df[others[:ix] + [column] + others[ix:]]
+    raise NotImplementedError(f"manage_columns operator '{op}' is not supported locally")
+
+
+@flow_operator("search_and_edit")
+def _op_search_and_edit(df: pd.DataFrame, parameters: dict, trained: dict) -> pd.DataFrame:
+    if _elementwise_transform("search_and_edit", parameters) is None:
+        op = parameters["operator"]
+        raise NotImplementedError(f"search_and_edit operator '{op}' is not supported locally")
+    return _run_elementwise(df, "search_and_edit", parameters)
+
+
+@flow_operator("handle_missing")
+def _op_handle_missing(df: pd.DataFrame, parameters: dict, trained: dict) -> pd.DataFrame:
+    op = parameters["operator"]
+    if op == "Fill missing":
+        return _run_elementwise(df, "handle_missing", parameters)
+    if op == "Impute":
+        params = parameters["impute_parameters"]
+        column = params["input_column"]
+        values = df[column]
+        if params.get("column_type") == "Numeric":
+            strategy = params.get("numeric_parameters", {}).get("strategy", "Approximate Median")
+            numeric = pd.to_numeric(values, errors="coerce")
+            fill_value = numeric.mean() if strategy == "Mean" else numeric.median()
+            if pd.api.types.is_integer_dtype(values):
+                values = values.astype("float64")
+        else:
+            fill_value = values.mode(dropna=True).iloc[0]
+        return _set_column(df, params.get("output_column") or column, values.fillna(fill_value))
+    if op == "Drop missing":
+        params = parameters.get("drop_missing_parameters", {})
+        column = params.get("input_column")
+        return df.dropna(subset=_as_list(column) if column else None).reset_index(drop=True)
+    raise NotImplementedError(f"handle_missing operator '{op}' is not supported locally")
+
+
+@flow_operator("manage_vectors")
+def _op_manage_vectors(df: pd.DataFrame, parameters: dict, trained: dict) -> pd.DataFrame:
+    op = parameters["operator"]
+    if op != "Flatten":
+        raise NotImplementedError(f"manage_vectors operator '{op}' is not supported locally")
+    params = parameters["flatten_parameters"]
+    column = params["input_column"]
+    values = df[column]
+    length = trained.get("flatten_parameters", {}).get("vector_length")
+    if length is None:
+        lengths = values.dropna().map(len)
+        length = int(lengths.iloc[0] if params.get("vector_length") == "First vector" else lengths.max())
+    prefix = params.get("output_prefix") or column
+    df = df.copy(deep=False)
+    for ix in range(int(length)):
+        df[f"{prefix}_{ix}"] = _as_text_if_text(values.str.get(ix))
+    return df
+
+
+def _string_indexer_labels(values: pd.Series, trained_model: Optional[str]) -> List[str]:
+    """Category labels in index order: From a trained Spark StringIndexer, or by frequency (then value)"""
+    if trained_model:
+        return list(_spark_model_rows(trained_model)[0]["labelsArray"][0])
+    counts = values.dropna().astype("string").value_counts()
+    return sorted(counts.index.tolist(), key=lambda label: (-counts[label], label))
+
+
+def _category_codes(values: pd.Series, labels: List[str]) -> np.ndarray:
+    """Integer code of each value in `labels` (-1 for null or unseen values), vectorized"""
+    return pd.Categorical(values.astype("string"), categories=labels).codes.astype(np.int64)
+
+
+def _one_hot_slot_names(labels: List[str], params: dict) -> List[str]:
+    """One-hot output slots: Like Spark's OneHotEncoder, "Keep" adds a slot for invalid values, and drop_last
+    drops the final slot (so that all-zeros represents it)"""
+    slots = list(labels) + (["invalid"] if params.get("invalid_handling_strategy", "Error") == "Keep" else [])
+    return slots[:-1] if params.get("drop_last", True) else slots
+
+
+def _encode_categorical_codes(
+    df: pd.DataFrame,
+    parameters: dict,
+    trained: dict,
+) -> Tuple[pd.DataFrame, dict, List[str], np.ndarray, np.ndarray]:
+    """Shared encode_categorical setup: (df, params, labels, codes, invalid), with any skipped rows removed"""
+    op = parameters["operator"]
+    if op == "One-hot encode":
+        params = parameters["one_hot_encode_parameters"]
+        trained_params = trained.get("one_hot_encode_parameters") or {}
+    elif op == "Ordinal encode":
+        params = parameters["ordinal_encode_parameters"]
+        trained_params = trained.get("ordinal_encode_parameters") or {}
+    else:
+        raise NotImplementedError(f"encode_categorical operator '{op}' is not supported locally")
+    column = params["input_column"]
+    labels = _string_indexer_labels(df[column], trained_params.get("string_indexer_model"))
+    codes = _category_codes(df[column], labels)
+    invalid = codes < 0
+    strategy = params.get("invalid_handling_strategy", "Error")
+    if invalid.any():
+        if strategy == "Error":
+            raise ValueError(f"Column {column} has {invalid.sum()} null/unseen categories")
+        if strategy == "Skip":
+            df = df[~invalid].reset_index(drop=True)
+            codes = codes[~invalid]
+            invalid = invalid[~invalid]
+    return df, params, labels, codes, invalid
+
+
+def _one_hot_matrix(
+    codes: np.ndarray,
+    invalid: np.ndarray,
+    labels: List[str],
+    params: dict,
+) -> Tuple[scipy.sparse.csr_matrix, List[str]]:
+    """Sparse (n_rows, n_slots) one-hot matrix and its slot names, built directly from category codes"""
+    slot_names = _one_hot_slot_names(labels, params)
+    strategy = params.get("invalid_handling_strategy", "Error")
+    if strategy == "Keep":
+        codes = np.where(invalid, len(labels), codes)
+    valid = (codes >= 0) & (codes < len(slot_names))
+    rows = np.flatnonzero(valid)
+    cols = codes[valid]
+    data = np.ones(len(rows), dtype=np.float64)
+    if strategy not in ("Keep", "Skip", "Error") and invalid.any():
+        # e.g. "Replace with NaN": Every slot of invalid rows is NaN
+        nan_rows = np.flatnonzero(invalid)
+        rows = np.concatenate([rows, np.repeat(nan_rows, len(slot_names))])
+        cols = np.concatenate([cols, np.tile(np.arange(len(slot_names)), len(nan_rows))])
+        data = np.concatenate([data, np.full(len(nan_rows) * len(slot_names), np.nan)])
+    matrix = scipy.sparse.csr_matrix((data, (rows, cols)), shape=(len(codes), len(slot_names)))
+    return matrix, slot_names
+
+
+def _set_sparse_columns(
+    df: pd.DataFrame,
+    output_column: str,
+    names: List[str],
+    matrix: scipy.sparse.spmatrix,
+) -> pd.DataFrame:
+    """Add the columns of a sparse matrix to `df` as Pandas sparse columns `{output_column}_{name}`"""
+    # (Column by column, because DataFrame.sparse.from_spmatrix() fills with NaN rather than 0 in Pandas 3)
+    matrix = matrix.tocsc()
+    encoded = pd.DataFrame(
+        {
+            f"{output_column}_{name}": pd.arrays.SparseArray.from_spmatrix(matrix[:, [ix]])
+            for ix, name in enumerate(names)
+        },
+        index=df.index,
+    )
+    return pd.concat([df.drop(columns=[output_column], errors="ignore"), encoded], axis=1)
+
+
+@flow_operator("encode_categorical")
+def _op_encode_categorical(df: pd.DataFrame, parameters: dict, trained: dict) -> pd.DataFrame:
+    df, params, labels, codes, invalid = _encode_categorical_codes(df, parameters, trained)
+    column = params["input_column"]
+    output_column = params.get("output_column") or column
+    if parameters["operator"] == "Ordinal encode":
+        result = codes.astype("float64")
+        if params.get("invalid_handling_strategy", "Error") == "Keep":
+            result[invalid] = len(labels)
+        else:
+            result[invalid] = np.nan
+        return _set_column(df, output_column, result)
+
+    matrix, slot_names = _one_hot_matrix(codes, invalid, labels, params)
+    onehot = matrix.toarray()
+    df = df.drop(columns=[column])
+    if params.get("output_style", "Vector") == "Columns":
+        encoded = pd.DataFrame(onehot, columns=[f"{output_column}_{s}" for s in slot_names], index=df.index)
+        return pd.concat([df, encoded], axis=1)
+    return _set_column(df, output_column, list(onehot))
+
+
+@flow_operator("encode_categorical", sparse=True)
+def _op_encode_categorical_sparse(df: pd.DataFrame, parameters: dict, trained: dict) -> pd.DataFrame:
+    params = parameters.get("one_hot_encode_parameters") or {}
+    if parameters["operator"] != "One-hot encode" or params.get("output_style", "Vector") != "Columns":
+        return _op_encode_categorical(df, parameters, trained)
+    df, params, labels, codes, invalid = _encode_categorical_codes(df, parameters, trained)
+    column = params["input_column"]
+    matrix, slot_names = _one_hot_matrix(codes, invalid, labels, params)
+    return _set_sparse_columns(
+        df.drop(columns=[column]), params.get("output_column") or column, slot_names, matrix
+    )
+
+
+def _tokenize_text(values: pd.Series, params: dict) -> pd.Series:
+    """Tokenize a text column per a featurize_text tokenizer config, returning a Series of token lists"""
+    tokenizer = params.get("tokenizer", "Standard")
+    text = values.astype("string")
+    if tokenizer == "Custom":
+        custom = params.get("tokenizer_custom_parameters", {})
+        if custom.get("lowercase_before_tokenization", True):
+            text = text.str.lower()
+        pattern = custom.get("pattern", r"\s+")
+        min_length = int(custom.get("minimum_token_length", 1))
+        if custom.get("gaps", True):
+            tokens = text.str.split(pattern, regex=True)
+        else:
+            tokens = text.str.findall(pattern)
+        return tokens.map(
+            lambda toks: [t for t in toks if len(t) >= min_length] if isinstance(toks, list) else [],
+        )
+    # Standard tokenizer: Lowercase and split on whitespace
+    return text.str.lower().str.split().map(lambda toks: toks if isinstance(toks, list) else [])
+
+
+def _count_vectorizer_vocabulary(
+    tokens: pd.Series,
+    weights: np.ndarray,
+    params: dict,
+    trained_model: Optional[str],
+) -> List[str]:
+    """CountVectorizer vocabulary: From the trained Spark model, or fitted like Spark's
+
+    :param tokens: Token lists of each distinct document
+    :param weights: Number of occurrences of each distinct document in the data
+    """
+    if trained_model:
+        return list(_spark_model_rows(trained_model)[0]["vocabulary"])
+    exploded = tokens.explode().dropna()
+    pairs = pd.DataFrame({ "doc": exploded.index.to_numpy(), "term": exploded.to_numpy() })
+    pairs["weight"] = weights[pairs["doc"].to_numpy()]
+    term_freq = pairs.groupby("term")["weight"].sum()
+    doc_freq = pairs.drop_duplicates(["doc", "term"]).groupby("term")["weight"].sum()
+    n_docs = weights.sum()
+    min_df = float(params.get("minimum_document_frequency", 1))
+    max_df = float(params.get("maximum_document_frequency", 1.0))
+    min_df = min_df * n_docs if min_df < 1 else min_df
+    max_df = max_df * n_docs if max_df <= 1 else max_df
+    terms = doc_freq[(doc_freq >= min_df) & (doc_freq <= max_df)].index
+    terms = sorted(terms, key=lambda term: (-term_freq[term], term))
+    return terms[:int(params.get("maximum_vocabulary_size", 262144))]
+
+
+def _term_counts(tokens: pd.Series, vocabulary: List[str], params: dict) -> scipy.sparse.csr_matrix:
+    """Sparse (n_docs + 1, n_terms) term count matrix, with a final empty row (for null documents)"""
+    exploded = tokens.explode().dropna()
+    term_ix = pd.Categorical(exploded.astype("string"), categories=vocabulary).codes
+    known = term_ix >= 0
+    # Duplicate (doc, term) entries are summed into counts:
+    counts = scipy.sparse.csr_matrix(
+        (np.ones(known.sum()), (exploded.index.to_numpy()[known], term_ix[known])),
+        shape=(len(tokens) + 1, len(vocabulary)),
+    )
+    min_tf = float(params.get("minimum_term_frequency", 1))
+    if min_tf > 1 or (0 < min_tf < 1):
+        # Spark minTF: Per-document threshold, as a count (>= 1) or fraction of the document's tokens
+        doc_lengths = np.append(tokens.map(len).to_numpy(), 0)
+        threshold = min_tf if min_tf >= 1 else min_tf * np.repeat(doc_lengths, np.diff(counts.indptr))
+        counts.data[counts.data < threshold] = 0.0
+        counts.eliminate_zeros()
+    if params.get("binarize_count"):
+        counts.data[:] = 1.0
+    return counts
+
+
+def _vectorize_text(
+    df: pd.DataFrame,
+    parameters: dict,
+    trained: dict,
+) -> Tuple[scipy.sparse.csr_matrix, List[str], dict]:
+    """Shared featurize_text count vectorization: (sparse row x term matrix, vocabulary, params)"""
+    op = parameters["operator"]
+    if op != "Vectorize":
+        raise NotImplementedError(f"featurize_text operator '{op}' is not supported locally")
+    params = parameters["vectorize_parameters"]
+    if params.get("vectorizer", "Count Vectorizer") != "Count Vectorizer":
+        raise NotImplementedError(f"Vectorizer '{params['vectorizer']}' is not supported locally")
+    vectorizer_params = params.get("vectorizer_count_vectorizer_parameters", {})
+    column = params["input_column"]
+
+    # Tokenize and count each distinct text just once, then look the rows up by their codes (null picks the
+    # final empty row):
+    codes, uniques = pd.factorize(df[column].astype("string"))
+    tokens = _tokenize_text(pd.Series(uniques, dtype="string"), params)
+    weights = np.bincount(codes[codes >= 0], minlength=len(uniques))
+    trained_params = trained.get("vectorize_parameters") or {}
+    vocabulary = _count_vectorizer_vocabulary(
+        tokens, weights, vectorizer_params, trained_params.get("vectorizer_model")
+    )
+    counts = _term_counts(tokens, vocabulary, vectorizer_params)[np.where(codes < 0, len(uniques), codes)]
+    if params.get("apply_idf") == "Yes":
+        doc_freq = np.bincount(counts.indices, minlength=len(vocabulary))
+        counts.data *= np.log((counts.shape[0] + 1) / (doc_freq + 1))[counts.indices]
+        counts.eliminate_zeros()
+    return counts, vocabulary, params
+
+
+@flow_operator("featurize_text")
+def _op_featurize_text(df: pd.DataFrame, parameters: dict, trained: dict) -> pd.DataFrame:
+    counts, vocabulary, params = _vectorize_text(df, parameters, trained)
+    counts = counts.toarray()
+    output_column = params.get("output_column") or params["input_column"]
+    if params.get("output_format", "Vector") == "Columns":
+        encoded = pd.DataFrame(counts, columns=[f"{output_column}_{t}" for t in vocabulary], index=df.index)
+        return pd.concat([df.drop(columns=[output_column], errors="ignore"), encoded], axis=1)
+    return _set_column(df, output_column, list(counts))
+
+
+@flow_operator("featurize_text", sparse=True)
+def _op_featurize_text_sparse(df: pd.DataFrame, parameters: dict, trained: dict) -> pd.DataFrame:
+    if (parameters.get("vectorize_parameters") or {}).get("output_format", "Vector") != "Columns":
+        return _op_featurize_text(df, parameters, trained)
+    counts, vocabulary, params = _vectorize_text(df, parameters, trained)
+    return _set_sparse_columns(df, params.get("output_column") or params["input_column"], vocabulary, counts)
+
+
+#### Logical plans
+
+NodeEffect = namedtuple("NodeEffect", ["reads", "writes", "drops", "filters_rows"])
+
+
+def node_effect(node: FlowNode) -> NodeEffect:
+    """Columns a transform node reads, writes (creates or overwrites) and drops, and if it can remove rows
+
+    `reads` or `writes` of None mean unknown (potentially any column), which plan optimizations treat
+    conservatively. Generated columns (e.g. one-hot encodings) are only known from trained parameters.
+    """
+    name = _operator_name(node.operator)
+    params = node.parameters
+    op = params.get("operator")
+    trained = node.trained_parameters
+    elementwise = _elementwise_transform(name, params)
+    if elementwise:
+        return NodeEffect([elementwise[0]], [elementwise[1]], [], False)
+    if name == "infer_and_cast_type":
+        schema = _json_param(trained.get("schema"))
+        if not schema:
+            return NodeEffect(None, None, [], False)
+        return NodeEffect(list(schema), list(schema), [], False)
+    if name == "custom_formula":
+        reads = expression_columns(parse_expression(params["formula"]))
+        return NodeEffect(reads, [params["output_column"]], [], False)
+    if name == "manage_columns":
+        if op == "Drop column":
+            return NodeEffect([], [], _as_list(params["drop_column_parameters"]["column_to_drop"]), False)
+        if op == "Duplicate column":
+            op_params = params["duplicate_column_parameters"]
+            return NodeEffect([op_params["input_column"]], [op_params["new_name"]], [], False)
+        if op == "Rename column":
+            op_params = params["rename_column_parameters"]
+            column = op_params["input_column"]
+            return NodeEffect([column], [op_params["new_name"]], [column], False)
+        if op == "Move column":
+            if params["move_column_parameters"].get("move_type") == "Move to index":
+                # The result depends on every other column's position, so no drop can move across it:
+                return NodeEffect(None, [], [], False)
+            move_params = next(
+                v for v in params["move_column_parameters"].values()
+                if isinstance(v, dict) and v.get("column_to_move")
+            )
+            reads = [move_params["column_to_move"]] + _as_list(move_params.get("target_column") or [])
+            return NodeEffect(reads, [], [], False)
+    if name == "handle_missing":
+        if op == "Impute":
+            op_params = params["impute_parameters"]
+            column = op_params["input_column"]
+            return NodeEffect([column], [op_params.get("output_column") or column], [], False)
+        if op == "Drop missing":
+            column = params.get("drop_missing_parameters", {}).get("input_column")
+            return NodeEffect(_as_list(column) if column else None, [], [], True)
+    if name == "manage_vectors" and op == "Flatten":
+        op_params = params["flatten_parameters"]
+        length = trained.get("flatten_parameters", {}).get("vector_length")
+        prefix = op_params.get("output_prefix") or op_params["input_column"]
+        writes = None if length is None else [f"{prefix}_{ix}" for ix in range(int(length))]
+        return NodeEffect([op_params["input_column"]], writes, [], False)
+    if name == "encode_categorical" and op in ("One-hot encode", "Ordinal encode"):
+        key = "one_hot_encode_parameters" if op == "One-hot encode" else "ordinal_encode_parameters"
+        op_params = params[key]
+        column = op_params["input_column"]
+        output = op_params.get("output_column") or column
+        filters = op_params.get("invalid_handling_strategy", "Error") == "Skip"
+        if op == "Ordinal encode":
+            # (Writes the codes alongside the input column, which is kept)
+            return NodeEffect([column], [output], [], filters)
+        if op_params.get("output_style", "Vector") != "Columns":
+            return NodeEffect([column], [output], [column] if output != column else [], filters)
+        model = (trained.get(key) or {}).get("string_indexer_model")
+        writes = None
+        if model:
+            labels = _string_indexer_labels(pd.Series(dtype="string"), model)
+            writes = [f"{output}_{slot}" for slot in _one_hot_slot_names(labels, op_params)]
+        return NodeEffect([column], writes, [column], filters)
+    if name == "featurize_text" and op == "Vectorize":
+        op_params = params["vectorize_parameters"]
+        column = op_params["input_column"]
+        output = op_params.get("output_column") or column
+        if op_params.get("output_format", "Vector") != "Columns":
+            return NodeEffect([column], [output], [], False)
+        model = (trained.get("vectorize_parameters") or {}).get("vectorizer_model")
+        writes = [f"{output}_{t}" for t in _spark_model_rows(model)[0]["vocabulary"]] if model else None
+        return NodeEffect([column], writes, [output] if output == column else [], False)
+    # Anything else could touch any column or row:
+    return NodeEffect(None, None, [], True)
+
+
+class PlanStep:
+    """One step of a FlowPlan: A source read, a transform node, a fused chain of elementwise transforms, or a
+    column drop"""
+
+    def __init__(self, kind: str, nodes: List[FlowNode], effect: NodeEffect, transforms: Optional[list]=None):
+        self.kind = kind  # "source", "node", "fused" or "drop"
+        self.nodes = nodes
+        self.effect = effect
+        # (input column, output column, fn) of each elementwise transform, if the step is one/a chain of them:
+        self.transforms = transforms
+        # Columns to drop (where present) right after this step:
+        self.drops_after = []
+        # Whether to use the node's sparse-output operator variant (if any):
+        self.sparse = False
+
+    def label(self) -> str:
+        if self.kind == "fused":
+            ops = " -> ".join(n.parameters.get("operator") or _operator_name(n.operator) for n in self.nodes)
+            return f"fused({self.transforms[0][0]}: {ops})"
+        if self.kind == "drop" and len(self.nodes) > 1:
+            return f"manage_columns[Drop column]({', '.join(self.effect.drops)})"
+        return node_label(self.nodes[0])
+
+    def column_scans(self, n_columns: int) -> int:
+        """Number of columns whose values this step reads (`n_columns` if unknown)"""
+        if self.kind == "drop" or (
+            _operator_name(self.nodes[0].operator) == "manage_columns"
+            and self.nodes[0].parameters.get("operator") != "Duplicate column"
+        ):
+            # Column management only touches names/order, not values
+            return 0
+        return n_columns if self.effect.reads is None else len(self.effect.reads)
+
+    def source_for(self, sources: dict) -> Union[None, str, pd.DataFrame]:
+        """The override for this (source) step in `sources`, if any"""
+        node = self.nodes[0]
+        name = node.parameters.get("dataset_definition", {}).get("name")
+        return sources.get(node.node_id, sources.get(name))
+
+    def signature(self) -> str:
+        """Text identifying what this step computes from its input (not including node IDs)"""
+        return json.dumps(
+            {
+                "kind": self.kind,
+                "nodes": [
+                    { "operator": n.operator, "parameters": n.parameters, "trained": n.trained_parameters }
+                    for n in self.nodes
+                ],
+                "drops": self.effect.drops if self.kind == "drop" else [],
+                "drops_after": self.drops_after,
+                "sparse": self.sparse and _operator_name(self.nodes[0].operator) in SPARSE_OPERATORS,
+            },
+            sort_keys=True,
+            default=str,
+        )
+
+    def run(self, df: Optional[pd.DataFrame], sources: dict) -> pd.DataFrame:
+        if self.kind == "source":
+            df = _read_source(self.nodes[0], self.source_for(sources), skip_columns=self.drops_after)
+        elif self.kind == "fused":
+            in_column = self.transforms[0][0]
+            out_column = self.transforms[-1][1]
+            values = _apply_elementwise(df[in_column], [t[2] for t in self.transforms])
+            df = _set_column(df, out_column, values)
+        elif self.kind == "drop":
+            df = df.drop(columns=self.effect.drops, errors="ignore")
+        else:
+            df = run_node(self.nodes[0], df, sparse=self.sparse)
+        if self.drops_after:
+            df = df.drop(columns=self.drops_after, errors="ignore")
+        return df
+
+
+def _initial_steps(lineage: List[FlowNode]) -> List[PlanStep]:
+    """One PlanStep per node of a linear, single-source flow lineage (from flow_lineage())"""
+    lineage = [n for n in lineage if n.type in ("SOURCE", "TRANSFORM")]
+    if lineage[0].type != "SOURCE" or any(n.type == "SOURCE" or len(n.input_ids) != 1 for n in lineage[1:]):
+        raise NotImplementedError("Only linear flows with a single data source can be run locally")
+    steps = [PlanStep("source", lineage[:1], NodeEffect([], None, [], False))]
+    for node in lineage[1:]:
+        name = _operator_name(node.operator)
+        transform = _elementwise_transform(name, node.parameters)
+        is_drop = name == "manage_columns" and node.parameters.get("operator") == "Drop column"
+        steps.append(PlanStep(
+            "drop" if is_drop else "node",
+            [node],
+            node_effect(node),
+            transforms=[transform] if transform else None,
+        ))
+    return steps
+
+
+def _fuse_steps(steps: List[PlanStep], notes: List[str]) -> List[PlanStep]:
+    """Fuse chains of elementwise transforms on the same column, and consecutive column drops"""
+    fused = []
+    for step in steps:
+        prev = fused[-1] if fused else None
+        if (
+            step.transforms and prev is not None and prev.transforms
+            and step.transforms[0][0] == step.transforms[0][1] == prev.transforms[-1][1]
+        ):
+            prev.kind = "fused"
+            prev.nodes = prev.nodes + step.nodes
+            prev.transforms = prev.transforms + step.transforms
+        elif step.kind == "drop" and prev is not None and prev.kind == "drop":
+            prev.nodes = prev.nodes + step.nodes
+            prev.effect = prev.effect._replace(drops=prev.effect.drops + step.effect.drops)
+        else:
+            fused.append(step)
+    for step in fused:
+        if step.kind == "fused":
+            notes.append(f"Fused {len(step.nodes)} nodes into one pass: {step.label()}")
+    return fused
+
+
+def _eliminate_dead_steps(steps: List[PlanStep], notes: List[str]) -> List[PlanStep]:
+    """Remove steps whose outputs are all dropped (or overwritten) before anything reads them
+
+    Walks the plan backwards, tracking the columns whose current values are never read downstream.
+    Multi-output steps with only some unused outputs keep running, but drop those outputs straight away.
+    """
+    unused = set()
+    kept = []
+    for step in reversed(steps):
+        reads, writes, drops, filters_rows = step.effect
+        unused |= set(drops) | set(step.drops_after)
+        if step.kind != "source" and writes and not filters_rows and set(writes) <= unused:
+            notes.append(f"Removed {step.label()}: Output {', '.join(writes)} is never used")
+            continue
+        if writes:
+            dead_writes = [c for c in writes if c in unused and c not in step.drops_after]
+            if dead_writes and step.kind != "source":
+                step.drops_after = step.drops_after + dead_writes
+                notes.append(f"Drop unused outputs of {step.label()} immediately: {', '.join(dead_writes)}")
+            unused |= set(writes)
+        if reads is None:
+            unused = set()
+        else:
+            unused -= set(reads)
+        kept.append(step)
+    return kept[::-1]
+
+
+def _hoist_drops(steps: List[PlanStep], notes: List[str]) -> List[PlanStep]:
+    """Drop columns straight after their last use, instead of in a separate pass later on
+
+    Columns never used at all are skipped when reading the source.
+    """
+    for ix, step in enumerate(steps):
+        if step.kind != "drop":
+            continue
+        for column in step.effect.drops:
+            anchor = next(
+                i for i in range(ix - 1, -1, -1)
+                if steps[i].kind == "source"
+                or steps[i].effect.reads is None or column in steps[i].effect.reads
+                or steps[i].effect.writes is None or column in steps[i].effect.writes
+            )
+            if column in steps[anchor].drops_after:
+                continue
+            steps[anchor].drops_after = steps[anchor].drops_after + [column]
+            if steps[anchor].kind == "source":
+                notes.append(f"Skip reading column {column} from the source (never used)")
+            elif anchor < ix - 1:
+                notes.append(f"Drop {column} early, after {steps[anchor].label()}")
+        step.effect = step.effect._replace(drops=[])
+    return [step for step in steps if step.kind != "drop" or step.effect.drops]
+
+
+class FlowPlan:
+    """An executable (optionally optimized) plan of steps for running a linear flow locally"""
+
+    def __init__(self, steps: List[PlanStep], baseline: List[PlanStep], notes: List[str]):
+        self.steps = steps
+        self.notes = notes
+        # Column count to assume for steps that read unknown columns, from the flow's inferred schema if any:
+        schema_steps = [s for s in baseline if _operator_name(s.nodes[0].operator) == "infer_and_cast_type"]
+        self.n_source_columns = len(schema_steps[0].effect.reads or []) if schema_steps else 0
+        self.baseline_cost = self._cost(baseline)
+        self.cost = self._cost(steps)
+
+    def _cost(self, steps: List[PlanStep]) -> Tuple[int, int]:
+        """(DataFrame passes, column scans) estimate for a list of steps"""
+        n_columns = self.n_source_columns or 1
+        passes = sum(1 for s in steps if s.kind != "source")
+        scans = sum(s.column_scans(n_columns) for s in steps if s.kind != "source")
+        return passes, scans
+
+    def explain(self) -> str:
+        """Human-readable summary of the plan's steps and optimizations"""
+        lines = [f"Flow plan ({len(self.steps)} steps):"]
+        for ix, step in enumerate(self.steps):
+            lines.append(f"  {ix:>3}. {step.label()}")
+            if step.drops_after:
+                lines.append(f"       then drop {', '.join(step.drops_after)}")
+        if self.notes:
+            lines.append("Optimizations:")
+            lines += [f"  - {note}" for note in self.notes]
+        lines.append(
+            "Estimated cost: {} DataFrame passes (was {}), {} column scans (was {}): {} scans saved".format(
+                self.cost[0], self.baseline_cost[0], self.cost[1], self.baseline_cost[1],
+                self.baseline_cost[1] - self.cost[1],
+            )
+        )
+        return "\n".join(lines)
+
+    def step_keys(self, sources: Optional[Dict[str, Union[str, pd.DataFrame]]]=None) -> List[str]:
+        """Cache key of each step's output: A hash of the source data's fingerprint and every step so far
+
+        Editing a node changes the keys of its step and all later steps, but none before it.
+        """
+        sources = sources or {}
+        keys = []
+        key = ""
+        for step in self.steps:
+            content = step.signature()
+            if step.kind == "source":
+                source = step.source_for(sources)
+                if source is None:
+                    source = step.nodes[0].parameters["dataset_definition"]["s3ExecutionContext"]["s3Uri"]
+                content += _source_fingerprint(source)
+            key = hashlib.blake2b(f"{key}\0{content}".encode("utf-8"), digest_size=16).hexdigest()
+            keys.append(key)
+        return keys
+
+    def execute(
+        self,
+        sources: Optional[Dict[str, Union[str, pd.DataFrame]]]=None,
+        verbose: bool=True,
+        cache: Optional["FlowResultCache"]=None,
+    ) -> pd.DataFrame:
+        """Run the plan, returning the output DataFrame (see execute_flow() for parameters)"""
+        sources = sources or {}
+        df = None
+        t_start = time.perf_counter()
+        start = 0
+        if cache is not None:
+            # Resume from the latest step with a cached result (if any):
+            keys = self.step_keys(sources)
+            statuses = ["computed"] * len(self.steps)
+            for ix in range(len(self.steps) - 1, -1, -1):
+                df = cache.get(keys[ix])
+                if df is not None:
+                    start = ix + 1
+                    statuses[:ix] = ["skipped"] * ix
+                    statuses[ix] = "hit"
+                    if verbose:
+                        label = self.steps[ix].label()
+                        print(f"{label}: Using cached {df.shape[0]} rows x {df.shape[1]} cols")
+                    break
+            cache.record(self.steps, statuses)
+        for ix in range(start, len(self.steps)):
+            step = self.steps[ix]
+            t0 = time.perf_counter()
+            df = step.run(df, sources)
+            if cache is not None:
+                cache.put(keys[ix], df)
+            if verbose:
+                secs = time.perf_counter() - t0
+                print(f"{step.label()}: {df.shape[0]} rows x {df.shape[1]} cols in {secs:.3f}s")
+        if verbose:
+            print(f"Flow executed in {time.perf_counter() - t_start:.2f}s")
+        # Don't let callers modify cached results in place:
+        return df.copy() if cache is not None else df
+
+
+def compile_flow(
+    flow: Union[str, dict],
+    output_node: Optional[str]=None,
+    optimize: bool=True,
+    verbose: bool=False,
+    sparse: bool=False,
+) -> FlowPlan:
+    """Compile a (linear, single-source) flow into a FlowPlan for local execution
+
+    With `optimize`, the plan:
+
+    - Fuses chains of elementwise transforms on one column (e.g. extract regex -> cast -> fill missing) into a
+      single pass, run over the column's distinct values only
+    - Removes transforms whose outputs are dropped before anything reads them
+    - Drops each column right after its last use (instead of in separate passes later), and skips reading
+      source columns that are never used
+
+    :param flow: Path or s3:// URI of a .flow file (or a loaded flow dict)
+    :param output_node: ID of the node to compute (default: the flow's single final transform)
+    :param optimize: Set False for a plain one-step-per-node plan
+    :param verbose: Print the plan (see FlowPlan.explain())
+    :param sparse: Produce sparse one-hot and count vectorizer outputs (see execute_flow())
+    """
+    lineage = flow_lineage(flow, output_node)
+    baseline = _initial_steps(lineage)
+    notes = []
+    if optimize:
+        steps = _fuse_steps(_initial_steps(lineage), notes)
+        steps = _eliminate_dead_steps(steps, notes)
+        steps = _hoist_drops(steps, notes)
+    else:
+        steps = baseline
+    for step in steps:
+        step.sparse = sparse
+    plan = FlowPlan(steps, baseline, notes)
+    if verbose:
+        print(plan.explain())
+    return plan
+
+
+#### Result caching
+
+def _source_fingerprint(source: Union[str, pd.DataFrame]) -> str:
+    """Fingerprint of a flow's input data: By content for DataFrames, or from S3 listings/file stats"""
+    if isinstance(source, pd.DataFrame):
+        return dataframe_fingerprint(source)
+    if source.lower().startswith("s3://"):
+        return s3_prefix_fingerprint(source)
+    stat = os.stat(source)
+    return f"{os.path.abspath(source)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class FlowResultCache:
+    """In-memory LRU cache of flow step outputs, for incremental local re-execution
+
+    Pass the same cache to successive execute_flow() calls, and each run only re-computes from the first step
+    whose parameters (or upstream data) changed since a cached run - see FlowPlan.step_keys().
+
+    >>> cache = util.flow.FlowResultCache(max_bytes=2 * 1024**3)
+    >>> df = util.flow.execute_flow("credit-prebuilt.flow", sources=sources, cache=cache)
+    >>> # ...Edit a transform near the end of the flow, then:
+    >>> df = util.flow.execute_flow("credit-prebuilt.flow", sources=sources, cache=cache)
+    >>> cache.report()
+
+    Sizes are measured per entry, so columns shared between successive steps' outputs count towards
+    `max_bytes` more than once: The cap is conservative.
+    """
+
+    def __init__(self, max_bytes: int=2 * 1024**3):
+        """Create an (empty) cache
+
+        :param max_bytes: Maximum total size of cached DataFrames, beyond which the least recently used are
+            evicted
+        """
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (DataFrame, size in bytes)
+        self._node_stats = OrderedDict()  # step label -> { node_ids, hits, misses, skipped, last_run }
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        """Cached result for a step key, or None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key: str, df: pd.DataFrame) -> bool:
+        """Cache a step result, evicting the least recently used entries if needed (False if it can't fit)"""
+        n_bytes = int(df.memory_usage(index=True, deep=True).sum())
+        if n_bytes > self.max_bytes:
+            return False
+        if key in self._entries:
+            self.bytes -= self._entries.pop(key)[1]
+        while self._entries and self.bytes + n_bytes > self.max_bytes:
+            _, (_, evicted_bytes) = self._entries.popitem(last=False)
+            self.bytes -= evicted_bytes
+            self.evictions += 1
+        self._entries[key] = (df, n_bytes)
+        self.bytes += n_bytes
+        return True
+
+    def record(self, steps: List[PlanStep], statuses: List[str]):
+        """Record a run's per-step outcomes: "hit" (result served from cache), "skipped" (not needed, since a
+        later step was cached), or "computed" (cache miss)"""
+        for step, status in zip(steps, statuses):
+            stats = self._node_stats.setdefault(
+                step.label(),
+                { "node_ids": [n.node_id for n in step.nodes], "hits": 0, "misses": 0, "skipped": 0 },
+            )
+            stats["hits" if status == "hit" else "misses" if status == "computed" else "skipped"] += 1
+            stats["last_run"] = status
+
+    def report(self) -> pd.DataFrame:
+        """Per-step (node) cache hits, misses and skips over all runs, plus each step's outcome in the last"""
+        return pd.DataFrame(
+            [{ "step": label, **stats } for label, stats in self._node_stats.items()],
+            columns=["step", "node_ids", "hits", "misses", "skipped", "last_run"],
+        )
+
+    def stats(self) -> dict:
+        """Size and eviction statistics of the cache"""
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+        }
+
+    def clear(self):
+        """Remove all cached results (keeping the per-node statistics)"""
+        self._entries.clear()
+        self.bytes = 0
@@ -0,0 +1,145 @@
+"""Explicit dataset schemas, for parsing CSVs with known dtypes instead of per-read type inference
+
+A schema is a JSON-able dict like:
+
+    {
+        "name": "credit-default",
+        "columns": { "credit_default": "int64", "dataset": "str", ... },
+        "prefixes": { "purpose_": "float64", ... },
+    }
+
+...where `columns` maps column names to Pandas dtypes, and the optional `prefixes` types generated columns
+(like one-hot encodings) by name prefix. The seed schema for our credit default data lives with the
+pipeline code (modelbuild/pipelines/credit_default/schema.py) and is available here as credit_default().
+
+Writers should attach a concrete schema (every column, in file order - see from_dataframe()) to the files
+they produce, so that even headerless files can be read back with their column names and types.
+"""
+
+# Python Built-Ins:
+import copy
+import functools
+import importlib.util
+import json
+import os
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Tuple, Union
+
+# External Dependencies:
+import boto3
+import pandas as pd
+
+defaults = SimpleNamespace()
+defaults.seed_schema_path = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "modelbuild",
+    "pipelines",
+    "credit_default",
+    "schema.py",
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _pipeline_schema_module(path: str):
+    """Import the pipeline code's schema.py (seed schema and shared helpers) from `path`"""
+    spec = importlib.util.spec_from_file_location("credit_default_schema", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def credit_default() -> dict:
+    """Load the seed schema of the credit default dataset, from the pipeline code folder"""
+    return copy.deepcopy(_pipeline_schema_module(defaults.seed_schema_path).SCHEMA)
+
+
+def load_schema(uri: str) -> dict:
+    """Load a schema JSON from an s3:// URI or local path"""
+    if uri.lower().startswith("s3://"):
+        bucket_name, _, key = uri[len("s3://"):].partition("/")
+        body = boto3.resource("s3").Object(bucket_name, key).get()["Body"].read()
+        return json.loads(body)
+    with open(uri) as f:
+        return json.load(f)
+
+
+def save_schema(schema: dict, uri: str) -> str:
+    """Save a schema as JSON to an s3:// URI or local path, returning the URI"""
+    body = json.dumps(schema, indent=2)
+    if uri.lower().startswith("s3://"):
+        bucket_name, _, key = uri[len("s3://"):].partition("/")
+        boto3.resource("s3").Object(bucket_name, key).put(Body=body.encode("utf-8"))
+    else:
+        os.makedirs(os.path.dirname(os.path.abspath(uri)), exist_ok=True)
+        with open(uri, "w") as f:
+            f.write(body)
+    return uri
+
+
+def as_schema(schema: Union[dict, str]) -> dict:
+    """Pass through a schema dict, or load one from an s3:// URI / local path"""
+    return load_schema(schema) if isinstance(schema, str) else schema
+
+
+def _dtype_name(dtype) -> str:
+    """Schema dtype name for a Pandas dtype (text columns are all just 'str')"""
+    if pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype):
+        return "str"
+    return str(dtype)
+
+
+def from_dataframe(df: pd.DataFrame, name: Optional[str]=None) -> dict:
+    """Concrete schema (all columns, in order) describing `df`"""
+    schema = { "columns": { str(c): _dtype_name(df[c].dtype) for c in df.columns } }
+    if name:
+        schema = { "name": name, **schema }
+    return schema
+
+
+def resolve_dtypes(schema: Union[dict, str], columns: List[str]) -> Tuple[Dict[str, str], List[str]]:
+    """Map `columns` to dtypes per `schema`, returning ({column: dtype}, [unknown columns])
+
+    Exact column names take precedence, then the longest matching prefix. (Implemented alongside the seed
+    schema in the pipeline code, so the preprocessing job resolves types exactly the same way)
+    """
+    return _pipeline_schema_module(defaults.seed_schema_path).resolve_dtypes(as_schema(schema), columns)
+
+
+def read_csv_kwargs(schema: Union[dict, str], source=None, header: bool=True, **kwargs) -> dict:
+    """Pandas.read_csv() kwargs to parse `source` with the explicit dtypes from `schema`
+
+    :param schema: Schema dict, or s3:// URI / path of a schema JSON
+    :param source: CSV path or URI. Only needed for files with a header row when `schema` has `prefixes`, so
+        the header can be read to match generated columns.
+    :param header: Whether the CSV has a header row. Headerless files are read with the column names (in
+        order) from the schema, which must then be concrete (no `prefixes`).
+    :param **kwargs: Other read_csv kwargs to merge in (e.g. `compression`). Any `dtype` dict given here
+        overrides the schema's types for those columns.
+
+    Columns the schema doesn't cover are left to Pandas' type inference, with a warning printed.
+    """
+    schema = as_schema(schema)
+    dtype_overrides = kwargs.pop("dtype", None) or {}
+    if not header:
+        if schema.get("prefixes"):
+            raise ValueError(
+                "Can't read a headerless CSV with a schema that has `prefixes`: Need concrete column names"
+            )
+        return {
+            **kwargs,
+            "header": None,
+            "names": list(schema["columns"]),
+            "dtype": { **schema["columns"], **dtype_overrides },
+        }
+
+    if schema.get("prefixes"):
+        if source is None:
+            raise ValueError("`source` is required to resolve a schema with `prefixes` against a CSV header")
+        header_kwargs = { k: v for k, v in kwargs.items() if k in ("compression", "sep", "storage_options") }
+        columns = pd.read_csv(source, nrows=0, **header_kwargs).columns.tolist()
+    else:
+        columns = list(schema["columns"])
+    dtypes, unknown = resolve_dtypes(schema, columns)
+    if unknown and schema.get("prefixes"):
+        print(f"WARNING: Columns not in schema {schema.get('name', '')} will be type-inferred: {unknown}")
+    return { **kwargs, "dtype": { **dtypes, **dtype_overrides } }
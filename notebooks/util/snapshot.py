@@ -0,0 +1,192 @@
+"""Fast DataFrame hand-over between notebooks, via memory-mapped Arrow snapshot files
+
+An alternative to IPython's `%store` for DataFrames: Rather than pickling the whole frame, save_dataframe()
+writes it as an (uncompressed) Arrow IPC/Feather file under a project-local folder, and load_dataframe()
+re-opens it memory-mapped - so loading is near-instant and column buffers are read straight from the page
+cache.
+
+Each snapshot records the snapshot format version, an optional caller-supplied `version` (e.g. the S3 URI
+or fingerprint of the data it came from) and its schema (column names and dtypes). Loading with a different
+expected version, columns or dtypes raises StaleSnapshotError, so an outdated snapshot is caught rather than
+silently reused:
+
+>>> df = util.snapshot.load_dataframe("raw_df", version=raw_version, dtypes=expected_df.dtypes)
+
+Small JSON-able values (like S3 URIs) can be handed over too, with save_value() and load_value().
+"""
+
+# Python Built-Ins:
+import json
+import os
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Union
+
+# External Dependencies:
+import pandas as pd
+import pyarrow as pa
+
+# Bump this if the on-disk snapshot layout changes, so old snapshots are rejected:
+SNAPSHOT_FORMAT_VERSION = 1
+METADATA_KEY = b"util.snapshot"
+
+defaults = SimpleNamespace()
+defaults.snapshot_dir = os.environ.get(
+    "SNAPSHOT_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".snapshots"),
+)
+
+
+class StaleSnapshotError(ValueError):
+    """A snapshot exists, but doesn't match the expected format, version or schema"""
+    pass
+
+
+def _snapshot_path(name: str, snapshot_dir: Optional[str], ext: str) -> str:
+    if not name or os.path.sep in name or name.startswith("."):
+        raise ValueError(f"Snapshot name must be a plain file name. Got '{name}'")
+    return os.path.join(snapshot_dir or defaults.snapshot_dir, f"{name}.{ext}")
+
+
+def _write_atomic(path: str, write_fn):
+    """Write a file via a temporary sibling, so readers never see a partially-written snapshot"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    try:
+        write_fn(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def save_dataframe(
+    name: str,
+    df: pd.DataFrame,
+    version: Optional[str]=None,
+    snapshot_dir: Optional[str]=None,
+) -> str:
+    """Save a DataFrame as a memory-mappable Arrow snapshot, returning the file path
+
+    :param name: Snapshot name (e.g. the variable name, like `test_result_df`)
+    :param df: DataFrame to save
+    :param version: Optional version tag to record, for load_dataframe() to check against
+    :param snapshot_dir: Override the default snapshot folder
+    """
+    path = _snapshot_path(name, snapshot_dir, "arrow")
+    table = pa.Table.from_pandas(df, preserve_index=True)
+    snapshot_meta = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "version": version,
+        "columns": [str(c) for c in df.columns],
+        "dtypes": { str(c): str(dtype) for c, dtype in df.dtypes.items() },
+    }
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        METADATA_KEY: json.dumps(snapshot_meta).encode("utf-8"),
+    })
+
+    def write(tmp_path):
+        # Uncompressed, so the file can be memory-mapped without a decompression copy:
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+    _write_atomic(path, write)
+    print(f"Saved {name} snapshot ({len(df)} rows) to {path}")
+    return path
+
+
+def snapshot_info(name: str, snapshot_dir: Optional[str]=None) -> Dict[str, Any]:
+    """Read a DataFrame snapshot's recorded metadata (format, version, columns, dtypes) without loading it"""
+    path = _snapshot_path(name, snapshot_dir, "arrow")
+    with pa.memory_map(path, "r") as source:
+        schema = pa.ipc.open_file(source).schema
+    raw_meta = (schema.metadata or {}).get(METADATA_KEY)
+    if raw_meta is None:
+        raise StaleSnapshotError(f"{path} is not a util.snapshot file (no snapshot metadata)")
+    return json.loads(raw_meta)
+
+
+def load_dataframe(
+    name: str,
+    version: Optional[str]=None,
+    columns: Optional[List[str]]=None,
+    snapshot_dir: Optional[str]=None,
+    as_arrow: bool=False,
+    dtypes: Optional[Union[Dict[str, str], pd.Series]]=None,
+) -> Union[pd.DataFrame, pa.Table]:
+    """Load a DataFrame snapshot saved by save_dataframe(), memory-mapped
+
+    :param name: Snapshot name as used when saving
+    :param version: If set, raise StaleSnapshotError unless the snapshot was saved with the same version
+    :param columns: If set, raise StaleSnapshotError unless the snapshot has exactly these columns
+    :param snapshot_dir: Override the default snapshot folder
+    :param as_arrow: Set True to return the memory-mapped pyarrow.Table (fully zero-copy) instead of
+        converting it to a Pandas DataFrame. The DataFrame conversion keeps each column as its own block, so
+        numeric columns without missing values still reference the mapped file rather than being copied -
+        but are read-only: `.copy()` the DataFrame before setting values in place (e.g. with `.loc[]`).
+        Other columns (strings, nullable or categorical types, etc) are converted to new arrays.
+    :param dtypes: If set, raise StaleSnapshotError unless the snapshot's columns have these Pandas dtypes:
+        A { column: dtype } dict, or e.g. `expected_df.dtypes`. Only the listed columns are checked.
+    """
+    path = _snapshot_path(name, snapshot_dir, "arrow")
+    if not os.path.isfile(path):
+        raise FileNotFoundError(
+            f"No snapshot '{name}' found at {path}: Did you save it from the previous notebook?"
+        )
+    info = snapshot_info(name, snapshot_dir)
+    if info.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        raise StaleSnapshotError(
+            f"Snapshot {path} has format version {info.get('format_version')}, but this library reads "
+            f"version {SNAPSHOT_FORMAT_VERSION}: Please re-save it"
+        )
+    if version is not None and info.get("version") != version:
+        raise StaleSnapshotError(
+            f"Snapshot {path} is for version '{info.get('version')}', but '{version}' was expected"
+        )
+    if columns is not None and info.get("columns") != [str(c) for c in columns]:
+        raise StaleSnapshotError(
+            f"Snapshot {path} columns don't match those expected. Got {info.get('columns')}"
+        )
+    if dtypes is not None:
+        if "dtypes" not in info:
+            raise StaleSnapshotError(f"Snapshot {path} has no recorded dtypes: Please re-save it")
+        mismatched = {
+            str(c): info["dtypes"].get(str(c)) for c, dtype in dict(dtypes).items()
+            if info["dtypes"].get(str(c)) != str(dtype)
+        }
+        if mismatched:
+            raise StaleSnapshotError(
+                f"Snapshot {path} column dtypes don't match those expected. Got {mismatched}"
+            )
+
+    # The table's buffers reference the mapped file directly, so nothing is read until it's accessed:
+    with pa.memory_map(path, "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+    if as_arrow:
+        return table
+    # (No consolidating columns into 2D blocks, which would copy them all. And the table isn't used after,
+    # so Arrow can release any non-mapped buffers as each column is converted)
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def save_value(name: str, value: Any, snapshot_dir: Optional[str]=None) -> str:
+    """Save a small JSON-serializable value (e.g. an S3 URI) for another notebook to load_value()"""
+    path = _snapshot_path(name, snapshot_dir, "json")
+
+    def write(tmp_path):
+        with open(tmp_path, "w") as f:
+            json.dump({ "format_version": SNAPSHOT_FORMAT_VERSION, "value": value }, f)
+
+    _write_atomic(path, write)
+    return path
+
+
+def load_value(name: str, snapshot_dir: Optional[str]=None) -> Any:
+    """Load a value saved by save_value()"""
+    path = _snapshot_path(name, snapshot_dir, "json")
+    with open(path) as f:
+        data = json.load(f)
+    if data.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        raise StaleSnapshotError(f"Snapshot {path} has an unsupported format version: Please re-save it")
+    return data["value"]
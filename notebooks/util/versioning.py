@@ -0,0 +1,230 @@
+"""Content-addressed, deduplicated dataset versions in S3
+
+A DatasetVersionStore keeps dataset part files (e.g. the train/validation/test CSV parts written by
+util.data.mock_featurestore_dataset_split()) under an S3 root as:
+
+- `{root}/_objects/{sha256}{ext}`: Each distinct part file, stored once and named by its content hash
+- `{root}/_versions/{version}.json`: A small manifest per version, listing each dataset's parts by hash (and
+  their schemas, if published with any)
+- `{root}/_versions/{version}/{dataset}.manifest`: A SageMaker manifest file per dataset, so any version can
+  be used directly as a training/processing input with `s3_data_type="ManifestFile"`
+- `{root}/_versions/LATEST`: The most recently published version ID
+
+Publishing uploads only parts whose hash isn't already stored, and version IDs are derived from the
+content too - so re-publishing unchanged data costs no part uploads and no new version. Earlier versions
+stay addressable, since objects are never overwritten.
+
+>>> store = util.versioning.DatasetVersionStore(f"s3://{bucket}/model-datasets")
+>>> version = store.publish({ "train": [part0_bytes, part1_bytes], "test": [test_bytes] }, ext=".csv")
+>>> train_input = sagemaker.inputs.TrainingInput(
+>>>     store.channel_uri("train", version), content_type="csv", s3_data_type="ManifestFile"
+>>> )
+"""
+
+# Python Built-Ins:
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import hashlib
+import io
+import json
+from typing import Dict, List, Optional
+
+# External Dependencies:
+import boto3
+import pandas as pd
+
+# Local Dependencies:
+from .data import COMPRESSION_EXTENSIONS, list_s3_objects
+
+MANIFEST_FORMAT_VERSION = 1
+
+
+class DatasetVersionStore:
+    """Content-addressed store of dataset versions under an S3 root prefix"""
+
+    def __init__(self, root_s3uri: str, max_workers: int=8, s3_client=None):
+        """Open (or start) a dataset version store
+
+        :param root_s3uri: S3 root folder for the store, like s3://bucket/model-datasets
+        :param max_workers: Maximum number of concurrent uploads
+        :param s3_client: Optional boto3 S3 client to use. Defaults to boto3.client("s3").
+        """
+        if not root_s3uri.lower().startswith("s3://"):
+            raise ValueError(
+                f"root_s3uri must be a valid S3 URI like s3://bucket/path... Got {root_s3uri}"
+            )
+        self.root_s3uri = root_s3uri.rstrip("/")
+        self.bucket_name, _, self.prefix = self.root_s3uri[len("s3://"):].partition("/")
+        self.max_workers = max_workers
+        self.s3_client = s3_client or boto3.client("s3")
+
+    def _key(self, rel_key: str) -> str:
+        return f"{self.prefix}/{rel_key}" if self.prefix else rel_key
+
+    def _uri(self, rel_key: str) -> str:
+        return f"s3://{self.bucket_name}/{self._key(rel_key)}"
+
+    def _get_bytes(self, rel_key: str) -> bytes:
+        return self.s3_client.get_object(Bucket=self.bucket_name, Key=self._key(rel_key))["Body"].read()
+
+    def _put_bytes(self, rel_key: str, body: bytes):
+        self.s3_client.put_object(Bucket=self.bucket_name, Key=self._key(rel_key), Body=body)
+
+    def _exists(self, rel_key: str) -> bool:
+        try:
+            self.s3_client.head_object(Bucket=self.bucket_name, Key=self._key(rel_key))
+            return True
+        except self.s3_client.exceptions.ClientError as err:
+            if err.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def publish(
+        self,
+        datasets: Dict[str, List[bytes]],
+        ext: str=".csv",
+        metadata: Optional[dict]=None,
+        schemas: Optional[Dict[str, dict]]=None,
+    ) -> str:
+        """Publish a version of some datasets' part files, returning the version ID
+
+        Only parts whose content hash isn't already in the store are uploaded. If the same content was
+        published before, its existing version ID is returned and nothing new is written (other than
+        updating LATEST, if needed).
+
+        :param datasets: { dataset_name: [part file contents, in order] }
+        :param ext: File extension for the stored parts (e.g. ".csv" or ".csv.gz"), kept so readers can infer
+            the format and compression
+        :param metadata: Optional JSON-able info to record in the version manifest (e.g. the source URI).
+            Not part of the version's identity.
+        :param schemas: Optional { dataset_name: util.schema schema } of each dataset's columns & types (e.g.
+            to read back headerless parts), stored in the version manifest. Part of the version's identity,
+            since they change how the data is read.
+        """
+        # Hash every part, and check which are new with one listing rather than a request per part:
+        hashed = {
+            dsname: [(hashlib.sha256(body).hexdigest(), body) for body in parts]
+            for dsname, parts in datasets.items()
+        }
+        existing = { obj.key for obj in list_s3_objects(self._uri("_objects/"), s3_client=self.s3_client) }
+        uploads = {}
+        for parts in hashed.values():
+            for sha, body in parts:
+                if self._key(f"_objects/{sha}{ext}") not in existing:
+                    uploads[sha] = body
+        with ThreadPoolExecutor(max_workers=max(1, self.max_workers)) as executor:
+            list(executor.map(
+                lambda item: self._put_bytes(f"_objects/{item[0]}{ext}", item[1]),
+                uploads.items(),
+            ))
+        n_parts = sum(len(parts) for parts in hashed.values())
+        print(f"Uploaded {len(uploads)} new parts ({n_parts - len(uploads)} unchanged parts reused)")
+
+        content = {
+            dsname: [
+                { "sha256": sha, "size": len(body), "key": f"_objects/{sha}{ext}" } for sha, body in parts
+            ]
+            for dsname, parts in sorted(hashed.items())
+        }
+        identity = { "datasets": content, "schemas": schemas } if schemas else content
+        version = hashlib.sha256(json.dumps(identity, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+        if self._exists(f"_versions/{version}.json"):
+            print(f"Data unchanged: Reusing existing version {version}")
+        else:
+            for dsname, parts in content.items():
+                # SageMaker manifest: A common prefix, then each object's path relative to it (in order)
+                sm_manifest = [{ "prefix": self._uri("_objects/") }]
+                sm_manifest += [p["key"][len("_objects/"):] for p in parts]
+                self._put_bytes(
+                    f"_versions/{version}/{dsname}.manifest",
+                    json.dumps(sm_manifest).encode("utf-8"),
+                )
+            manifest = {
+                "format_version": MANIFEST_FORMAT_VERSION,
+                "version": version,
+                "created": datetime.now(timezone.utc).isoformat(),
+                "parent": self.latest_version(),
+                "datasets": content,
+                "schemas": schemas or {},
+                "metadata": metadata or {},
+            }
+            self._put_bytes(f"_versions/{version}.json", json.dumps(manifest, indent=2).encode("utf-8"))
+            print(f"Published version {version}")
+        if self.latest_version() != version:
+            self._put_bytes("_versions/LATEST", version.encode("utf-8"))
+        return version
+
+    def latest_version(self) -> Optional[str]:
+        """ID of the most recently published version, or None if there are none"""
+        if not self._exists("_versions/LATEST"):
+            return None
+        return self._get_bytes("_versions/LATEST").decode("utf-8").strip()
+
+    def list_versions(self) -> pd.DataFrame:
+        """Summarize the published versions (ID, creation time, parent and datasets), newest first"""
+        objs = list_s3_objects(self._uri("_versions/"), shard_depth=0, s3_client=self.s3_client)
+        rows = []
+        for obj in objs:
+            rel_key = obj.key[len(self._key("_versions/")):]
+            if "/" in rel_key or not rel_key.endswith(".json"):
+                continue
+            manifest = self.manifest(rel_key[:-len(".json")])
+            rows.append({
+                "version": manifest["version"],
+                "created": manifest["created"],
+                "parent": manifest["parent"],
+                "datasets": { k: len(v) for k, v in manifest["datasets"].items() },
+            })
+        return pd.DataFrame(rows, columns=["version", "created", "parent", "datasets"]).sort_values(
+            "created", ascending=False, ignore_index=True
+        )
+
+    def manifest(self, version: Optional[str]=None) -> dict:
+        """Load the manifest of a version (default latest)"""
+        version = version or self.latest_version()
+        if version is None:
+            raise ValueError(f"No versions have been published to {self.root_s3uri}")
+        return json.loads(self._get_bytes(f"_versions/{version}.json"))
+
+    def part_uris(self, dataset: str, version: Optional[str]=None) -> List[str]:
+        """S3 URIs of a dataset's part files in a version (default latest), in order"""
+        manifest = self.manifest(version)
+        if dataset not in manifest["datasets"]:
+            raise ValueError(
+                f"Version {manifest['version']} has no dataset '{dataset}'. Got {list(manifest['datasets'])}"
+            )
+        return [self._uri(p["key"]) for p in manifest["datasets"][dataset]]
+
+    def schema(self, dataset: str, version: Optional[str]=None) -> Optional[dict]:
+        """The schema published with a dataset in a version (default latest), or None if there wasn't one
+
+        For example, to read a headerless dataset with its column names & types:
+
+        >>> schema = store.schema("test", version)
+        >>> df = store.read_dataset("test", version, **util.schema.read_csv_kwargs(schema, header=False))
+        """
+        return self.manifest(version).get("schemas", {}).get(dataset)
+
+    def channel_uri(self, dataset: str, version: Optional[str]=None) -> str:
+        """S3 URI of the SageMaker manifest file for a dataset in a version (default latest)
+
+        Use with `s3_data_type="ManifestFile"` in sagemaker.inputs.TrainingInput or ProcessingInput.
+        """
+        version = version or self.latest_version()
+        self.part_uris(dataset, version)  # Validate the dataset exists in this version
+        return self._uri(f"_versions/{version}/{dataset}.manifest")
+
+    def read_dataset(self, dataset: str, version: Optional[str]=None, **kwargs) -> pd.DataFrame:
+        """Load a dataset version's parts into one DataFrame
+
+        :param **kwargs: Passed through to Pandas.read_csv() (e.g. `header=None` for headerless datasets)
+        """
+        dfs = []
+        for uri in self.part_uris(dataset, version):
+            rel_key = uri[len(self._uri("")):]
+            compression = next(
+                (method for method, suffix in COMPRESSION_EXTENSIONS.items() if rel_key.endswith(suffix)),
+                None,
+            )
+            dfs.append(pd.read_csv(io.BytesIO(self._get_bytes(rel_key)), compression=compression, **kwargs))
+        return pd.concat(dfs, axis=0, ignore_index=True) if len(dfs) else pd.DataFrame()
@@ -3,15 +3,91 @@
 # Python Built-Ins:
 import json
 import os
+from types import SimpleNamespace
+from typing import Dict, Optional, Tuple, Union
 
 # External Dependencies:
 import boto3
 from sagemaker.processing import ProcessingInput, ProcessingOutput, FeatureStoreOutput
 from sagemaker.dataset_definition.inputs import AthenaDatasetDefinition, DatasetDefinition, RedshiftDatasetDefinition
 
-def create_flow_notebook_processing_input(base_dir, flow_s3_uri):
+# Local Dependencies:
+from .data import list_s3_objects
+
+# (Processing jobs don't support the FastFile mode of training jobs)
+PROCESSING_INPUT_MODES = ("File", "Pipe")
+DISTRIBUTION_TYPES = ("FullyReplicated", "ShardedByS3Key")
+
+defaults = SimpleNamespace()
+# If set, S3 inputs at least this large (in total) are sharded across the instances of multi-instance jobs
+# by default. Off by default, because sharding changes results for flows that aren't row-independent (e.g.
+# fitted encoders, joins, aggregations) - so it's only safe to enable for flows known to be row-wise:
+defaults.shard_threshold_bytes = None
+# ...and streamed in Pipe mode rather than downloaded, if set. Off by default, because the Data Wrangler
+# container reads its inputs as files:
+defaults.pipe_threshold_bytes = None
+
+
+def s3_input_config(
+    s3uri: str,
+    instance_count: int=1,
+    input_mode: Optional[str]=None,
+    distribution_type: Optional[str]=None,
+) -> Tuple[str, str]:
+    """Resolve the (input mode, distribution type) of an S3 processing input, defaulting by its total size
+
+    Unless set explicitly, inputs are downloaded ("File" mode) to every instance ("FullyReplicated"), except:
+
+    - In multi-instance jobs, inputs of at least `defaults.shard_threshold_bytes` (if set) with at least one
+      object per instance are "ShardedByS3Key", so each instance downloads only its share of the objects
+    - Inputs of at least `defaults.pipe_threshold_bytes` (if set) are streamed in "Pipe" mode
+
+    Note that a sharded input gives each instance a different subset of the data: Only suitable for jobs that
+    process rows independently (e.g. no fitted encoders without trained parameters, joins or aggregations).
+
+    :param s3uri: S3 URI (prefix or object) of the input
+    :param instance_count: Number of instances in the processing job
+    :param input_mode: Explicit "File" or "Pipe" input mode (otherwise defaulted by size)
+    :param distribution_type: Explicit "FullyReplicated" or "ShardedByS3Key" (otherwise defaulted by size)
+    """
+    if input_mode is not None and input_mode not in PROCESSING_INPUT_MODES:
+        raise ValueError(f"input_mode must be one of {PROCESSING_INPUT_MODES}. Got {input_mode}")
+    if distribution_type is not None and distribution_type not in DISTRIBUTION_TYPES:
+        raise ValueError(f"distribution_type must be one of {DISTRIBUTION_TYPES}. Got {distribution_type}")
+    may_shard = (
+        distribution_type is None and instance_count > 1 and defaults.shard_threshold_bytes is not None
+    )
+    may_pipe = input_mode is None and defaults.pipe_threshold_bytes is not None
+    if not (may_shard or may_pipe):
+        # No need to list the input:
+        return input_mode or "File", distribution_type or "FullyReplicated"
+
+    objs = list_s3_objects(s3uri)
+    total_bytes = sum(obj.size for obj in objs)
+    if input_mode is None:
+        input_mode = "Pipe" if may_pipe and total_bytes >= defaults.pipe_threshold_bytes else "File"
+    if distribution_type is None:
+        shard = may_shard and total_bytes >= defaults.shard_threshold_bytes and len(objs) >= instance_count
+        distribution_type = "ShardedByS3Key" if shard else "FullyReplicated"
+    print(
+        f"{s3uri}: {len(objs)} objects, {total_bytes / 1024**2:.1f} MiB -> {input_mode} mode, "
+        f"{distribution_type}"
+    )
+    return input_mode, distribution_type
+
+
+def create_flow_notebook_processing_input(
+    base_dir,
+    flow_s3_uri,
+    input_mode: str="File",
+    distribution_type: str="FullyReplicated",
+):
     """Create the flow file processing input for a DW job
 
+    :param input_mode: S3 input mode for the flow file
+    :param distribution_type: S3 data distribution type for the flow file. Every instance needs the flow, so
+        this should normally stay "FullyReplicated".
+
     (From Data Wrangler Job notebook template 2021-03-10)
     """
     return ProcessingInput(
@@ -19,23 +95,37 @@ def create_flow_notebook_processing_input(base_dir, flow_s3_uri):
         destination=f"{base_dir}/flow",
         input_name="flow",
         s3_data_type="S3Prefix",
-        s3_input_mode="File",
-        s3_data_distribution_type="FullyReplicated",
+        s3_input_mode=input_mode,
+        s3_data_distribution_type=distribution_type,
     )
 
 
-def create_s3_processing_input(s3_dataset_definition, name, base_dir):
+def create_s3_processing_input(
+    s3_dataset_definition,
+    name,
+    base_dir,
+    instance_count: int=1,
+    input_mode: Optional[str]=None,
+    distribution_type: Optional[str]=None,
+):
     """Create an S3 processing input for a DW job
 
+    :param instance_count: Number of instances in the processing job
+    :param input_mode: "File" or "Pipe" (default by input size - see s3_input_config())
+    :param distribution_type: "FullyReplicated" or "ShardedByS3Key" (default "FullyReplicated", unless
+        size-based sharding is enabled - see s3_input_config())
+
     (From Data Wrangler Job notebook template 2021-03-10)
     """
+    s3uri = s3_dataset_definition['s3ExecutionContext']['s3Uri']
+    input_mode, distribution_type = s3_input_config(s3uri, instance_count, input_mode, distribution_type)
     return ProcessingInput(
-        source=s3_dataset_definition['s3ExecutionContext']['s3Uri'],
+        source=s3uri,
         destination=f"{base_dir}/{name}",
         input_name=name,
         s3_data_type="S3Prefix",
-        s3_input_mode="File",
-        s3_data_distribution_type="FullyReplicated",
+        s3_input_mode=input_mode,
+        s3_data_distribution_type=distribution_type,
     )
 
 
@@ -83,14 +173,28 @@ def create_redshift_processing_input(redshift_dataset_defintion, name, base_dir)
     )
 
 
-def create_processing_inputs(flow_local, flow_s3uri, processing_dir="/opt/ml/processing"):
+def create_processing_inputs(
+    flow_local,
+    flow_s3uri,
+    processing_dir="/opt/ml/processing",
+    instance_count: int=1,
+    input_mode: Union[None, str, Dict[str, str]]=None,
+    distribution_type: Union[None, str, Dict[str, str]]=None,
+):
     """Helper function for creating processing inputs
     :param flow_local: Local data wrangler flow file path
     :param flow_s3uri: S3 URI of the uploaded data wrangler flow file
+    :param instance_count: Number of instances the processing job will use
+    :param input_mode: "File" or "Pipe" for all S3 sources, or a { source_name: mode } dict. Sources not set
+        are defaulted by their total size (see s3_input_config()).
+    :param distribution_type: "FullyReplicated" or "ShardedByS3Key" for all S3 sources, or a
+        { source_name: type } dict. Sources not set are "FullyReplicated" (unless size-based sharding is
+        enabled - see s3_input_config()). Only shard sources of flows that process rows independently.
 
     Modified from Data Wrangler Job notebook template 2021-03-10 to:
     - make processing_dir optional
     - Handle the upload & loading of the flow file
+    - Configure S3 sources' input modes and distribution types
     """
     # Load the flow file JSON (good first validation step):
     with open(flow_local) as f:
@@ -113,7 +217,17 @@ def create_processing_inputs(flow_local, flow_s3uri, processing_dir="/opt/ml/pro
             source_type = data_def["datasetSourceType"]
 
             if source_type == "S3":
-                processing_inputs.append(create_s3_processing_input(data_def, name, processing_dir))
+                processing_inputs.append(create_s3_processing_input(
+                    data_def,
+                    name,
+                    processing_dir,
+                    instance_count=instance_count,
+                    input_mode=input_mode.get(name) if isinstance(input_mode, dict) else input_mode,
+                    distribution_type=(
+                        distribution_type.get(name) if isinstance(distribution_type, dict)
+                        else distribution_type
+                    ),
+                ))
             elif source_type == "Athena":
                 processing_inputs.append(create_athena_processing_input(data_def, name, processing_dir))
             elif source_type == "Redshift":